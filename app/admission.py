@@ -0,0 +1,223 @@
+"""Control de admision: limita el trabajo en vuelo por clase de ruta.
+
+Cada clase (lecturas, escrituras simples, escrituras masivas) tiene un maximo de
+peticiones en curso y una cola acotada con espera maxima; lo que no entra se
+rechaza con 503 y Retry-After en lugar de acumularse esperando a la BD. Si el
+cliente se desconecta, la peticion se cancela y se matan sus consultas.
+
+Las esperas que no ocupan la BD por cuenta propia (la fila encolada en el group
+commit, el resultado compartido de un single-flight) devuelven su lugar con
+release_admission(): si no, el limite de escrituras acotaria cada lote del group
+commit a ADMISSION_WRITE_LIMIT filas."""
+import asyncio
+import collections
+import contextvars
+import json
+import os
+from . import metrics
+from .database import ActiveQueries, active_queries, submit_db
+
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# clase -> (peticiones en vuelo, peticiones en cola)
+ADMISSION_LIMITS = {
+    "read": (int(os.getenv("ADMISSION_READ_LIMIT", "10")),
+             int(os.getenv("ADMISSION_READ_QUEUE", "100"))),
+    "write": (int(os.getenv("ADMISSION_WRITE_LIMIT", "8")),
+              int(os.getenv("ADMISSION_WRITE_QUEUE", "100"))),
+    "bulk": (int(os.getenv("ADMISSION_BULK_LIMIT", "2")),
+             int(os.getenv("ADMISSION_BULK_QUEUE", "4"))),
+}
+
+# Rutas sin acceso a la BD: nunca se limitan
+EXEMPT_PATHS = {"/", "/metrics", "/docs", "/docs/oauth2-redirect", "/redoc",
+                "/openapi.json", "/cache/stats/"}
+
+class Overloaded(Exception):
+    def __init__(self, route_class, reason, message):
+        super().__init__(message)
+        self.route_class = route_class
+        self.reason = reason
+
+def classify(scope):
+    path = scope["path"]
+    if path in EXEMPT_PATHS:
+        return None
+    if scope["method"] in ("GET", "HEAD"):
+        return "read"
+    if "/bulk/" in path:
+        return "bulk"
+    return "write"
+
+class AdmissionLimiter:
+    def __init__(self, name, limit, max_queue, queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters = collections.deque()
+        self.admitted = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.name, "queue_full",
+                             f"Demasiadas peticiones de tipo {self.name} en espera")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(self.name, "timeout",
+                             f"Sin capacidad para peticiones de tipo {self.name} "
+                             f"tras {self.queue_timeout}s en cola") from None
+        except asyncio.CancelledError:
+            # Si el lugar ya se habia cedido a esta peticion, se devuelve
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+        self.admitted += 1
+
+    def release(self):
+        # El lugar pasa directo al primero de la cola sin bajar in_flight
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def status(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+limiters = {name: AdmissionLimiter(name, limit, max_queue)
+            for name, (limit, max_queue) in ADMISSION_LIMITS.items()}
+
+class _Slot:
+    """Lugar ocupado por una peticion; se devuelve una sola vez."""
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+
+    def release(self):
+        if self._limiter is not None:
+            limiter, self._limiter = self._limiter, None
+            limiter.release()
+
+admission_slot = contextvars.ContextVar("admission_slot", default=None)
+
+def release_admission():
+    """Devuelve antes de tiempo el lugar de la peticion en curso (si tiene uno)."""
+    slot = admission_slot.get()
+    if slot is not None:
+        slot.release()
+
+def admission_status():
+    return {name: limiter.status() for name, limiter in limiters.items()}
+
+def _has_body(scope):
+    for key, value in scope["headers"]:
+        if key == b"transfer-encoding" or (key == b"content-length" and value != b"0"):
+            return True
+    return False
+
+async def _reject(send, exc):
+    body = json.dumps({"detail": str(exc)}).encode()
+    await send({"type": "http.response.start", "status": 503,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()),
+                            (b"retry-after", str(ADMISSION_RETRY_AFTER).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route_class = classify(scope) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+        limiter = limiters[route_class]
+        try:
+            await limiter.acquire()
+        except Overloaded as exc:
+            metrics.admission_rejected.inc(route_class, exc.reason)
+            await _reject(send, exc)
+            return
+        slot = _Slot(limiter)
+        try:
+            await self._run_cancellable(scope, receive, send, route_class, slot)
+        finally:
+            slot.release()
+
+    async def _run_cancellable(self, scope, receive, send, route_class, slot):
+        has_body = _has_body(scope)
+        body_done = asyncio.Event()
+        disconnected = asyncio.Event()
+        empty_body_sent = False
+        if not has_body:
+            body_done.set()
+
+        async def app_receive():
+            nonlocal empty_body_sent
+            if not body_done.is_set():
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                elif not message.get("more_body", False):
+                    body_done.set()
+                return message
+            if not has_body and not empty_body_sent:
+                empty_body_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # Con el cuerpo ya leido, receive() es del vigilante de desconexion
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        queries = ActiveQueries()
+        token = active_queries.set(queries)
+        slot_token = admission_slot.set(slot)
+        try:
+            app_task = asyncio.create_task(self.app(scope, app_receive, send))
+        finally:
+            admission_slot.reset(slot_token)
+            active_queries.reset(token)
+
+        async def watch():
+            await body_done.wait()
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    app_task.cancel()
+                    return
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            if not disconnected.is_set():
+                raise
+            # El cliente ya no espera la respuesta: se cortan sus consultas en curso
+            metrics.requests_cancelled.inc(route_class)
+            submit_db(queries.cancel)
+        finally:
+            watcher.cancel()
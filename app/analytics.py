@@ -0,0 +1,139 @@
+import sys
+from collections import defaultdict
+from decimal import Decimal
+from .database import db_cursor, fetch_all
+from .tables import SALES
+
+ROLLUP_TABLE = "sales_rollup"
+
+# Dimensiones mantenidas por dia
+DIMENSIONS = ("product_id", "customer_id", "supplier_id", "employee_id", "project_id")
+# Los totales sin dimension suman las filas de una dimension que toda venta tiene:
+# una fila "total del dia" seria una sola fila bloqueada por todas las ventas del dia
+TOTAL_DIMENSION = "product_id"
+GROUP_BY_FIELDS = ("day",) + DIMENSIONS
+
+# project_id puede ser NULL y no puede formar parte de la clave primaria
+NULL_VALUE = 0
+
+ROLLUP_DDL = f"""CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+    dimension VARCHAR(20) NOT NULL,
+    dim_value INT NOT NULL,
+    sale_date DATE NOT NULL,
+    total_amount DECIMAL(20, 2) NOT NULL,
+    sale_count BIGINT NOT NULL,
+    PRIMARY KEY (dimension, sale_date, dim_value)
+)"""
+
+_positions = {column: SALES.columns.index(column) for column in ("sale_date", "amount") + DIMENSIONS}
+
+def rollup_deltas(rows):
+    """Suma y cuenta por (dimension, valor, dia) para filas en el orden de SALES.columns."""
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for row in rows:
+        sale_date = row[_positions["sale_date"]]
+        amount = Decimal(row[_positions["amount"]])
+        keys = [
+            (dimension, row[_positions[dimension]] if row[_positions[dimension]] is not None else NULL_VALUE)
+            for dimension in DIMENSIONS
+        ]
+        for dimension, value in keys:
+            delta = deltas[(dimension, sale_date, value)]
+            delta[0] += amount
+            delta[1] += 1
+    return deltas
+
+def update_sales_rollup(cursor, rows):
+    """Aplica las ventas recien insertadas a los acumulados, en la misma transaccion."""
+    deltas = rollup_deltas(rows)
+    if not deltas:
+        return
+    # Orden fijo de claves para que dos transacciones no se bloqueen en cruz
+    keys = sorted(deltas, key=lambda k: (k[0], k[1], k[2]))
+    cursor.execute(
+        f"INSERT INTO {ROLLUP_TABLE} (dimension, sale_date, dim_value, total_amount, sale_count) "
+        "VALUES " + ", ".join(["(%s, %s, %s, %s, %s)"] * len(keys)) +
+        " ON DUPLICATE KEY UPDATE total_amount = total_amount + VALUES(total_amount), "
+        "sale_count = sale_count + VALUES(sale_count)",
+        [value for key in keys for value in (key[0], key[1], key[2], *deltas[key])])
+
+def rebuild_rollup_sync():
+    """Recalcula todos los acumulados desde la tabla sales (backfill)."""
+    with db_cursor() as (conn, cursor):
+        cursor.execute(ROLLUP_DDL)
+        conn.start_transaction()
+        cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+        for dimension in DIMENSIONS:
+            cursor.execute(
+                f"INSERT INTO {ROLLUP_TABLE} (dimension, sale_date, dim_value, total_amount, sale_count) "
+                f"SELECT '{dimension}', sale_date, COALESCE({dimension}, {NULL_VALUE}), SUM(amount), COUNT(*) "
+                f"FROM sales GROUP BY sale_date, COALESCE({dimension}, {NULL_VALUE})")
+        conn.commit()
+        cursor.execute(f"SELECT COUNT(*) FROM {ROLLUP_TABLE}")
+        return cursor.fetchone()[0]
+
+class InvalidGroupByError(ValueError):
+    pass
+
+def parse_group_by(group_by):
+    fields = [field.strip() for field in (group_by or "").split(",") if field.strip()]
+    unknown = [field for field in fields if field not in GROUP_BY_FIELDS]
+    if unknown:
+        raise InvalidGroupByError(
+            f"group_by no soportado: {', '.join(unknown)}. Opciones: {', '.join(GROUP_BY_FIELDS)}")
+    dimensions = [field for field in fields if field != "day"]
+    if len(dimensions) > 1:
+        raise InvalidGroupByError(
+            "Solo se puede agrupar por 'day' y una dimension a la vez")
+    return "day" in fields, dimensions[0] if dimensions else None
+
+def summary_query(by_day, dimension, date_from=None, date_to=None):
+    select = []
+    group = []
+    if by_day:
+        select.append("sale_date")
+        group.append("sale_date")
+    if dimension:
+        select.append(f"dim_value AS {dimension}")
+        group.append("dim_value")
+    conditions = ["dimension = %s"]
+    params = [dimension or TOTAL_DIMENSION]
+    if date_from is not None:
+        conditions.append("sale_date >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("sale_date <= %s")
+        params.append(date_to)
+    query = (
+        f"SELECT {', '.join(select + ['SUM(total_amount) AS total_amount', 'SUM(sale_count) AS sale_count'])} "
+        f"FROM {ROLLUP_TABLE} WHERE {' AND '.join(conditions)}"
+    )
+    if group:
+        query += f" GROUP BY {', '.join(group)} ORDER BY {', '.join(group)}"
+    return query, tuple(params)
+
+async def sales_summary(group_by, date_from=None, date_to=None):
+    by_day, dimension = parse_group_by(group_by)
+    query, params = summary_query(by_day, dimension, date_from, date_to)
+    rows = await fetch_all(query, params, read_only=True)
+    result = []
+    for row in rows:
+        if not row["sale_count"]:
+            continue
+        if dimension == "project_id" and row["project_id"] == NULL_VALUE:
+            row["project_id"] = None
+        row["sale_count"] = int(row["sale_count"])
+        row["avg_amount"] = round(Decimal(row["total_amount"]) / row["sale_count"], 2)
+        result.append(row)
+    return result
+
+if __name__ == "__main__":
+    from .database import init_pool, close_pool
+    if sys.argv[1:] != ["rebuild"]:
+        print("Uso: python -m app.analytics rebuild")
+        sys.exit(2)
+    init_pool()
+    try:
+        print(f"Acumulados reconstruidos: {rebuild_rollup_sync()} filas en {ROLLUP_TABLE}")
+    finally:
+        close_pool()
@@ -0,0 +1,350 @@
+"""Archivo columnar de ventas para consultas historicas fuera de MySQL.
+
+Las ventas se exportan a archivos Arrow IPC comprimidos, uno por mes y corrida:
+
+    ARCHIVE_DIR/sales/month=2024-01/part-000001-0000000001-0000100000.arrow
+
+La exportacion es incremental: lee las ventas con sale_id mayor que el ultimo
+exportado y vuelve a leer los huecos, IDs salteados que pueden ser transacciones
+que confirmaron despues (el auto-increment se asigna al insertar, no al
+confirmar). Un hueco que sigue vacio despues de ARCHIVE_GAP_TIMEOUT segundos se
+da por revertido. El estado (_watermark.json) se guarda despues de cerrar los
+archivos; los de una corrida posterior al estado se descartan.
+
+Las consultas leen con memory map solo los meses y columnas necesarios y
+agregan con pyarrow."""
+import asyncio
+import bisect
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from .analytics import InvalidGroupByError
+from .database import db_cursor
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100000"))
+# lz4 se descomprime varias veces mas rapido que zstd; zstd ocupa menos disco
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "lz4")
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", "2"))
+# Segundos que se sigue buscando una venta salteada antes de darla por revertida
+ARCHIVE_GAP_TIMEOUT = float(os.getenv("ARCHIVE_GAP_TIMEOUT", "3600"))
+# Huecos por consulta al volver a leerlos
+GAPS_PER_QUERY = 500
+
+WATERMARK_FILE = "_watermark.json"
+COLUMNS = ("sale_id", "sale_date", "amount", "product_id", "customer_id",
+           "supplier_id", "employee_id", "project_id")
+GROUP_BY_FIELDS = ("month", "product_id", "customer_id")
+
+# part-corrida-primero-ultimo; los de antes de numerar las corridas no tienen corrida
+_PART_NAME = re.compile(r"part-(?:(\d+)-)?(\d+)-(\d+)\.arrow$")
+
+def parse_group_by(group_by):
+    fields = [field.strip() for field in (group_by or "").split(",") if field.strip()]
+    unknown = [field for field in fields if field not in GROUP_BY_FIELDS]
+    if unknown:
+        raise InvalidGroupByError(
+            f"group_by no soportado: {', '.join(unknown)}. Opciones: {', '.join(GROUP_BY_FIELDS)}")
+    # Orden fijo de las claves, igual que en la respuesta
+    return [field for field in GROUP_BY_FIELDS if field in fields]
+
+def sales_schema():
+    return pa.schema([
+        ("sale_id", pa.int64()),
+        ("sale_date", pa.date32()),
+        ("amount", pa.decimal128(12, 2)),
+        ("product_id", pa.int32()),
+        ("customer_id", pa.int32()),
+        ("supplier_id", pa.int32()),
+        ("employee_id", pa.int32()),
+        ("project_id", pa.int32()),
+    ])
+
+def batch_query(last, batch_size):
+    """Siguiente bloque de ventas con sale_id mayor que last."""
+    return (f"SELECT {', '.join(COLUMNS)} FROM sales WHERE sale_id > %s "
+            f"ORDER BY sale_id LIMIT %s", (last, batch_size))
+
+def gap_query(last, gaps, batch_size):
+    """Siguiente bloque de ventas dentro de los huecos [desde, hasta, visto]."""
+    condition = " OR ".join(["sale_id BETWEEN %s AND %s"] * len(gaps))
+    return (f"SELECT {', '.join(COLUMNS)} FROM sales WHERE sale_id > %s AND ({condition}) "
+            f"ORDER BY sale_id LIMIT %s",
+            (last, *[bound for lo, hi, _ in gaps for bound in (lo, hi)], batch_size))
+
+def _missing(lo, hi, found, seen):
+    """Subrangos de [lo, hi] sin ninguna venta en found (ordenada)."""
+    gaps = []
+    start = lo
+    for sale_id in found[bisect.bisect_left(found, lo):bisect.bisect_right(found, hi)]:
+        if sale_id > start:
+            gaps.append([start, sale_id - 1, seen])
+        start = sale_id + 1
+    if start <= hi:
+        gaps.append([start, hi, seen])
+    return gaps
+
+def _all(conditions):
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+class SalesArchive:
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = os.path.join(root, "sales")
+
+    def state(self):
+        """{"sale_id": ultimo exportado, "gaps": [[desde, hasta, visto]], "run": corrida}."""
+        try:
+            with open(os.path.join(self.root, WATERMARK_FILE)) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        return {"sale_id": state.get("sale_id", 0), "gaps": state.get("gaps", []),
+                "run": state.get("run", 0)}
+
+    def watermark(self, state=None):
+        """Mayor sale_id hasta el que todas las ventas estan exportadas."""
+        state = state or self.state()
+        return min([lo - 1 for lo, _, _ in state["gaps"]] + [state["sale_id"]])
+
+    def _save_state(self, state):
+        path = os.path.join(self.root, WATERMARK_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    def parts(self):
+        """[(mes, ruta, primer sale_id, ultimo sale_id, corrida)] de los archivos exportados."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for entry in sorted(os.listdir(self.root)):
+            if not entry.startswith("month="):
+                continue
+            for name in sorted(os.listdir(os.path.join(self.root, entry))):
+                match = _PART_NAME.fullmatch(name)
+                if match:
+                    run, first, last = match.groups()
+                    found.append((entry[len("month="):], os.path.join(self.root, entry, name),
+                                  int(first), int(last), None if run is None else int(run)))
+        return found
+
+    def _discard_unpublished(self, state):
+        # Archivos de una corrida que se corto antes de guardar el estado: se vuelven a exportar
+        for _, path, first, _, run in self.parts():
+            if (run > state["run"]) if run is not None else (first > state["sale_id"]):
+                os.remove(path)
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if name.startswith(".") and name.endswith(".tmp"):
+                    os.remove(os.path.join(dirpath, name))
+
+    @staticmethod
+    def _gap_batches(cursor, gaps, batch_size):
+        """Ventas que ya confirmaron dentro de los huecos."""
+        for i in range(0, len(gaps), GAPS_PER_QUERY):
+            last = 0
+            while True:
+                cursor.execute(*gap_query(last, gaps[i:i + GAPS_PER_QUERY], batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                yield rows
+                last = rows[-1][0]
+
+    @staticmethod
+    def _new_batches(cursor, start, batch_size):
+        last = start
+        while True:
+            cursor.execute(*batch_query(last, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            yield rows
+            last = rows[-1][0]
+
+    def export_sync(self, batch_size=ARCHIVE_BATCH_SIZE):
+        """Exporta las ventas nuevas y las que llenan huecos; devuelve un resumen."""
+        os.makedirs(self.root, exist_ok=True)
+        state = self.state()
+        self._discard_unpublished(state)
+        run = state["run"] + 1
+        now = time.time()
+        schema = sales_schema()
+        options = pa.ipc.IpcWriteOptions(compression=ARCHIVE_COMPRESSION)
+        # mes -> [writer, ruta temporal, primer sale_id, ultimo sale_id, filas]
+        writers = {}
+        found = []
+        high = state["sale_id"]
+
+        def write(rows):
+            by_month = defaultdict(list)
+            for row in rows:
+                by_month[f"{row[1].year:04d}-{row[1].month:02d}"].append(row)
+            for month, month_rows in by_month.items():
+                if month not in writers:
+                    directory = os.path.join(self.root, f"month={month}")
+                    os.makedirs(directory, exist_ok=True)
+                    tmp_path = os.path.join(directory, f".part-{run}.tmp")
+                    writer = pa.ipc.new_file(tmp_path, schema, options=options)
+                    writers[month] = [writer, tmp_path, month_rows[0][0], month_rows[0][0], 0]
+                part = writers[month]
+                part[0].write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(column, type=field.type)
+                     for column, field in zip(zip(*month_rows), schema)],
+                    schema=schema))
+                part[2] = min(part[2], month_rows[0][0])
+                part[3] = max(part[3], month_rows[-1][0])
+                part[4] += len(month_rows)
+
+        gaps = []
+        try:
+            with db_cursor(read_only=True) as (conn, cursor):
+                for rows in self._gap_batches(cursor, state["gaps"], batch_size):
+                    write(rows)
+                    found.extend(row[0] for row in rows)
+                # Lo que siga vacio dentro de un hueco se busca de nuevo la proxima vez
+                found.sort()
+                for lo, hi, seen in state["gaps"]:
+                    if now - seen <= ARCHIVE_GAP_TIMEOUT:
+                        gaps.extend(_missing(lo, hi, found, seen))
+                for rows in self._new_batches(cursor, high, batch_size):
+                    write(rows)
+                    # IDs salteados entre las filas leidas: quizas aun sin confirmar. Antes
+                    # de la primera venta de la primera corrida solo hay ventas borradas
+                    previous = high or rows[0][0] - 1
+                    for row in rows:
+                        if row[0] > previous + 1:
+                            gaps.append([previous + 1, row[0] - 1, now])
+                        previous = row[0]
+                    high = rows[-1][0]
+            for month, (writer, tmp_path, first, final, _) in writers.items():
+                writer.close()
+                os.replace(tmp_path, os.path.join(os.path.dirname(tmp_path),
+                                                  f"part-{run:06d}-{first:010d}-{final:010d}.arrow"))
+        except BaseException:
+            # Lo ya renombrado sin guardar el estado se descarta en la proxima corrida
+            for writer, tmp_path, *_ in writers.values():
+                if os.path.exists(tmp_path):
+                    writer.close()
+                    os.remove(tmp_path)
+            raise
+        previous = self.watermark(state)
+        state = {"sale_id": high, "gaps": gaps, "run": run}
+        self._save_state(state)
+        return {
+            "rows": sum(part[4] for part in writers.values()),
+            "previous_watermark": previous,
+            "watermark": self.watermark(state),
+            "last_sale_id": high,
+            "pending_gaps": len(gaps),
+            "months": sorted(writers),
+        }
+
+    def query_sync(self, group_by="", date_from=None, date_to=None,
+                   product_id=None, customer_id=None):
+        """Suma, cuenta y promedio de amount agrupados por mes, producto y/o cliente."""
+        keys = parse_group_by(group_by)
+        if not self.parts():
+            return []
+        dimensions = [key for key in keys if key != "month"]
+        dataset = ds.dataset(
+            self.root, format="ipc",
+            filesystem=fs.LocalFileSystem(use_mmap=True),
+            partitioning=ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive"))
+        # Las condiciones sobre month descartan directorios completos sin abrirlos
+        months = []
+        rows_filter = []
+        if date_from is not None:
+            months.append(ds.field("month") >= f"{date_from.year:04d}-{date_from.month:02d}")
+            rows_filter.append(ds.field("sale_date") >= date_from)
+        if date_to is not None:
+            months.append(ds.field("month") <= f"{date_to.year:04d}-{date_to.month:02d}")
+            rows_filter.append(ds.field("sale_date") <= date_to)
+        if product_id is not None:
+            rows_filter.append(ds.field("product_id") == product_id)
+        if customer_id is not None:
+            rows_filter.append(ds.field("customer_id") == customer_id)
+        partials = []
+        for fragment in dataset.get_fragments(filter=_all(months)):
+            month = ds.get_partition_keys(fragment.partition_expression)["month"]
+            table = fragment.to_table(columns=dimensions + ["amount"], filter=_all(rows_filter))
+            # Cada archivo es de un solo mes: se agrega por archivo y el mes se agrega
+            # como constante, sin materializar una columna month por fila
+            partial = table.group_by(dimensions).aggregate([("amount", "sum"), ("amount", "count")])
+            if "month" in keys:
+                partial = partial.append_column("month", pa.array([month] * partial.num_rows, pa.string()))
+            partials.append(partial)
+        if not partials:
+            return []
+        table = pa.concat_tables(partials).group_by(keys).aggregate(
+            [("amount_sum", "sum"), ("amount_count", "sum")])
+        if keys:
+            table = table.sort_by([(key, "ascending") for key in keys])
+        rows = table.rename_columns(
+            [{"amount_sum_sum": "total_amount", "amount_count_sum": "sale_count"}.get(name, name)
+             for name in table.column_names]).to_pylist()
+        result = []
+        for row in rows:
+            if not row["sale_count"]:
+                continue
+            row["total_amount"] = Decimal(row["total_amount"])
+            row["avg_amount"] = round(row["total_amount"] / row["sale_count"], 2)
+            result.append(row)
+        return result
+
+    def status(self):
+        state = self.state()
+        parts = self.parts()
+        months = defaultdict(lambda: {"files": 0, "bytes": 0})
+        for month, path, *_ in parts:
+            months[month]["files"] += 1
+            months[month]["bytes"] += os.path.getsize(path)
+        return {
+            "watermark": self.watermark(state),
+            "last_sale_id": state["sale_id"],
+            "pending_gaps": len(state["gaps"]),
+            "months": [{"month": month, **info} for month, info in sorted(months.items())],
+        }
+
+sales_archive = SalesArchive()
+
+# Hilos propios: las consultas del archivo no ocupan los reservados para la BD
+_executor = ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS, thread_name_prefix="archive")
+_export_lock = asyncio.Lock()
+
+async def run_archive(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+async def export_sales_archive():
+    # Dos exportaciones a la vez leerian la misma marca y duplicarian filas
+    async with _export_lock:
+        return await run_archive(sales_archive.export_sync)
+
+if __name__ == "__main__":
+    from .database import init_pool, close_pool
+    if sys.argv[1:] not in (["export"], ["status"]):
+        print("Uso: python -m app.archive export|status")
+        sys.exit(2)
+    if sys.argv[1] == "status":
+        print(json.dumps(sales_archive.status(), indent=2))
+        sys.exit(0)
+    init_pool()
+    try:
+        summary = sales_archive.export_sync()
+        print(f"Exportadas {summary['rows']} ventas (sale_id {summary['previous_watermark']} -> "
+              f"{summary['watermark']}) en {len(summary['months'])} meses; "
+              f"{summary['pending_gaps']} huecos pendientes")
+    finally:
+        close_pool()
@@ -0,0 +1,309 @@
+import asyncio
+import csv
+import json
+import os
+import time
+import mysql.connector
+from pydantic import ValidationError
+from .database import db_cursor, run_db
+from .fkcheck import fk_cache
+from .analytics import update_sales_rollup
+
+# Acumulados que se actualizan en la misma transaccion que el INSERT
+AFTER_INSERT = {
+    "sales": update_sales_rollup,
+}
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+BULK_COMMIT_MODE = os.getenv("BULK_COMMIT_MODE", "batch")
+# Margen sobre max_allowed_packet para el texto del INSERT y el escape de valores
+PACKET_SAFETY = 0.8
+
+_limits = None
+
+def _server_limits(cursor):
+    # Variables globales del servidor: se leen una vez por proceso
+    global _limits
+    if _limits is None:
+        cursor.execute("SELECT @@max_allowed_packet, @@auto_increment_increment")
+        max_packet, increment = cursor.fetchone()
+        _limits = int(max_packet), int(increment)
+    return _limits
+
+# Caracteres que el conector escapa con una barra en los literales de texto
+_ESCAPED = (b"\\", b"'", b'"', b"\n", b"\r", b"\x00", b"\x1a")
+
+def _row_size(row):
+    # Bytes del literal SQL de la fila (UTF-8, no caracteres): valor, escapes, comillas y coma
+    size = 2
+    for value in row:
+        encoded = str(value).encode()
+        size += len(encoded) + 3
+        if isinstance(value, str):
+            size += sum(encoded.count(char) for char in _ESCAPED)
+    return size
+
+def iter_chunks(rows, chunk_size, max_bytes):
+    chunk = []
+    size = 0
+    for row in rows:
+        row_size = _row_size(row)
+        if chunk and (len(chunk) >= chunk_size or size + row_size > max_bytes):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(row)
+        size += row_size
+    if chunk:
+        yield chunk
+
+def insert_statement(table, row_count):
+    placeholders = "(" + ", ".join(["%s"] * len(table.columns)) + ")"
+    return (f"INSERT INTO {table.name} ({', '.join(table.columns)}) VALUES "
+            + ", ".join([placeholders] * row_count))
+
+def insert_chunk(cursor, table, chunk, increment=1):
+    cursor.execute(insert_statement(table, len(chunk)),
+                   [value for row in chunk for value in row])
+    # En un INSERT de varias filas LAST_INSERT_ID() es el ID de la primera fila y,
+    # al conocerse el numero de filas de antemano, InnoDB reserva IDs consecutivos
+    # (con paso auto_increment_increment) aunque haya escritores concurrentes.
+    first_id = cursor.lastrowid
+    return [first_id + i * increment for i in range(len(chunk))]
+
+def insert_row_sync(table, values):
+    with db_cursor() as (conn, cursor):
+        new_id = insert_chunk(cursor, table, [values])[0]
+        after_insert = AFTER_INSERT.get(table.name)
+        if after_insert is not None:
+            after_insert(cursor, [values])
+        conn.commit()
+        return new_id
+
+def bulk_insert_sync(table, rows, chunk_size=None, commit_mode=None, update_rollups=True):
+    chunk_size = chunk_size or BULK_CHUNK_SIZE
+    commit_mode = commit_mode or BULK_COMMIT_MODE
+    ids = []
+    chunks = 0
+    committed = 0
+    start = time.perf_counter()
+    with db_cursor() as (conn, cursor):
+        max_packet, increment = _server_limits(cursor)
+        try:
+            after_insert = AFTER_INSERT.get(table.name) if update_rollups else None
+            for chunk in iter_chunks(rows, chunk_size, int(max_packet * PACKET_SAFETY)):
+                ids.extend(insert_chunk(cursor, table, chunk, increment))
+                if after_insert is not None:
+                    after_insert(cursor, chunk)
+                chunks += 1
+                if commit_mode == "chunk":
+                    conn.commit()
+                    committed = len(ids)
+            conn.commit()
+        except mysql.connector.Error as err:
+            conn.rollback()
+            if committed:
+                raise mysql.connector.errors.DatabaseError(
+                    msg=f"{err.msg} ({committed} filas ya confirmadas)",
+                    errno=err.errno, sqlstate=err.sqlstate) from err
+            raise
+    seconds = time.perf_counter() - start
+    stats = {
+        "rows": len(ids),
+        "chunks": chunks,
+        "seconds": round(seconds, 6),
+        "rows_per_second": round(len(ids) / seconds, 1) if seconds > 0 else None,
+    }
+    return ids, stats
+
+def validate_and_insert_sync(table, rows, chunk_size=None, commit_mode=None):
+    # Las filas con claves foraneas inexistentes se apartan antes del INSERT
+    valid, rejected = fk_cache.check(table, rows)
+    ids, stats = bulk_insert_sync(table, [rows[i] for i in valid], chunk_size, commit_mode)
+    fk_cache.note_inserted(table.name, ids)
+    return valid, ids, stats, rejected
+
+async def bulk_insert(table, items, chunk_size=None, commit_mode=None):
+    rows = [table.values(item) for item in items]
+    valid, ids, stats, rejected = await run_db(
+        validate_and_insert_sync, table, rows, chunk_size, commit_mode)
+    return {
+        "items": [{table.pk: new_id, **items[i].dict()} for i, new_id in zip(valid, ids)],
+        "stats": stats,
+        "rejected": [{"index": i, "error": error} for i, error in rejected],
+    }
+
+BULK_STREAM_BATCH_SIZE = int(os.getenv("BULK_STREAM_BATCH_SIZE", "5000"))
+MAX_REPORTED_REJECTIONS = 1000
+
+STREAM_FORMATS = {
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json-seq": "ndjson",
+    "text/csv": "csv",
+}
+
+def stream_format(content_type):
+    return STREAM_FORMATS.get((content_type or "").split(";")[0].strip().lower())
+
+async def iter_lines(chunks):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+async def iter_records(chunks, fmt):
+    """Genera (indice, registro o None, error) a partir del cuerpo en streaming.
+
+    En CSV la primera linea es la cabecera y cada registro ocupa una linea."""
+    header = None
+    header_error = None
+    index = 0
+    async for raw in iter_lines(chunks):
+        # Una linea mal formada se rechaza sola; el resto del cuerpo se sigue procesando
+        try:
+            line = raw.decode("utf-8").strip("\r")
+        except UnicodeDecodeError as err:
+            if fmt == "csv" and header is None and header_error is None:
+                header_error = f"Cabecera CSV con UTF-8 invalido: {err}"
+                continue
+            yield index, None, f"UTF-8 invalido: {err}"
+            index += 1
+            continue
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            try:
+                values = next(csv.reader([line]))
+            except csv.Error as err:
+                values = None
+                error = err
+            if header is None and header_error is None:
+                if values is None:
+                    header_error = f"Cabecera CSV invalida: {error}"
+                else:
+                    header = [name.strip() for name in values]
+                continue
+            if header_error is not None:
+                yield index, None, header_error
+            elif values is None:
+                yield index, None, f"CSV invalido: {error}"
+            elif len(values) != len(header):
+                yield index, None, f"Se esperaban {len(header)} columnas y hay {len(values)}"
+            else:
+                yield index, {k: (v if v != "" else None) for k, v in zip(header, values)}, None
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError as err:
+                yield index, None, f"JSON invalido: {err}"
+            else:
+                if isinstance(record, dict):
+                    yield index, record, None
+                else:
+                    yield index, None, "Se esperaba un objeto JSON"
+        index += 1
+
+def _validation_message(err):
+    if isinstance(err, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(loc) for loc in e['loc'])}: {e['msg']}" for e in err.errors())
+    return str(err)
+
+def _insert_batch(table, batch_number, indexes, rows):
+    valid, ids, stats, rejected = validate_and_insert_sync(table, rows)
+    progress = {
+        "batch": batch_number,
+        "rows": stats["rows"],
+        "first_id": ids[0] if ids else None,
+        "last_id": ids[-1] if ids else None,
+        "seconds": stats["seconds"],
+        "rows_per_second": stats["rows_per_second"],
+    }
+    return progress, [{"index": indexes[i], "error": error} for i, error in rejected]
+
+async def bulk_insert_stream(table, model, chunks, fmt, batch_size=None):
+    """Valida fila por fila y va insertando por lotes mientras llega el cuerpo.
+
+    Solo hay un lote en vuelo a la vez: mientras se inserta se sigue leyendo el
+    siguiente, asi la memoria queda acotada a dos lotes."""
+    batch_size = batch_size or BULK_STREAM_BATCH_SIZE
+    start = time.perf_counter()
+    received = 0
+    rejected = []
+    rejected_count = 0
+    batches = []
+    pending = None
+    indexes = []
+    batch = []
+
+    def reject(index, error):
+        nonlocal rejected_count
+        rejected_count += 1
+        if len(rejected) < MAX_REPORTED_REJECTIONS:
+            rejected.append({"index": index, "error": error})
+
+    async def collect():
+        progress, fk_rejected = await pending
+        batches.append(progress)
+        for row in fk_rejected:
+            reject(row["index"], row["error"])
+
+    async def flush(batch_indexes, rows):
+        nonlocal pending
+        if pending is not None:
+            await collect()
+        pending = asyncio.ensure_future(
+            run_db(_insert_batch, table, len(batches) + 1, batch_indexes, rows))
+
+    try:
+        async for index, record, error in iter_records(chunks, fmt):
+            received += 1
+            if error is None:
+                try:
+                    item = model(**record)
+                except (ValidationError, TypeError) as err:
+                    error = _validation_message(err)
+            if error is not None:
+                reject(index, error)
+                continue
+            indexes.append(index)
+            batch.append(table.values(item))
+            if len(batch) >= batch_size:
+                await flush(indexes, batch)
+                indexes = []
+                batch = []
+        if batch:
+            await flush(indexes, batch)
+        if pending is not None:
+            await collect()
+            pending = None
+    except mysql.connector.Error as err:
+        pending = None
+        inserted = sum(b["rows"] for b in batches)
+        if inserted:
+            raise mysql.connector.errors.DatabaseError(
+                msg=f"{err.msg} ({inserted} filas ya confirmadas en {len(batches)} lotes)",
+                errno=err.errno, sqlstate=err.sqlstate) from err
+        raise
+    finally:
+        if pending is not None:
+            # El cliente corto la subida o fallo un lote: esperar al que esta en vuelo
+            await asyncio.gather(pending, return_exceptions=True)
+
+    seconds = time.perf_counter() - start
+    inserted = sum(b["rows"] for b in batches)
+    return {
+        "received": received,
+        "inserted": inserted,
+        "rejected_count": rejected_count,
+        "rejected": sorted(rejected, key=lambda row: row["index"]),
+        "batches": batches,
+        "seconds": round(seconds, 6),
+        "rows_per_second": round(inserted / seconds, 1) if seconds > 0 else None,
+    }
@@ -0,0 +1,144 @@
+import json
+import os
+import pickle
+import time
+from collections import OrderedDict
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# TTL en segundos por tabla; 0 desactiva el cache de esa tabla
+CACHE_TTLS = {
+    "departments": float(os.getenv("CACHE_TTL_DEPARTMENTS", "300")),
+    "suppliers": float(os.getenv("CACHE_TTL_SUPPLIERS", "300")),
+    "products": float(os.getenv("CACHE_TTL_PRODUCTS", "120")),
+    "customers": float(os.getenv("CACHE_TTL_CUSTOMERS", "60")),
+}
+
+def cache_key(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+class MemoryBackend:
+    """LRU en memoria del proceso, acotado por numero de entradas."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, entity, key):
+        """(valor o None, generacion); en memoria la generacion la lleva ResponseCache."""
+        entry = self._entries.get((entity, key))
+        if entry is None:
+            return None, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[(entity, key)]
+            self.expirations += 1
+            return None, None
+        self._entries.move_to_end((entity, key))
+        return value, None
+
+    async def set(self, entity, key, value, ttl, generation=None):
+        self._entries[(entity, key)] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end((entity, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def invalidate(self, entity):
+        for entry_key in [k for k in self._entries if k[0] == entity]:
+            del self._entries[entry_key]
+
+    def size(self):
+        return len(self._entries)
+
+class RedisBackend:
+    """Cache compartido entre workers. Invalidar incrementa la generacion de la
+    tabla, asi las claves viejas dejan de leerse y expiran solas por TTL.
+
+    set() escribe en la generacion leida por get() antes de la carga: si otro
+    worker invalido mientras tanto, el resultado queda en una generacion que ya
+    nadie lee."""
+
+    def __init__(self, url=CACHE_REDIS_URL, prefix="api-cache", client=None):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self._redis = client
+        self.prefix = prefix
+        self.evictions = 0
+        self.expirations = 0
+
+    async def _generation(self, entity):
+        return int(await self._redis.get(f"{self.prefix}:gen:{entity}") or 0)
+
+    async def get(self, entity, key):
+        generation = await self._generation(entity)
+        raw = await self._redis.get(f"{self.prefix}:{entity}:{generation}:{key}")
+        return (pickle.loads(raw) if raw is not None else None), generation
+
+    async def set(self, entity, key, value, ttl, generation=None):
+        if generation is None:
+            generation = await self._generation(entity)
+        await self._redis.set(f"{self.prefix}:{entity}:{generation}:{key}",
+                              pickle.dumps(value), px=int(ttl * 1000))
+
+    async def invalidate(self, entity):
+        await self._redis.incr(f"{self.prefix}:gen:{entity}")
+
+    def size(self):
+        return None
+
+class ResponseCache:
+    def __init__(self, backend, ttls=CACHE_TTLS):
+        self.backend = backend
+        self.ttls = ttls
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generations = {}
+
+    async def get_or_load(self, entity, params, load, cacheable=True):
+        ttl = self.ttls.get(entity, 0)
+        if ttl <= 0 or not cacheable:
+            return await load()
+        key = cache_key(params)
+        value, backend_generation = await self.backend.get(entity, key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        generation = self._generations.get(entity, 0)
+        value = await load()
+        # Si hubo una escritura mientras se leia, el resultado puede estar viejo
+        if self._generations.get(entity, 0) == generation:
+            await self.backend.set(entity, key, value, ttl, backend_generation)
+        return value
+
+    async def invalidate(self, entity):
+        if entity in self.ttls:
+            self.invalidations += 1
+            self._generations[entity] = self._generations.get(entity, 0) + 1
+            await self.backend.invalidate(entity)
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "expirations": self.backend.expirations,
+            "invalidations": self.invalidations,
+            "entries": self.backend.size(),
+            "ttls": self.ttls,
+        }
+
+def make_backend(name=CACHE_BACKEND):
+    if name == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+response_cache = ResponseCache(make_backend())
@@ -0,0 +1,102 @@
+"""Single-flight para listados: peticiones identicas simultaneas comparten una consulta.
+
+La clave incluye el ETag del listado, que ya depende de la version de las tablas,
+los filtros, el cursor, el limite y expand: una peticion que llega despues de una
+escritura nunca recibe un resultado leido antes de ella."""
+import asyncio
+import os
+from . import metrics
+from .admission import release_admission
+from .database import ActiveQueries, active_queries, read_after, submit_db
+
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Milisegundos que un resultado terminado se sigue compartiendo con peticiones nuevas
+COALESCE_WINDOW_MS = float(os.getenv("COALESCE_WINDOW_MS", "100"))
+
+class _Flight:
+    def __init__(self, task, queries):
+        self.task = task
+        self.queries = queries
+        self.waiters = 0
+        self.shared = 0
+
+class SingleFlight:
+    def __init__(self, window_ms=COALESCE_WINDOW_MS, enabled=COALESCE_ENABLED):
+        self.window = window_ms / 1000
+        self.enabled = enabled
+        self._flights = {}
+        self.executed = 0
+        self.joined = 0
+        self.window_hits = 0
+        self.abandoned = 0
+
+    async def do(self, entity, etag, load):
+        """Devuelve el resultado de load(), compartido con las peticiones de igual clave."""
+        if not self.enabled:
+            return await load()
+        # Con un X-Consistency-Token la lectura puede tener que ir a otro servidor
+        key = (entity, etag, read_after.get())
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._start(key, load)
+            self.executed += 1
+        elif flight.task.done():
+            self.window_hits += 1
+            metrics.coalesced_requests.inc(entity, "window")
+        else:
+            self.joined += 1
+            metrics.coalesced_requests.inc(entity, "in_flight")
+            # Esperar la consulta de otra peticion no usa la BD: el lugar de
+            # admision queda libre para lecturas que si la usan
+            release_admission()
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            # Solo se corta la consulta si ya nadie espera el resultado
+            if not flight.task.done() and flight.waiters == 1:
+                self.abandoned += 1
+                self._forget(key, flight)
+                flight.task.cancel()
+                submit_db(flight.queries.cancel)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _start(self, key, load):
+        # La consulta compartida tiene su propio registro de conexiones: la
+        # desconexion de quien la inicio no la cancela para los demas
+        queries = ActiveQueries()
+        token = active_queries.set(queries)
+        try:
+            task = asyncio.ensure_future(load())
+        finally:
+            active_queries.reset(token)
+        flight = _Flight(task, queries)
+        self._flights[key] = flight
+        task.add_done_callback(lambda _: self._finish(key, flight))
+        return flight
+
+    def _finish(self, key, flight):
+        if flight.task.cancelled() or flight.task.exception() is not None or self.window <= 0:
+            self._forget(key, flight)
+        else:
+            asyncio.get_running_loop().call_later(self.window, self._forget, key, flight)
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000,
+            "executed": self.executed,
+            "joined_in_flight": self.joined,
+            "window_hits": self.window_hits,
+            "queries_saved": self.joined + self.window_hits,
+            "abandoned": self.abandoned,
+            "in_flight": sum(1 for flight in self._flights.values() if not flight.task.done()),
+        }
+
+single_flight = SingleFlight()
@@ -0,0 +1,347 @@
+"""Compresion de respuestas (gzip/zstd segun Accept-Encoding) y descompresion
+incremental de cuerpos con Content-Encoding."""
+import itertools
+import os
+import zlib
+import zstandard
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+# Bytes maximos que entrega el descompresor por cada paso
+INFLATE_CHUNK_SIZE = 64 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+class BadCompressedBody(ValueError):
+    pass
+
+# Orden de preferencia del servidor cuando el cliente acepta varias
+ENCODINGS = ("zstd", "gzip")
+
+def choose_encoding(accept_encoding, encodings=ENCODINGS):
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    best = None
+    for encoding in encodings:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (encoding, q)
+    return best[0] if best else None
+
+class Compressor:
+    """Compresor en streaming: cada bloque se vacia para que el cliente lo reciba ya."""
+
+    def __init__(self, encoding, level=None):
+        if encoding == "zstd":
+            level = COMPRESSION_ZSTD_LEVEL if level is None else level
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+            self._sync = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            level = COMPRESSION_GZIP_LEVEL if level is None else level
+            # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._sync = zlib.Z_SYNC_FLUSH
+
+    def compress(self, data, final=False):
+        out = self._obj.compress(data)
+        return out + (self._obj.flush() if final else self._obj.flush(self._sync))
+
+def compress(data, encoding, level=None):
+    return Compressor(encoding, level).compress(data, final=True)
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+class _ZstdFrames:
+    """Sigue los limites de frame en los bytes comprimidos.
+
+    stream_reader no avisa si la entrada termina en medio de un frame; con esto
+    finish() puede rechazar un cuerpo cortado. Solo lee cabeceras y salta el
+    contenido de los bloques."""
+
+    def __init__(self):
+        self._state = "magic"
+        self._header = bytearray()
+        self._skip = 0
+        self._checksum = False
+        self.frames = 0
+
+    @property
+    def complete(self):
+        return self.frames > 0 and self._state == "magic" and not self._header and not self._skip
+
+    def _needed(self):
+        header = self._header
+        if self._state == "magic":
+            # Frame saltable (0x184D2A5?): magic y 4 bytes de largo
+            if len(header) >= 4 and header[0] & 0xF0 == 0x50 and header[1:4] == b"\x2a\x4d\x18":
+                return 8
+            return 4
+        if self._state == "frame":
+            if not header:
+                return 1
+            descriptor = header[0]
+            single_segment = descriptor >> 5 & 1
+            return (1 + (0 if single_segment else 1) + (0, 1, 2, 4)[descriptor & 3]
+                    + (single_segment, 2, 4, 8)[descriptor >> 6])
+        return 3
+
+    def _parse(self):
+        header = bytes(self._header)
+        self._header.clear()
+        if self._state == "magic":
+            if len(header) == 8:
+                self._skip = int.from_bytes(header[4:], "little")
+            elif header == _ZSTD_MAGIC:
+                self._state = "frame"
+            else:
+                raise ValueError("el cuerpo no es un frame zstd")
+        elif self._state == "frame":
+            self._checksum = bool(header[0] >> 2 & 1)
+            self._state = "block"
+        else:
+            value = int.from_bytes(header, "little")
+            block_type = value >> 1 & 3
+            if block_type == 3:
+                raise ValueError("bloque zstd invalido")
+            # Los bloques RLE ocupan un byte; los demas, el tamanio de la cabecera
+            self._skip = 1 if block_type == 1 else value >> 3
+            if value & 1:
+                self._skip += 4 if self._checksum else 0
+                self._state = "magic"
+                self.frames += 1
+
+    def feed(self, data):
+        view = memoryview(data)
+        while view:
+            if self._skip:
+                step = min(self._skip, len(view))
+                self._skip -= step
+                view = view[step:]
+                continue
+            needed = self._needed()
+            take = needed - len(self._header)
+            self._header += view[:take]
+            view = view[take:]
+            if len(self._header) == needed and self._needed() == needed:
+                self._parse()
+
+class _NeedInput(Exception):
+    pass
+
+class _InputBuffer:
+    """Fuente de stream_reader: entrega lo recibido y pide mas cuando se vacia."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.eof = False
+
+    def read(self, size=-1):
+        if not self.data:
+            if self.eof:
+                return b""
+            raise _NeedInput()
+        if size < 0:
+            size = len(self.data)
+        out = bytes(self.data[:size])
+        del self.data[:size]
+        return out
+
+class Decompressor:
+    def __init__(self, encoding):
+        self._zlib = encoding != "zstd"
+        if not self._zlib:
+            # stream_reader entrega la salida en lecturas acotadas; decompressobj
+            # inflaria de una vez todo lo que produce cada bloque recibido
+            self._input = _InputBuffer()
+            self._frames = _ZstdFrames()
+            self._obj = zstandard.ZstdDecompressor().stream_reader(
+                self._input, read_across_frames=True)
+        else:
+            # wbits=47: gzip o zlib detectado por la cabecera
+            self._obj = zlib.decompressobj(47)
+
+    def _read_zstd(self):
+        while True:
+            try:
+                out = self._obj.read1(INFLATE_CHUNK_SIZE)
+            except _NeedInput:
+                return
+            if not out:
+                return
+            yield out
+
+    def decompress(self, data):
+        """Genera el contenido descomprimido en bloques de a lo sumo INFLATE_CHUNK_SIZE."""
+        if self._zlib:
+            while data:
+                out = self._obj.decompress(data, INFLATE_CHUNK_SIZE)
+                if out:
+                    yield out
+                data = self._obj.unconsumed_tail
+        else:
+            self._frames.feed(data)
+            self._input.data += data
+            yield from self._read_zstd()
+
+    def finish(self):
+        if self._zlib:
+            tail = self._obj.flush()
+            if tail:
+                yield tail
+            complete = self._obj.eof
+        else:
+            self._input.eof = True
+            yield from self._read_zstd()
+            complete = self._frames.complete
+        if not complete:
+            raise ValueError("el cuerpo comprimido esta incompleto")
+
+def _header(headers, name):
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+def _vary_accept_encoding(headers):
+    """headers con Accept-Encoding en Vary: el cuerpo depende de lo que acepta el cliente."""
+    vary = _header(headers, b"vary")
+    if vary is None:
+        return headers + [(b"vary", b"Accept-Encoding")]
+    names = [name.strip().lower() for name in vary.split(",")]
+    if "accept-encoding" in names or "*" in names:
+        return headers
+    return ([(k, v) for k, v in headers if k.lower() != b"vary"]
+            + [(b"vary", f"{vary}, Accept-Encoding".encode("latin-1"))])
+
+async def _send_error(send, status, detail):
+    body = ('{"detail":"' + detail + '"}').encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+class CompressionMiddleware:
+    """Middleware ASGI de compresion en ambos sentidos.
+
+    Peticiones: un Content-Encoding gzip/zstd se descomprime a medida que llegan
+    los bloques del cuerpo, sin inflarlo entero en memoria.
+    Respuestas: se comprimen si el cliente lo acepta y el cuerpo supera
+    COMPRESSION_MIN_SIZE; las respuestas en streaming se comprimen bloque a bloque."""
+
+    def __init__(self, app, min_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = scope["headers"]
+        content_encoding = (_header(headers, b"content-encoding") or "identity").strip().lower()
+        if content_encoding != "identity":
+            if content_encoding not in ENCODINGS:
+                await _send_error(send, 415, f"Content-Encoding no soportado: {content_encoding}")
+                return
+            # El largo descomprimido no se conoce de antemano. Se cambia el scope
+            # original (no una copia): MetricsMiddleware lee de el la ruta resuelta
+            scope["headers"] = [(k, v) for k, v in headers
+                                if k.lower() not in (b"content-encoding", b"content-length",
+                                                     b"transfer-encoding")]
+            scope["headers"].append((b"transfer-encoding", b"chunked"))
+            receive = self._inflating_receive(receive, Decompressor(content_encoding))
+        encoding = choose_encoding(_header(headers, b"accept-encoding"))
+        await self.app(scope, receive, self._compressing_send(send, encoding))
+
+    def _inflating_receive(self, receive, decompressor):
+        pieces = iter(())
+        finished = False
+        end_sent = False
+
+        async def inflating_receive():
+            nonlocal pieces, finished, end_sent
+            while True:
+                # Se entrega un bloque descomprimido por llamada: la memoria queda
+                # acotada aunque el cuerpo comprimido tenga una razon muy alta
+                try:
+                    body = next(pieces, None)
+                except Exception as err:
+                    if isinstance(err, (zlib.error, ValueError, zstandard.ZstdError)):
+                        raise BadCompressedBody(str(err)) from err
+                    raise
+                if body is not None:
+                    return {"type": "http.request", "body": body, "more_body": True}
+                if finished:
+                    if end_sent:
+                        # Cuerpo completo: lo siguiente es la desconexion del cliente
+                        return await receive()
+                    end_sent = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                message = await receive()
+                if message["type"] != "http.request":
+                    return message
+                pieces = decompressor.decompress(message.get("body", b""))
+                if not message.get("more_body", False):
+                    finished = True
+                    pieces = itertools.chain(pieces, decompressor.finish())
+
+        return inflating_receive
+
+    def _compressing_send(self, send, encoding):
+        """send que comprime con encoding (None: el cliente solo acepta identity)."""
+        start = None
+        compressor = None
+
+        async def compressing_send(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                # Se retiene hasta ver el primer bloque del cuerpo
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = start["headers"]
+                content_type = _header(headers, b"content-type") or ""
+                compressible = (start["status"] not in (204, 304)
+                                and _header(headers, b"content-encoding") is None
+                                and content_type.startswith(COMPRESSIBLE_TYPES))
+                if compressible:
+                    # Tambien sin comprimir: un cache compartido no debe entregar esta
+                    # version a clientes que si aceptan compresion
+                    headers = _vary_accept_encoding(headers)
+                if (not compressible or encoding is None
+                        or (not more_body and len(body) < self.min_size)):
+                    await send({**start, "headers": headers})
+                    start = None
+                    await send(message)
+                    return
+                compressor = Compressor(encoding)
+                data = compressor.compress(body, final=not more_body)
+                headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode()))
+                if not more_body:
+                    headers.append((b"content-length", str(len(data)).encode()))
+                await send({**start, "headers": headers})
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+            await send({"type": "http.response.body",
+                        "body": compressor.compress(body, final=not more_body),
+                        "more_body": more_body})
+
+        return compressing_send
@@ -0,0 +1,43 @@
+"""Lectura de lo escrito con replicas: token de consistencia en cabecera.
+
+Cada escritura exitosa responde con X-Consistency-Token (epoch de la respuesta).
+Si el cliente lo reenvia en sus lecturas, estas van al primario o a una replica
+que ya aplico ese cambio durante DB_READ_YOUR_WRITES_WINDOW segundos."""
+import time
+from .database import require_fresh_reads
+
+TOKEN_HEADER = b"x-consistency-token"
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+def parse_token(value):
+    try:
+        token = float(value)
+    except (TypeError, ValueError):
+        return None
+    # Un token del futuro no puede exigir mas que "todo lo confirmado hasta ahora"
+    return min(token, time.time()) if token > 0 else None
+
+class ConsistencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        for key, value in scope["headers"]:
+            if key.lower() == TOKEN_HEADER:
+                require_fresh_reads(parse_token(value.decode("latin-1")))
+                break
+        if scope["method"] in READ_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_token(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                # La respuesta se arma despues del commit: el token lo cubre
+                token = f"{time.time():.3f}".encode()
+                message = {**message, "headers": list(message["headers"]) + [(TOKEN_HEADER, token)]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_token)
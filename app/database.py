@@ -1,13 +1,559 @@
+import asyncio
+import contextvars
+import functools
+import itertools
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import mysql.connector
 from dotenv import load_dotenv
+from . import metrics
 
 load_dotenv()
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME")
-    )
\ No newline at end of file
+class PoolTimeoutError(Exception):
+    pass
+
+class QueryTimeoutError(Exception):
+    pass
+
+class RequestCancelled(Exception):
+    pass
+
+# Errores de MySQL por tiempo maximo de ejecucion y por espera de bloqueos
+TIMEOUT_ERRNOS = (3024, 1205)
+
+def get_db_config():
+    return {
+        "host": os.getenv("DB_HOST"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "database": os.getenv("DB_NAME"),
+    }
+
+def get_replica_hosts():
+    """DB_REPLICA_HOSTS=host1,host2:3307 (mismo usuario, clave y base que el primario)."""
+    hosts = []
+    for entry in os.getenv("DB_REPLICA_HOSTS", "").split(","):
+        entry = entry.strip()
+        if entry:
+            host, _, port = entry.partition(":")
+            hosts.append({"host": host, "port": int(port)} if port else {"host": host})
+    return hosts
+
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "30"))
+DB_READ_YOUR_WRITES_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "5"))
+# Segundos que una lectura espera conexion de una replica antes de ir al primario
+DB_REPLICA_ACQUIRE_TIMEOUT = float(os.getenv("DB_REPLICA_ACQUIRE_TIMEOUT", "1"))
+
+def get_pool_config():
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_POOL_MAX_OVERFLOW", "10")),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "recycle": float(os.getenv("DB_POOL_RECYCLE", "3600")),
+        "pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+        "connect_timeout": float(os.getenv("DB_CONNECT_TIMEOUT", "10")),
+        "query_timeout": float(os.getenv("DB_QUERY_TIMEOUT", "30")),
+    }
+
+class InstrumentedCursor:
+    """Cursor que mide cada sentencia, las filas leidas y los errores."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._statement = "OTHER"
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _run(self, method, operation, params):
+        start = time.perf_counter()
+        try:
+            return method(operation, params)
+        except mysql.connector.Error as err:
+            metrics.db_errors.inc(metrics.statement_label(operation), err.errno or 0)
+            if err.errno in TIMEOUT_ERRNOS:
+                raise QueryTimeoutError(f"La consulta supero el tiempo maximo: {err.msg}") from err
+            raise
+        finally:
+            self._statement = metrics.record_query(
+                operation, params, time.perf_counter() - start)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._run(lambda op, p: self._cursor.execute(op, p, *args, **kwargs),
+                         operation, params)
+
+    def executemany(self, operation, seq_params):
+        return self._run(self._cursor.executemany, operation, seq_params)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        rows = method(*args)
+        metrics.db_fetch_seconds.observe(time.perf_counter() - start, self._statement)
+        if rows is None:
+            count = 0
+        elif isinstance(rows, list):
+            count = len(rows)
+        else:
+            count = 1
+        metrics.db_rows.inc(self._statement, amount=count)
+        return rows
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+def set_statement_timeout(cursor, seconds):
+    """Limite por sentencia de la sesion: SELECT (max_execution_time) y bloqueos."""
+    cursor.execute(f"SET SESSION max_execution_time = {int(seconds * 1000)}")
+    if seconds > 0:
+        cursor.execute(f"SET SESSION innodb_lock_wait_timeout = {max(1, int(seconds))}")
+
+class PooledConnection:
+    """Conexion prestada por el pool. close() la devuelve al pool en lugar de cerrarla."""
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self.created_at = created_at
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise mysql.connector.errors.OperationalError("Conexion ya devuelta al pool")
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        if self._conn is None:
+            raise mysql.connector.errors.OperationalError("Conexion ya devuelta al pool")
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def set_statement_timeout(self, seconds=None):
+        """Cambia el limite por sentencia de la sesion; None restaura el del pool."""
+        cursor = self.cursor()
+        try:
+            set_statement_timeout(cursor, self._pool.query_timeout if seconds is None else seconds)
+        finally:
+            cursor.close()
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._release(conn, self.created_at)
+
+    def invalidate(self):
+        # Cierra la conexion en vez de devolverla (p. ej. con resultados sin leer)
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._invalidate(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class ConnectionPool:
+    """Pool de conexiones MySQL con overflow, timeout de espera, ping y reciclaje."""
+
+    def __init__(self, pool_size=5, max_overflow=10, timeout=30.0, recycle=3600.0,
+                 pre_ping=True, connect_timeout=10.0, query_timeout=30.0, **connect_args):
+        if pool_size < 1:
+            raise ValueError("pool_size debe ser al menos 1")
+        self.pool_size = pool_size
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.query_timeout = query_timeout
+        self._connect_args = {**connect_args, "connection_timeout": max(1, int(connect_timeout))}
+        self._idle = []
+        self._total = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def max_connections(self):
+        return self.pool_size + self.max_overflow
+
+    def status(self):
+        with self._cond:
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "open": self._total,
+                "idle": len(self._idle),
+                "checked_out": self._total - len(self._idle),
+            }
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self._connect_args)
+        if self.query_timeout > 0:
+            cursor = conn.cursor()
+            try:
+                set_statement_timeout(cursor, self.query_timeout)
+            finally:
+                cursor.close()
+        return conn, time.monotonic()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("El pool de conexiones esta cerrado")
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    break
+                if self._total < self.max_connections:
+                    self._total += 1
+                    conn, created_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"No hay conexiones disponibles tras {timeout}s "
+                        f"({self.max_connections} en uso)")
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and self.recycle > 0 and time.monotonic() - created_at > self.recycle:
+                # Conexion demasiado vieja: se recicla
+                self._discard(conn)
+                conn = None
+            if conn is not None and self.pre_ping:
+                try:
+                    conn.ping(reconnect=False)
+                except mysql.connector.Error:
+                    self._discard(conn)
+                    conn = None
+            if conn is None:
+                conn, created_at = self._connect()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        metrics.db_acquire_seconds.observe(time.monotonic() - start)
+        return PooledConnection(self, conn, created_at)
+
+    def _release(self, conn, created_at):
+        healthy = True
+        try:
+            # No dejar transacciones abiertas para el siguiente que use la conexion
+            if conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            healthy = False
+        with self._cond:
+            if healthy and not self._closed and len(self._idle) < self.pool_size:
+                self._idle.append((conn, created_at))
+                conn = None
+            else:
+                self._total -= 1
+            self._cond.notify()
+        if conn is not None:
+            self._discard(conn)
+
+    def _invalidate(self, conn):
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+        self._discard(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+class Replica:
+    """Replica de lectura con su propio pool y el resultado del ultimo chequeo.
+
+    El chequeo usa una conexion propia fuera del pool: con el pool lleno de
+    lecturas la replica sigue sana y no debe marcarse caida."""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self._monitor = None
+        # Hasta el primer chequeo las lecturas van al primario
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+        self.error = None
+
+    def _status(self):
+        if self._monitor is None:
+            self._monitor, _ = self.pool._connect()
+        cursor = self._monitor.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except mysql.connector.errors.ProgrammingError as err:
+                if err.errno != 1064:
+                    raise
+                # MySQL anterior a 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+            return cursor.fetchall()
+        except mysql.connector.Error as err:
+            if err.errno != 1227:
+                raise
+            # Sin privilegio REPLICATION CLIENT: retraso desconocido
+            return None
+        finally:
+            cursor.close()
+
+    def check(self, max_lag=DB_REPLICA_MAX_LAG):
+        try:
+            status = self._status()
+        except mysql.connector.Error as err:
+            # Se vuelve a conectar en el proximo chequeo
+            self._close_monitor()
+            self.mark_down(err)
+            return
+        self.checked_at = time.time()
+        self.error = None
+        if status is None:
+            self.lag, self.healthy = None, True
+        elif not status:
+            # No es replica (p. ej. el mismo primario): sin retraso
+            self.lag, self.healthy = 0.0, True
+        else:
+            row = status[0]
+            lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+            # NULL: la replicacion esta detenida y los datos pueden ser viejos sin limite
+            self.lag = float(lag) if lag is not None else None
+            self.healthy = lag is not None and float(lag) <= max_lag
+            if lag is None:
+                self.error = "replicacion detenida"
+
+    def _close_monitor(self):
+        if self._monitor is not None:
+            self.pool._discard(self._monitor)
+            self._monitor = None
+
+    def close(self):
+        self._close_monitor()
+        self.pool.close()
+
+    def mark_down(self, err):
+        self.healthy = False
+        self.error = str(err)
+        self.checked_at = time.time()
+
+    def caught_up(self, after):
+        """True si la replica ya aplico todo lo confirmado antes de after (epoch)."""
+        if self.lag is None or self.checked_at is None:
+            return False
+        # Seconds_Behind_Source tiene resolucion de segundos: un segundo de margen
+        return self.checked_at - self.lag - 1 >= after
+
+    def status(self):
+        return {"healthy": self.healthy, "lag": self.lag, "checked_at": self.checked_at,
+                "error": self.error, **self.pool.status()}
+
+_pool = None
+_replicas = []
+_executor = None
+_monitor_stop = None
+_round_robin = itertools.count()
+
+class ActiveQueries:
+    """Conexiones en uso por una peticion, para matar sus consultas si se cancela.
+
+    Quitar una conexion espera a que termine un KILL en curso, asi nunca se mata
+    la consulta de otra peticion que reciba la conexion despues."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = {}
+        self.cancelled = False
+
+    def add(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise RequestCancelled("La peticion fue cancelada")
+            connection_id = getattr(conn, "connection_id", None)
+            if connection_id is not None:
+                self._connections[id(conn)] = (conn._pool, connection_id)
+
+    def remove(self, conn):
+        with self._lock:
+            self._connections.pop(id(conn), None)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            for pool, connection_id in self._connections.values():
+                try:
+                    with pool.acquire(timeout=1) as killer:
+                        cursor = killer.cursor()
+                        cursor.execute(f"KILL QUERY {int(connection_id)}")
+                        cursor.close()
+                except (mysql.connector.Error, PoolTimeoutError):
+                    pass
+
+# Consultas de la peticion en curso (lo fija app.admission)
+active_queries = contextvars.ContextVar("active_queries", default=None)
+
+# Epoch del ultimo cambio que la peticion en curso debe ver (lectura de lo escrito)
+read_after = contextvars.ContextVar("read_after", default=None)
+
+def require_fresh_reads(timestamp):
+    """Las lecturas siguientes de esta peticion no pueden ser anteriores a timestamp."""
+    current = read_after.get()
+    if timestamp is not None and (current is None or timestamp > current):
+        read_after.set(timestamp)
+
+def _monitor_replicas(stop):
+    while True:
+        for replica in _replicas:
+            replica.check()
+        if stop.wait(DB_REPLICA_CHECK_INTERVAL):
+            return
+
+def init_pool(**overrides):
+    global _pool, _executor, _monitor_stop
+    if _pool is None:
+        config = {**get_pool_config(), **get_db_config(), **overrides}
+        _pool = ConnectionPool(**config)
+        for host in get_replica_hosts():
+            name = host["host"] + (f":{host['port']}" if "port" in host else "")
+            _replicas.append(Replica(name, ConnectionPool(**{**config, **host})))
+        # Un hilo por conexion posible: el executor nunca bloquea esperando al pool
+        max_workers = _pool.max_connections + sum(r.pool.max_connections for r in _replicas)
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        if _replicas:
+            _monitor_stop = threading.Event()
+            threading.Thread(target=_monitor_replicas, args=(_monitor_stop,),
+                             name="db-replica-monitor", daemon=True).start()
+    return _pool
+
+def close_pool():
+    global _pool, _executor, _monitor_stop
+    if _monitor_stop is not None:
+        _monitor_stop.set()
+        _monitor_stop = None
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    for replica in _replicas:
+        replica.close()
+    _replicas.clear()
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+def get_pool():
+    if _pool is None:
+        raise RuntimeError("El pool de conexiones no se ha inicializado (init_pool)")
+    return _pool
+
+def replica_status():
+    return {replica.name: replica.status() for replica in _replicas}
+
+def choose_replica():
+    """Replica sana menos cargada; None si la lectura debe ir al primario."""
+    after = read_after.get()
+    now = time.time()
+    if after is not None and now - min(after, now) > DB_READ_YOUR_WRITES_WINDOW:
+        # Fuera de la ventana se asume que cualquier replica sana ya lo tiene
+        after = None
+    candidates = [r for r in _replicas
+                  if r.healthy and (after is None or r.caught_up(after))]
+    if not candidates:
+        return None
+    offset = next(_round_robin)
+    # Empate en carga: se reparte en turnos
+    return min(enumerate(candidates),
+               key=lambda item: (item[1].pool.status()["checked_out"],
+                                 (item[0] - offset) % len(candidates)))[1]
+
+def get_db_connection(read_only=False):
+    """Conexion del primario, o de una replica si read_only y hay alguna al dia."""
+    if read_only and _replicas:
+        replica = choose_replica()
+        if replica is not None:
+            try:
+                return replica.pool.acquire(
+                    timeout=min(replica.pool.timeout, DB_REPLICA_ACQUIRE_TIMEOUT))
+            except mysql.connector.Error as err:
+                # Replica caida: se marca y la lectura va al primario
+                replica.mark_down(err)
+            except PoolTimeoutError:
+                # Replica sana pero sin conexiones libres: la lectura va al primario
+                metrics.replica_fallbacks.inc(replica.name, "pool_timeout")
+    return get_pool().acquire()
+
+async def run_db(fn, *args, **kwargs):
+    """Ejecuta una funcion bloqueante de acceso a datos en el executor de la BD."""
+    if _executor is None:
+        raise RuntimeError("El pool de conexiones no se ha inicializado (init_pool)")
+    loop = asyncio.get_running_loop()
+    # Se copia el contexto para que el hilo vea read_after de la peticion
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _executor, functools.partial(context.run, fn, *args, **kwargs))
+
+def submit_db(fn, *args, **kwargs):
+    """Como run_db pero sin esperar el resultado (limpieza en segundo plano)."""
+    if _executor is None:
+        raise RuntimeError("El pool de conexiones no se ha inicializado (init_pool)")
+    return _executor.submit(fn, *args, **kwargs)
+
+@contextmanager
+def db_cursor(read_only=False, **cursor_args):
+    queries = active_queries.get()
+    conn = get_db_connection(read_only)
+    try:
+        if queries is not None:
+            queries.add(conn)
+        cursor = conn.cursor(**cursor_args)
+        try:
+            yield conn, cursor
+        finally:
+            cursor.close()
+    finally:
+        if queries is not None:
+            queries.remove(conn)
+        conn.close()
+
+def fetch_all_sync(query, params=None, read_only=False):
+    with db_cursor(read_only, dictionary=True) as (conn, cursor):
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+def execute_sync(query, params=None):
+    with db_cursor() as (conn, cursor):
+        cursor.execute(query, params)
+        conn.commit()
+        return cursor.lastrowid
+
+async def fetch_all(query, params=None, read_only=False):
+    return await run_db(fetch_all_sync, query, params, read_only)
+
+async def execute(query, params=None):
+    return await run_db(execute_sync, query, params)
@@ -0,0 +1,80 @@
+from . import tables
+from .database import db_cursor
+
+IN_BATCH = 1000
+
+# relacion -> (columna con el ID, tabla relacionada)
+RELATIONS = {
+    "departments": {
+        "head": ("department_head", tables.EMPLOYEES),
+    },
+    "employees": {
+        "department": ("department_id", tables.DEPARTMENTS),
+        "manager": ("manager_id", tables.EMPLOYEES),
+    },
+    "projects": {
+        "department": ("department_id", tables.DEPARTMENTS),
+        "employee": ("employee_id", tables.EMPLOYEES),
+        "manager": ("project_manager", tables.EMPLOYEES),
+    },
+    "products": {
+        "supplier": ("supplier_id", tables.SUPPLIERS),
+    },
+    "sales": {
+        "product": ("product_id", tables.PRODUCTS),
+        "customer": ("customer_id", tables.CUSTOMERS),
+        "supplier": ("supplier_id", tables.SUPPLIERS),
+        "employee": ("employee_id", tables.EMPLOYEES),
+        "project": ("project_id", tables.PROJECTS),
+    },
+}
+
+class InvalidExpandError(ValueError):
+    pass
+
+def parse_expand(table, expand):
+    names = [name.strip() for name in (expand or "").split(",") if name.strip()]
+    available = RELATIONS.get(table.name, {})
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise InvalidExpandError(
+            f"expand no soportado en {table.name}: {', '.join(unknown)}. "
+            f"Opciones: {', '.join(available) or 'ninguna'}")
+    # Se conserva el orden de RELATIONS para que la salida coincida con el modelo
+    return tuple(name for name in available if name in names)
+
+def ids_query(table, count, columns=None):
+    """SELECT de las filas con alguna de count claves primarias."""
+    columns = columns or (table.pk,) + table.columns
+    return (f"SELECT {', '.join(columns)} FROM {table.name} "
+            f"WHERE {table.pk} IN ({', '.join(['%s'] * count)})")
+
+def load_by_ids(cursor, table, ids):
+    """Una consulta WHERE pk IN (...) por cada bloque de IDs distintos."""
+    columns = (table.pk,) + table.columns
+    found = {}
+    ids = sorted(ids)
+    for i in range(0, len(ids), IN_BATCH):
+        part = ids[i:i + IN_BATCH]
+        cursor.execute(ids_query(table, len(part), columns), part)
+        for row in cursor.fetchall():
+            found[row[0]] = dict(zip(columns, row))
+    return found
+
+def load_rows_sync(table, ids):
+    """Filas por ID desde una replica; las que aun no llegaron a ella se leen del primario."""
+    with db_cursor(read_only=True) as (conn, cursor):
+        found = load_by_ids(cursor, table, ids)
+    missing = [row_id for row_id in ids if row_id not in found]
+    if missing:
+        with db_cursor() as (conn, cursor):
+            found.update(load_by_ids(cursor, table, missing))
+    return found
+
+def expand_items(cursor, table, items, relations):
+    for name in relations:
+        column, related = RELATIONS[table.name][name]
+        ids = {item[column] for item in items if item[column] is not None}
+        found = load_by_ids(cursor, related, ids) if ids else {}
+        for item in items:
+            item[name] = found.get(item[column])
@@ -0,0 +1,134 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from fastapi.responses import StreamingResponse
+from .database import get_db_connection, run_db, submit_db
+from .pagination import build_where
+
+EXPORT_CHUNK_SIZE = 5000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def json_default(value):
+    # Mismo formato que la respuesta JSON de los modelos
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+def encode_ndjson(columns, rows):
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=json_default, ensure_ascii=False) + "\n"
+        for row in rows
+    ).encode()
+
+def encode_csv(columns, rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+def _open_stream(query, params):
+    conn = get_db_connection(read_only=True)
+    try:
+        # Cursor sin buffer: las filas se leen del servidor a medida que se piden
+        # Una exportacion puede durar mas que DB_QUERY_TIMEOUT: sin limite mientras dure
+        conn.set_statement_timeout(0)
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query, params)
+    except Exception:
+        conn.invalidate()
+        raise
+    return conn, cursor
+
+def _close_stream(conn, cursor, exhausted):
+    if exhausted:
+        cursor.close()
+        conn.set_statement_timeout()
+        conn.close()
+    else:
+        # Quedan filas sin leer: es mas barato tirar la conexion que drenarla
+        conn.invalidate()
+
+class ExportStream:
+    """Filas de una consulta abierta, codificadas por bloques.
+
+    La conexion se devuelve una sola vez, termine como termine: al agotar las
+    filas, si el cliente corta o si la respuesta nunca llega a leer el cuerpo
+    (ExportResponse llama a close). Con una lectura en curso en otro hilo se
+    espera a que termine antes de cerrar la conexion."""
+
+    def __init__(self, conn, cursor, fmt, chunk_size):
+        self._conn = conn
+        self._cursor = cursor
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self._fetch = None
+        self._exhausted = False
+        self._closed = False
+
+    def __aiter__(self):
+        return self._iter_chunks()
+
+    async def _iter_chunks(self):
+        try:
+            columns = self._cursor.column_names
+            if self.fmt == "csv":
+                yield encode_csv(columns, [], header=True)
+            while not self._closed:
+                self._fetch = submit_db(self._cursor.fetchmany, self.chunk_size)
+                rows = await asyncio.wrap_future(self._fetch)
+                if not rows:
+                    self._exhausted = True
+                    break
+                if self.fmt == "csv":
+                    yield encode_csv(columns, rows)
+                else:
+                    yield encode_ndjson(columns, rows)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        fetch = self._fetch
+        if fetch is not None and not fetch.done():
+            # Cerrar ahora cortaria la conexion en medio de la lectura
+            fetch.add_done_callback(
+                lambda _: _close_stream(self._conn, self._cursor, False))
+        else:
+            submit_db(_close_stream, self._conn, self._cursor, self._exhausted)
+
+class ExportResponse(StreamingResponse):
+    """StreamingResponse que cierra la exportacion aunque el cuerpo no se llegue a pedir."""
+
+    def __init__(self, stream, fmt):
+        super().__init__(stream, media_type=MEDIA_TYPES[fmt])
+        self._stream = stream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._stream.close()
+
+def export_query(table, pk, filters=()):
+    conditions, params = build_where(filters)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return f"SELECT * FROM {table}{where} ORDER BY {pk}", tuple(params)
+
+async def stream_table(table, pk, fmt, filters=(), chunk_size=EXPORT_CHUNK_SIZE):
+    # La consulta se abre antes de responder para que los errores de SQL den 400
+    query, params = export_query(table, pk, filters)
+    conn, cursor = await run_db(_open_stream, query, params)
+    return ExportStream(conn, cursor, fmt, chunk_size)
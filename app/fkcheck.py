@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from .database import db_cursor
+from .expand import ids_query
+from .tables import TABLES
+
+FK_CACHE_TTL = float(os.getenv("FK_CACHE_TTL", "300"))
+FETCH_SIZE = 50000
+IN_BATCH = 1000
+
+def load_query(table):
+    return f"SELECT {table.pk} FROM {table.name}"
+
+class IdBitmap:
+    """Conjunto de IDs enteros positivos en un bit por ID (10M IDs ~ 1.2 MB)."""
+
+    def __init__(self):
+        self._bits = bytearray()
+        self.count = 0
+
+    def add(self, value):
+        if value is None or value < 0:
+            return
+        byte, bit = divmod(value, 8)
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte - len(self._bits) + 1 + len(self._bits) // 4))
+        if not self._bits[byte] & (1 << bit):
+            self._bits[byte] |= 1 << bit
+            self.count += 1
+
+    def __contains__(self, value):
+        if not isinstance(value, int) or value < 0:
+            return False
+        byte, bit = divmod(value, 8)
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << bit))
+
+    def __len__(self):
+        return self.count
+
+class ForeignKeyCache:
+    """IDs existentes por tabla, recargados cada FK_CACHE_TTL segundos.
+
+    Los IDs que no aparecen se vuelven a consultar en la BD antes de rechazar la
+    fila, asi un cache desactualizado nunca rechaza filas validas."""
+
+    def __init__(self, ttl=FK_CACHE_TTL):
+        self.ttl = ttl
+        self._ids = {}
+        self._loaded_at = {}
+        self._locks = {name: threading.Lock() for name in TABLES}
+
+    def _load(self, cursor, table):
+        ids = IdBitmap()
+        cursor.execute(load_query(table))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for (value,) in rows:
+                ids.add(value)
+        return ids
+
+    def ids(self, cursor, table_name):
+        loaded_at = self._loaded_at.get(table_name)
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+            with self._locks[table_name]:
+                loaded_at = self._loaded_at.get(table_name)
+                if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+                    self._ids[table_name] = self._load(cursor, TABLES[table_name])
+                    self._loaded_at[table_name] = time.monotonic()
+        return self._ids[table_name]
+
+    def _recheck(self, cursor, table_name, values):
+        table = TABLES[table_name]
+        ids = self._ids[table_name]
+        values = [v for v in values if isinstance(v, int)]
+        for i in range(0, len(values), IN_BATCH):
+            part = values[i:i + IN_BATCH]
+            cursor.execute(ids_query(table, len(part), (table.pk,)), part)
+            for (value,) in cursor.fetchall():
+                ids.add(value)
+
+    def note_inserted(self, table_name, new_ids):
+        ids = self._ids.get(table_name)
+        if ids is not None:
+            for value in new_ids:
+                ids.add(value)
+
+    def invalidate(self, table_name=None):
+        if table_name is None:
+            self._loaded_at.clear()
+        else:
+            self._loaded_at.pop(table_name, None)
+
+    def check(self, table, rows):
+        """Devuelve (posiciones validas, [(posicion, error)]) para filas en el orden de table.columns."""
+        if not table.foreign_keys:
+            return list(range(len(rows))), []
+        positions = {column: table.columns.index(column) for column in table.foreign_keys}
+        with db_cursor() as (conn, cursor):
+            for column, ref in table.foreign_keys.items():
+                ids = self.ids(cursor, ref)
+                missing = {row[positions[column]] for row in rows
+                           if row[positions[column]] is not None
+                           and row[positions[column]] not in ids}
+                if missing:
+                    self._recheck(cursor, ref, missing)
+        valid = []
+        rejected = []
+        for position, row in enumerate(rows):
+            errors = [
+                f"{column}={row[positions[column]]} no existe en {ref}"
+                for column, ref in table.foreign_keys.items()
+                if row[positions[column]] is not None
+                and row[positions[column]] not in self._ids[ref]
+            ]
+            if errors:
+                rejected.append((position, "; ".join(errors)))
+            else:
+                valid.append(position)
+        return valid, rejected
+
+fk_cache = ForeignKeyCache()
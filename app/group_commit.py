@@ -0,0 +1,161 @@
+import asyncio
+import os
+import mysql.connector
+from mysql.connector import errorcode
+from .admission import release_admission
+from .bulk import bulk_insert_sync, insert_row_sync
+from .database import run_db
+from .fkcheck import fk_cache
+from .tables import SALES
+
+SALES_GROUP_COMMIT = os.getenv("SALES_GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+GROUP_COMMIT_MAX_ROWS = int(os.getenv("GROUP_COMMIT_MAX_ROWS", "500"))
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "5"))
+GROUP_COMMIT_MAX_QUEUE = int(os.getenv("GROUP_COMMIT_MAX_QUEUE", "10000"))
+
+class GroupCommitQueueFull(Exception):
+    pass
+
+def _fail(future, err):
+    if not future.done():
+        future.set_exception(err)
+
+class GroupCommitBuffer:
+    """Agrupa INSERTs concurrentes de una tabla en un INSERT multi-fila y un commit.
+
+    Cada llamada a submit() espera a que su lote quede confirmado y recibe su
+    propio ID. Un lote sale al llegar a max_rows filas o cuando la fila mas
+    antigua lleva max_delay_ms esperando."""
+
+    def __init__(self, table, max_rows=GROUP_COMMIT_MAX_ROWS,
+                 max_delay_ms=GROUP_COMMIT_MAX_DELAY_MS, max_queue=GROUP_COMMIT_MAX_QUEUE):
+        self.table = table
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.max_queue = max_queue
+        self._queue = []
+        self._not_empty = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = None
+        self._closing = False
+        self.flushes = 0
+        self.rows = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Deja de aceptar filas y espera a que se confirme todo lo pendiente
+        self._closing = True
+        self._not_empty.set()
+        self._full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def submit(self, values):
+        if self._closing:
+            raise GroupCommitQueueFull("La cola de escritura se esta cerrando")
+        if len(self._queue) >= self.max_queue:
+            raise GroupCommitQueueFull(
+                f"Cola de escritura llena ({self.max_queue} filas pendientes)")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((loop.time(), values, future))
+        self._not_empty.set()
+        if len(self._queue) >= self.max_rows:
+            self._full.set()
+        # La espera la acota max_queue, no el control de admision: con el lugar
+        # tomado, un lote nunca tendria mas filas que ADMISSION_WRITE_LIMIT
+        release_admission()
+        return await future
+
+    def status(self):
+        return {
+            "queued": len(self._queue),
+            "flushes": self.flushes,
+            "rows": self.rows,
+            "avg_rows_per_flush": round(self.rows / self.flushes, 1) if self.flushes else None,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._not_empty.wait()
+            if not self._queue:
+                if self._closing:
+                    return
+                self._not_empty.clear()
+                continue
+            deadline = self._queue[0][0] + self.max_delay
+            while len(self._queue) < self.max_rows and not self._closing:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            await self._flush_next()
+
+    async def _flush_next(self):
+        batch = self._queue[:self.max_rows]
+        del self._queue[:self.max_rows]
+        if not self._queue and not self._closing:
+            self._not_empty.clear()
+        rows = [values for _, values, _ in batch]
+        futures = [future for _, _, future in batch]
+        try:
+            # Las filas con claves foraneas inexistentes se rechazan solas y el
+            # resto del lote sigue yendo en un solo INSERT
+            valid, rejected = await run_db(fk_cache.check, self.table, rows)
+            for position, error in rejected:
+                _fail(futures[position], mysql.connector.errors.IntegrityError(
+                    msg=error, errno=errorcode.ER_NO_REFERENCED_ROW_2, sqlstate="23000"))
+            rows = [rows[i] for i in valid]
+            futures = [futures[i] for i in valid]
+            if not rows:
+                return
+            ids, _ = await run_db(bulk_insert_sync, self.table, rows, len(rows), "batch")
+        except mysql.connector.Error:
+            # Otro error de una fila (duplicado, valor fuera de rango): se reintenta fila por fila
+            await self._insert_one_by_one(rows, futures)
+            return
+        except Exception as err:
+            for future in futures:
+                _fail(future, err)
+            return
+        fk_cache.note_inserted(self.table.name, ids)
+        self.flushes += 1
+        self.rows += len(ids)
+        for future, new_id in zip(futures, ids):
+            if not future.done():
+                future.set_result(new_id)
+
+    async def _insert_one_by_one(self, rows, futures):
+        for values, future in zip(rows, futures):
+            try:
+                new_id = await run_db(insert_row_sync, self.table, values)
+            except Exception as err:
+                _fail(future, err)
+                continue
+            fk_cache.note_inserted(self.table.name, [new_id])
+            self.flushes += 1
+            self.rows += 1
+            if not future.done():
+                future.set_result(new_id)
+
+sales_buffer = None
+
+def start_group_commit():
+    global sales_buffer
+    if SALES_GROUP_COMMIT and sales_buffer is None:
+        sales_buffer = GroupCommitBuffer(SALES)
+        sales_buffer.start()
+
+async def stop_group_commit():
+    global sales_buffer
+    if sales_buffer is not None:
+        await sales_buffer.stop()
+        sales_buffer = None
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time
+from decimal import Decimal
+from .database import db_cursor, run_db
+from .expand import load_rows_sync
+from .tables import EMPLOYEES
+
+HIERARCHY_TTL = float(os.getenv("HIERARCHY_TTL", "300"))
+FETCH_SIZE = 50000
+LOAD_QUERY = "SELECT employee_id, manager_id, salary FROM employees"
+
+class EmployeeNotFound(LookupError):
+    pass
+
+class OrgIndex:
+    """Arbol de managers en memoria con totales por subarbol.
+
+    Se carga con una sola consulta y se recarga cada HIERARCHY_TTL segundos;
+    create_employee y los /bulk/ lo actualizan al insertar, sumando cada nuevo
+    empleado a los totales de todos sus managers (costo proporcional a la profundidad)."""
+
+    def __init__(self, ttl=HIERARCHY_TTL):
+        self.ttl = ttl
+        self._manager = {}
+        self._children = {}
+        self._salary = {}
+        self._headcount = {}
+        self._total_salary = {}
+        self._loaded_at = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        # Inserciones que llegan mientras se recarga: se aplican sobre la carga nueva
+        self._pending = None
+
+    @staticmethod
+    def _load_sync():
+        manager = {}
+        salary = {}
+        with db_cursor() as (conn, cursor):
+            # Recorre la tabla entera: con millones de filas supera DB_QUERY_TIMEOUT
+            conn.set_statement_timeout(0)
+            try:
+                cursor.execute(LOAD_QUERY)
+                while True:
+                    rows = cursor.fetchmany(FETCH_SIZE)
+                    if not rows:
+                        break
+                    for employee_id, manager_id, employee_salary in rows:
+                        manager[employee_id] = manager_id
+                        salary[employee_id] = Decimal(employee_salary)
+            finally:
+                conn.set_statement_timeout()
+        return manager, salary
+
+    def _build(self, manager, salary):
+        children = {employee_id: [] for employee_id in manager}
+        roots = []
+        for employee_id in sorted(manager):
+            parent = manager[employee_id]
+            if parent in children and parent != employee_id:
+                children[parent].append(employee_id)
+            else:
+                roots.append(employee_id)
+        # Orden por niveles desde las raices; los ciclos (datos corruptos) quedan fuera
+        order = list(roots)
+        for employee_id in order:
+            order.extend(children[employee_id])
+        headcount = {employee_id: 1 for employee_id in manager}
+        total_salary = dict(salary)
+        for employee_id in reversed(order):
+            parent = manager[employee_id]
+            if parent in children and parent != employee_id:
+                headcount[parent] += headcount[employee_id]
+                total_salary[parent] += total_salary[employee_id]
+        self._manager = manager
+        self._children = children
+        self._salary = salary
+        self._headcount = headcount
+        self._total_salary = total_salary
+
+    async def ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl:
+            return
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                return
+            generation = self._generation
+            self._pending = []
+            try:
+                manager, salary = await run_db(self._load_sync)
+                self._build(manager, salary)
+                pending, self._pending = self._pending, None
+                self._apply(pending)
+            finally:
+                self._pending = None
+            # Si se invalido durante la carga, la proxima consulta vuelve a cargar
+            self._loaded_at = time.monotonic() if generation == self._generation else None
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = None
+
+    def note_inserted(self, employees):
+        """employees: dicts con employee_id, manager_id y salary ya confirmados."""
+        if self._pending is not None:
+            self._pending.extend(employees)
+        if self._loaded_at is not None:
+            self._apply(employees)
+
+    def _apply(self, employees):
+        for employee in employees:
+            employee_id = employee["employee_id"]
+            if employee_id in self._manager:
+                continue
+            parent = employee["manager_id"]
+            salary = Decimal(employee["salary"])
+            self._manager[employee_id] = parent
+            self._children[employee_id] = []
+            self._salary[employee_id] = salary
+            self._headcount[employee_id] = 1
+            self._total_salary[employee_id] = salary
+            if parent in self._children:
+                self._children[parent].append(employee_id)
+            steps = 0
+            while parent in self._children and steps < len(self._manager):
+                self._headcount[parent] += 1
+                self._total_salary[parent] += salary
+                parent = self._manager[parent]
+                steps += 1
+
+    def _check(self, employee_id):
+        if employee_id not in self._manager:
+            raise EmployeeNotFound(f"Empleado {employee_id} no encontrado")
+
+    def reports(self, employee_id, depth=None, limit=None):
+        """Subordinados por niveles: [(id, nivel)] y el total hasta esa profundidad."""
+        self._check(employee_id)
+        found = []
+        total = 0
+        level = [employee_id]
+        # Un ciclo de managers (datos corruptos) no se recorre mas de una vez
+        seen = {employee_id}
+        current = 0
+        while level and (depth is None or current < depth):
+            if depth is None and limit is not None and len(found) >= limit:
+                # Sin limite de profundidad el total sale de los conteos del subarbol
+                return found[:limit], self._headcount[employee_id] - 1
+            current += 1
+            level = [child for parent in level for child in self._children[parent]
+                     if child not in seen]
+            seen.update(level)
+            total += len(level)
+            if limit is None or len(found) < limit:
+                found.extend((child, current) for child in level)
+        return (found if limit is None else found[:limit]), total
+
+    def chain(self, employee_id):
+        """Managers desde el jefe directo hasta la raiz: [(id, niveles hacia arriba)]."""
+        self._check(employee_id)
+        chain = []
+        seen = {employee_id}
+        parent = self._manager[employee_id]
+        while parent in self._manager and parent not in seen:
+            chain.append((parent, len(chain) + 1))
+            seen.add(parent)
+            parent = self._manager[parent]
+        return chain
+
+    def totals(self, employee_id):
+        self._check(employee_id)
+        headcount = self._headcount[employee_id]
+        total_salary = self._total_salary[employee_id]
+        return {
+            "employee_id": employee_id,
+            "headcount": headcount,
+            "total_salary": total_salary,
+            "avg_salary": round(total_salary / headcount, 2),
+        }
+
+    def children(self, employee_id):
+        self._check(employee_id)
+        return list(self._children[employee_id])
+
+    def status(self):
+        return {"employees": len(self._manager), "loaded": self._loaded_at is not None}
+
+org_index = OrgIndex()
+
+async def employee_nodes(pairs):
+    """[(id, nivel)] -> filas de empleados con su nivel, en el mismo orden."""
+    rows = await run_db(load_rows_sync, EMPLOYEES, [employee_id for employee_id, _ in pairs])
+    return [{**rows[employee_id], "depth": depth}
+            for employee_id, depth in pairs if employee_id in rows]
@@ -1,12 +1,135 @@
-from fastapi import FastAPI
+import gc
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app import metrics
+from app.compression import CompressionMiddleware, BadCompressedBody
+from app.consistency import ConsistencyMiddleware
+from app.admission import AdmissionMiddleware, admission_status
+from app.database import (init_pool, close_pool, get_pool, replica_status,
+                          PoolTimeoutError, QueryTimeoutError)
+from app.analytics import InvalidGroupByError
+from app.group_commit import start_group_commit, stop_group_commit, GroupCommitQueueFull
+from app import group_commit
+from app.cache import response_cache
+from app.pagination import InvalidCursorError
+from app.expand import InvalidExpandError
 from app.routes import router
 
-app = FastAPI()
+GC_FREEZE = os.getenv("GC_FREEZE", "true").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un solo pool de conexiones para toda la vida de la aplicacion
+    # Las tablas (incluida sales_rollup) las crea `python -m app.schema migrate`
+    init_pool()
+    start_group_commit()
+    if GC_FREEZE:
+        # Modulos, rutas y modelos viven todo el proceso: una vez fuera de las
+        # colecciones del recolector, cada coleccion completa recorre menos objetos
+        gc.collect()
+        gc.freeze()
+    try:
+        yield
+    finally:
+        await stop_group_commit()
+        close_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(router)
 
+# Limite de trabajo en vuelo por clase de ruta (503 con Retry-After al saturarse)
+app.add_middleware(AdmissionMiddleware)
+# Token de lectura de lo escrito para enrutar lecturas a replicas al dia
+app.add_middleware(ConsistencyMiddleware)
+# Compresion de peticiones y respuestas
+app.add_middleware(CompressionMiddleware)
+# Duracion y bytes por ruta; el tiempo de SQL se mide en el cursor (app.database).
+# Se agrega despues para quedar por fuera y contar los bytes ya comprimidos.
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.title = "API de Josue"
 
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)},
+                        headers={"Retry-After": "1"})
+
+@app.exception_handler(QueryTimeoutError)
+async def query_timeout_handler(request: Request, exc: QueryTimeoutError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)},
+                        headers={"Retry-After": "1"})
+
+@app.exception_handler(GroupCommitQueueFull)
+async def group_commit_full_handler(request: Request, exc: GroupCommitQueueFull):
+    return JSONResponse(status_code=503, content={"detail": str(exc)},
+                        headers={"Retry-After": "1"})
+
+@app.exception_handler(InvalidGroupByError)
+async def invalid_group_by_handler(request: Request, exc: InvalidGroupByError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(BadCompressedBody)
+async def bad_compressed_body_handler(request: Request, exc: BadCompressedBody):
+    return JSONResponse(status_code=400, content={"detail": f"Cuerpo comprimido invalido: {exc}"})
+
+@app.exception_handler(InvalidExpandError)
+async def invalid_expand_handler(request: Request, exc: InvalidExpandError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+def _pool_gauges():
+    try:
+        status = get_pool().status()
+    except RuntimeError:
+        return []
+    return [((key,), value) for key, value in status.items()]
+
+def _replica_gauges():
+    gauges = []
+    for name, status in replica_status().items():
+        for key, value in status.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                gauges.append(((name, key), value))
+    return gauges
+
+def _admission_gauges():
+    return [((name, key), value) for name, status in admission_status().items()
+            for key, value in status.items()]
+
+def _cache_gauges():
+    return [((key,), value) for key, value in response_cache.stats().items()
+            if isinstance(value, (int, float))]
+
+def _group_commit_gauges():
+    if group_commit.sales_buffer is None:
+        return []
+    return [((key,), value) for key, value in group_commit.sales_buffer.status().items()
+            if isinstance(value, (int, float))]
+
+metrics.register(metrics.Gauges("db_pool", "Estado del pool de conexiones", ("field",),
+                                _pool_gauges))
+metrics.register(metrics.Gauges("db_replica", "Estado de las replicas de lectura",
+                                ("replica", "field"), _replica_gauges))
+metrics.register(metrics.Gauges("admission", "Control de admision por clase de ruta",
+                                ("route_class", "field"), _admission_gauges))
+metrics.register(metrics.Gauges("response_cache", "Estadisticas de la cache de respuestas",
+                                ("field",), _cache_gauges))
+metrics.register(metrics.Gauges("sales_group_commit", "Estado del group commit de ventas",
+                                ("field",), _group_commit_gauges))
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 async def root():
     return {"message": "Bienvenido a la API de Josue"}
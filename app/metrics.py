@@ -0,0 +1,207 @@
+"""Metricas en formato de texto de Prometheus y log de consultas lentas."""
+import logging
+import os
+import re
+import threading
+import time
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+slow_query_log = logging.getLogger("app.slow_query")
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+def _labels_text(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labels, values)} {total}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _labels_text(self.labels + ("le",), values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _labels_text(self.labels + ("le",), values + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                base = _labels_text(self.labels, values)
+                lines.append(f"{self.name}_sum{base} {total}")
+                lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+class Gauges:
+    """Valores instantaneos calculados al momento de leer /metrics."""
+
+    def __init__(self, name, help_text, labels, collect):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for values, value in self.collect():
+            if value is not None:
+                lines.append(f"{self.name}{_labels_text(self.labels, values)} {value}")
+        return lines
+
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+http_request_seconds = register(Histogram(
+    "http_request_duration_seconds", "Duracion de las peticiones HTTP",
+    ("method", "route", "status")))
+http_response_bytes = register(Histogram(
+    "http_response_size_bytes", "Bytes enviados en el cuerpo de la respuesta",
+    ("method", "route"), BYTES_BUCKETS))
+db_acquire_seconds = register(Histogram(
+    "db_connection_acquire_seconds", "Espera para obtener una conexion del pool"))
+db_query_seconds = register(Histogram(
+    "db_query_duration_seconds", "Tiempo de ejecucion de cada sentencia SQL",
+    ("statement",)))
+db_fetch_seconds = register(Histogram(
+    "db_fetch_duration_seconds", "Tiempo leyendo filas del servidor", ("statement",)))
+db_rows = register(Counter(
+    "db_rows_returned_total", "Filas leidas por sentencia", ("statement",)))
+db_errors = register(Counter(
+    "db_errors_total", "Errores de MySQL por sentencia", ("statement", "errno")))
+admission_rejected = register(Counter(
+    "admission_rejected_total", "Peticiones rechazadas con 503 por control de admision",
+    ("route_class", "reason")))
+requests_cancelled = register(Counter(
+    "requests_cancelled_total", "Peticiones canceladas por desconexion del cliente",
+    ("route_class",)))
+coalesced_requests = register(Counter(
+    "coalesced_requests_total", "Listados servidos con la consulta de otra peticion identica",
+    ("table", "kind")))
+replica_fallbacks = register(Counter(
+    "db_replica_fallbacks_total", "Lecturas enviadas al primario por una replica sin conexiones libres",
+    ("replica", "reason")))
+json_encode_seconds = register(Histogram(
+    "json_encode_duration_seconds", "Tiempo codificando respuestas JSON"))
+
+_STATEMENT_RE = re.compile(
+    r"^\s*(?:(SELECT)\b.*?\bFROM\s+`?(\w+)|(INSERT)\s+INTO\s+`?(\w+)|(UPDATE)\s+`?(\w+)"
+    r"|(DELETE)\s+FROM\s+`?(\w+)|(\w+))", re.IGNORECASE | re.DOTALL)
+_VALUES_RE = re.compile(r"(\(\s*%s(?:\s*,\s*%s)*\s*\))(?:\s*,\s*\(\s*%s(?:\s*,\s*%s)*\s*\))+")
+_IN_RE = re.compile(r"IN\s*\(\s*%s(?:\s*,\s*%s)+\s*\)", re.IGNORECASE)
+
+def statement_label(sql):
+    """Verbo y tabla principal, p. ej. "SELECT sales" (cardinalidad acotada)."""
+    match = _STATEMENT_RE.match(sql)
+    if match is None:
+        return "OTHER"
+    parts = [part for part in match.groups() if part]
+    return " ".join([parts[0].upper()] + parts[1:2])
+
+def normalize_sql(sql):
+    sql = " ".join(sql.split())
+    sql = _VALUES_RE.sub(lambda m: f"{m.group(1)}, ... x{m.group(0).count('(')}", sql)
+    return _IN_RE.sub(lambda m: f"IN (... x{m.group(0).count('%s')})", sql)
+
+def params_shape(params):
+    if params is None:
+        return "none"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    params = list(params)
+    if len(params) > 20:
+        kinds = sorted({type(value).__name__ for value in params})
+        return f"[{len(params)} valores: {', '.join(kinds)}]"
+    return "[" + ", ".join(type(value).__name__ for value in params) + "]"
+
+def record_query(sql, params, seconds):
+    label = statement_label(sql)
+    db_query_seconds.observe(seconds, label)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_query_log.warning("consulta lenta %.1f ms: %s params=%s",
+                               seconds * 1000, normalize_sql(sql), params_shape(params))
+    return label
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """Middleware ASGI: duracion y bytes por ruta, tambien en respuestas en streaming."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        sent = 0
+
+        async def send_wrapper(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope.get("method", "")
+            http_request_seconds.observe(time.perf_counter() - start, method, path, status)
+            http_response_bytes.observe(sent, method, path)
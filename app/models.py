@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import date
-from typing import Optional
+from typing import List, Optional
 from decimal import Decimal
 
 class DepartmentCreate(BaseModel):
@@ -106,4 +106,189 @@ class Sale(BaseModel):
     customer_id: int = Field(..., description="ID del cliente")
     supplier_id: int = Field(..., description="ID del proveedor")
     employee_id: int = Field(..., description="ID del empleado")
-    project_id: Optional[int] = Field(None, description="ID del proyecto")
\ No newline at end of file
+    project_id: Optional[int] = Field(None, description="ID del proyecto")
+
+class CustomerPage(BaseModel):
+    items: List[Customer] = Field(..., description="Clientes de la pagina")
+    next_cursor: Optional[str] = Field(None, description="Cursor de la siguiente pagina")
+
+class SupplierPage(BaseModel):
+    items: List[Supplier] = Field(..., description="Proveedores de la pagina")
+    next_cursor: Optional[str] = Field(None, description="Cursor de la siguiente pagina")
+
+class SalePage(BaseModel):
+    items: List[Sale] = Field(..., description="Ventas de la pagina")
+    next_cursor: Optional[str] = Field(None, description="Cursor de la siguiente pagina")
+
+
+class RejectedRow(BaseModel):
+    index: int = Field(..., description="Posicion de la fila en el cuerpo (desde 0)")
+    error: str = Field(..., description="Motivo del rechazo")
+
+class BulkStats(BaseModel):
+    rows: int = Field(..., description="Filas insertadas")
+    chunks: int = Field(..., description="Sentencias INSERT ejecutadas")
+    seconds: float = Field(..., description="Tiempo de insercion en segundos")
+    rows_per_second: Optional[float] = Field(None, description="Filas por segundo")
+
+class DepartmentBulkResult(BaseModel):
+    items: List[Department] = Field(..., description="Departamentos creados")
+    stats: BulkStats = Field(..., description="Estadisticas de la carga")
+    rejected: List[RejectedRow] = Field(..., description="Filas apartadas por claves foraneas inexistentes")
+
+class EmployeeBulkResult(BaseModel):
+    items: List[Employee] = Field(..., description="Empleados creados")
+    stats: BulkStats = Field(..., description="Estadisticas de la carga")
+    rejected: List[RejectedRow] = Field(..., description="Filas apartadas por claves foraneas inexistentes")
+
+class ProjectBulkResult(BaseModel):
+    items: List[Project] = Field(..., description="Proyectos creados")
+    stats: BulkStats = Field(..., description="Estadisticas de la carga")
+    rejected: List[RejectedRow] = Field(..., description="Filas apartadas por claves foraneas inexistentes")
+
+class CustomerBulkResult(BaseModel):
+    items: List[Customer] = Field(..., description="Clientes creados")
+    stats: BulkStats = Field(..., description="Estadisticas de la carga")
+    rejected: List[RejectedRow] = Field(..., description="Filas apartadas por claves foraneas inexistentes")
+
+class SupplierBulkResult(BaseModel):
+    items: List[Supplier] = Field(..., description="Proveedores creados")
+    stats: BulkStats = Field(..., description="Estadisticas de la carga")
+    rejected: List[RejectedRow] = Field(..., description="Filas apartadas por claves foraneas inexistentes")
+
+class ProductBulkResult(BaseModel):
+    items: List[Product] = Field(..., description="Productos creados")
+    stats: BulkStats = Field(..., description="Estadisticas de la carga")
+    rejected: List[RejectedRow] = Field(..., description="Filas apartadas por claves foraneas inexistentes")
+
+class SaleBulkResult(BaseModel):
+    items: List[Sale] = Field(..., description="Ventas creados")
+    stats: BulkStats = Field(..., description="Estadisticas de la carga")
+    rejected: List[RejectedRow] = Field(..., description="Filas apartadas por claves foraneas inexistentes")
+
+class BulkBatchProgress(BaseModel):
+    batch: int = Field(..., description="Numero de lote")
+    rows: int = Field(..., description="Filas insertadas en el lote")
+    first_id: Optional[int] = Field(None, description="Primer ID generado")
+    last_id: Optional[int] = Field(None, description="Ultimo ID generado")
+    seconds: float = Field(..., description="Tiempo de insercion del lote")
+    rows_per_second: Optional[float] = Field(None, description="Filas por segundo")
+
+class BulkStreamResult(BaseModel):
+    received: int = Field(..., description="Filas recibidas")
+    inserted: int = Field(..., description="Filas insertadas")
+    rejected_count: int = Field(..., description="Filas rechazadas")
+    rejected: List[RejectedRow] = Field(..., description="Detalle de las filas rechazadas")
+    batches: List[BulkBatchProgress] = Field(..., description="Progreso por lote")
+    seconds: float = Field(..., description="Tiempo total en segundos")
+    rows_per_second: Optional[float] = Field(None, description="Filas insertadas por segundo")
+
+class SalesAggregate(BaseModel):
+    sale_date: Optional[date] = Field(None, description="Dia (si se agrupa por day)")
+    product_id: Optional[int] = Field(None, description="ID del producto")
+    customer_id: Optional[int] = Field(None, description="ID del cliente")
+    supplier_id: Optional[int] = Field(None, description="ID del proveedor")
+    employee_id: Optional[int] = Field(None, description="ID del empleado")
+    project_id: Optional[int] = Field(None, description="ID del proyecto")
+    total_amount: Decimal = Field(..., description="Suma de amount")
+    sale_count: int = Field(..., description="Numero de ventas")
+    avg_amount: Decimal = Field(..., description="Promedio de amount")
+
+class DepartmentExpanded(Department):
+    head: Optional[Employee] = Field(None, description="Jefe de departamento (expand=head)")
+
+class EmployeeExpanded(Employee):
+    department: Optional[Department] = Field(None, description="Departamento (expand=department)")
+    manager: Optional[Employee] = Field(None, description="Manager (expand=manager)")
+
+class ProjectExpanded(Project):
+    department: Optional[Department] = Field(None, description="Departamento (expand=department)")
+    employee: Optional[Employee] = Field(None, description="Empleado (expand=employee)")
+    manager: Optional[Employee] = Field(None, description="Gerente del proyecto (expand=manager)")
+
+class ProductExpanded(Product):
+    supplier: Optional[Supplier] = Field(None, description="Proveedor (expand=supplier)")
+
+class SaleExpanded(Sale):
+    product: Optional[Product] = Field(None, description="Producto (expand=product)")
+    customer: Optional[Customer] = Field(None, description="Cliente (expand=customer)")
+    supplier: Optional[Supplier] = Field(None, description="Proveedor (expand=supplier)")
+    employee: Optional[Employee] = Field(None, description="Empleado (expand=employee)")
+    project: Optional[Project] = Field(None, description="Proyecto (expand=project)")
+
+class DepartmentExpandedPage(BaseModel):
+    items: List[DepartmentExpanded] = Field(..., description="Departamentos de la pagina")
+    next_cursor: Optional[str] = Field(None, description="Cursor de la siguiente pagina")
+
+class EmployeeExpandedPage(BaseModel):
+    items: List[EmployeeExpanded] = Field(..., description="Empleados de la pagina")
+    next_cursor: Optional[str] = Field(None, description="Cursor de la siguiente pagina")
+
+class ProjectExpandedPage(BaseModel):
+    items: List[ProjectExpanded] = Field(..., description="Proyectos de la pagina")
+    next_cursor: Optional[str] = Field(None, description="Cursor de la siguiente pagina")
+
+class ProductExpandedPage(BaseModel):
+    items: List[ProductExpanded] = Field(..., description="Productos de la pagina")
+    next_cursor: Optional[str] = Field(None, description="Cursor de la siguiente pagina")
+
+class SaleExpandedPage(BaseModel):
+    items: List[SaleExpanded] = Field(..., description="Ventas de la pagina")
+    next_cursor: Optional[str] = Field(None, description="Cursor de la siguiente pagina")
+
+class EmployeeNode(Employee):
+    depth: int = Field(..., description="Niveles de distancia al empleado consultado")
+
+class EmployeeReports(BaseModel):
+    employee_id: int = Field(..., description="ID del empleado consultado")
+    depth: Optional[int] = Field(None, description="Profundidad maxima (vacio: todo el subarbol)")
+    total: int = Field(..., description="Subordinados hasta esa profundidad")
+    truncated: bool = Field(..., description="True si items se corto en limit")
+    items: List[EmployeeNode] = Field(..., description="Subordinados por niveles")
+
+class EmployeeChain(BaseModel):
+    employee_id: int = Field(..., description="ID del empleado consultado")
+    items: List[EmployeeNode] = Field(..., description="Managers desde el jefe directo hasta la raiz")
+
+class SubtreeTotalsItem(BaseModel):
+    employee_id: int = Field(..., description="ID del empleado")
+    headcount: int = Field(..., description="Empleados en el subarbol, incluido el propio")
+    total_salary: Decimal = Field(..., description="Suma de salarios del subarbol")
+    avg_salary: Decimal = Field(..., description="Salario promedio del subarbol")
+
+class SubtreeTotals(SubtreeTotalsItem):
+    direct_reports: List[SubtreeTotalsItem] = Field(..., description="Totales por cada subordinado directo")
+
+class CustomerSearchResult(Customer):
+    match: str = Field(..., description="Tipo de coincidencia: exact, prefix, word_prefix, substring o fuzzy")
+
+class CustomerSearchPage(BaseModel):
+    items: List[CustomerSearchResult] = Field(..., description="Clientes de mejor a peor coincidencia")
+
+class SupplierSearchResult(Supplier):
+    match: str = Field(..., description="Tipo de coincidencia: exact, prefix, word_prefix, substring o fuzzy")
+
+class SupplierSearchPage(BaseModel):
+    items: List[SupplierSearchResult] = Field(..., description="Proveedores de mejor a peor coincidencia")
+
+class ProductSearchResult(Product):
+    match: str = Field(..., description="Tipo de coincidencia: exact, prefix, word_prefix, substring o fuzzy")
+
+class ProductSearchPage(BaseModel):
+    items: List[ProductSearchResult] = Field(..., description="Productos de mejor a peor coincidencia")
+
+class ArchiveAggregate(BaseModel):
+    month: Optional[str] = Field(None, description="Mes YYYY-MM (si se agrupa por month)")
+    product_id: Optional[int] = Field(None, description="ID del producto")
+    customer_id: Optional[int] = Field(None, description="ID del cliente")
+    total_amount: Decimal = Field(..., description="Suma de amount")
+    sale_count: int = Field(..., description="Numero de ventas")
+    avg_amount: Decimal = Field(..., description="Promedio de amount")
+
+class ArchiveExportResult(BaseModel):
+    rows: int = Field(..., description="Ventas exportadas en esta corrida")
+    previous_watermark: int = Field(..., description="Marca antes de la corrida")
+    watermark: int = Field(..., description="Mayor sale_id hasta el que todas las ventas estan exportadas")
+    last_sale_id: int = Field(..., description="Mayor sale_id exportado")
+    pending_gaps: int = Field(..., description="Rangos de sale_id salteados que se vuelven a leer")
+    months: List[str] = Field(..., description="Meses con archivos nuevos")
@@ -0,0 +1,47 @@
+import base64
+import json
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+class InvalidCursorError(ValueError):
+    pass
+
+def encode_cursor(last_id):
+    raw = json.dumps({"after": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded))["after"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorError("Cursor de paginacion invalido")
+    if not isinstance(after, int):
+        raise InvalidCursorError("Cursor de paginacion invalido")
+    return after
+
+def build_where(filters):
+    """filters: lista de (columna, operador, valor); se ignoran los valores None."""
+    conditions = []
+    params = []
+    for column, op, value in filters:
+        if value is not None:
+            conditions.append(f"{column} {op} %s")
+            params.append(value)
+    return conditions, params
+
+def build_page_query(table, pk, filters, cursor, limit, columns=None):
+    conditions, params = build_where(filters)
+    after = decode_cursor(cursor)
+    if after is not None:
+        conditions.append(f"{pk} > %s")
+        params.append(after)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    # Se pide una fila extra para saber si hay siguiente pagina
+    select = ", ".join(columns) if columns else "*"
+    query = f"SELECT {select} FROM {table}{where} ORDER BY {pk} LIMIT %s"
+    params.append(limit + 1)
+    return query, tuple(params)
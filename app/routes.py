@@ -1,471 +1,740 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from .database import get_db_connection
-from . import models
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
+from typing import List, Literal, Optional
+from datetime import date
+from .database import execute, run_db
+from .pagination import DEFAULT_LIMIT, MAX_LIMIT
+from .serialization import fetch_page_json, RawJSONResponse
+from .cache import response_cache
+from .versions import table_versions
+from .coalesce import single_flight
+from .hierarchy import org_index, employee_nodes, EmployeeNotFound
+from .search import search_indexes, search_table, search_status
+from .analytics import sales_summary
+from .archive import sales_archive, export_sales_archive, run_archive
+from .export import stream_table, ExportResponse, EXPORT_CHUNK_SIZE
+from . import models, tables, group_commit
+from .bulk import (bulk_insert, insert_row_sync, bulk_insert_stream, stream_format, BULK_CHUNK_SIZE,
+                   BULK_COMMIT_MODE, BULK_STREAM_BATCH_SIZE)
 import mysql.connector
 
 router = APIRouter()
 
 @router.post("/departments/", response_model=models.Department, tags=["Departments"])
 async def create_department(department: models.DepartmentCreate):
+    query = """INSERT INTO departments 
+            (department_name, place, department_head) 
+            VALUES (%s, %s, %s)"""
+    values = (department.department_name, department.place, department.department_head)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """INSERT INTO departments 
-                (department_name, place, department_head) 
-                VALUES (%s, %s, %s)"""
-        values = (department.department_name, department.place, department.department_head)
-        cursor.execute(query, values)
-        conn.commit()
-        
         # Obtener el ID generado
-        department_id = cursor.lastrowid
-        return {
-            "department_id": department_id,
-            **department.dict()
-        }
+        department_id = await execute(query, values)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
-    finally:
-        cursor.close()
-        conn.close()
+    await response_cache.invalidate("departments")
+    await table_versions.bump("departments")
+
+    return {
+        "department_id": department_id,
+        **department.dict()
+    }
 
-@router.get("/departments/", response_model=List[models.Department], tags=["Departments"])
-async def list_departments():
+@router.get("/departments/", response_model=models.DepartmentExpandedPage, tags=["Departments"])
+async def list_departments(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor de la siguiente pagina"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Filas por pagina"),
+    expand: Optional[str] = Query(None, description="Relaciones a incluir, separadas por coma: head"),
+    place: Optional[str] = Query(None, description="Lugar del departamento"),
+    department_head: Optional[int] = Query(None, description="ID del jefe de departamento")
+):
+    filters = tables.bind_filters(
+        tables.LIST_FILTERS["departments"],
+        place=place,
+        department_head=department_head)
+    params = {"filters": filters, "cursor": cursor, "limit": limit}
+    headers = await table_versions.validators(tables.DEPARTMENTS, params, expand)
+    if table_versions.is_not_modified(request, headers):
+        # El cliente ya tiene esta version: no se consulta la BD
+        return Response(status_code=304, headers=headers)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM departments")
-        departments = cursor.fetchall()
-        return departments
+        body = await single_flight.do(
+            "departments", headers["ETag"],
+            lambda: response_cache.get_or_load(
+                "departments", params,
+                lambda: fetch_page_json(tables.DEPARTMENTS, filters, cursor, limit, expand),
+                # Con expand se incluyen filas de otras tablas que no invalidan esta entrada
+                cacheable=not expand))
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return RawJSONResponse(body, headers=headers)
+
+@router.post("/departments/bulk/", response_model=models.DepartmentBulkResult, tags=["Departments"])
+async def create_departments_bulk(
+    departments: List[models.DepartmentCreate],
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, description="Filas por INSERT"),
+    commit: Literal["batch", "chunk"] = Query(BULK_COMMIT_MODE, description="Commit por lote completo o por bloque")
+):
+    try:
+        return await bulk_insert(tables.DEPARTMENTS, departments, chunk_size, commit)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
-
-@router.post("/departments/bulk/", response_model=List[models.Department], tags=["Departments"])
-async def create_departments_bulk(departments: List[models.DepartmentCreate]):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query = """INSERT INTO departments 
-                (department_name, place, department_head) 
-                VALUES (%s, %s, %s)"""
-        values = [(d.department_name, d.place, d.department_head) 
-                for d in departments]
-        cursor.executemany(query, values)
-        conn.commit()
-        
-        first_id = cursor.lastrowid
-        result = []
-        for i, dept in enumerate(departments):
-            result.append({
-                "department_id": first_id + i,
-                **dept.dict()
-            })
-        return result
+        await response_cache.invalidate("departments")
+        await table_versions.bump("departments")
+
+@router.post("/departments/bulk/stream/", response_model=models.BulkStreamResult, tags=["Departments"])
+async def create_departments_bulk_stream(
+    request: Request,
+    batch_size: int = Query(BULK_STREAM_BATCH_SIZE, ge=1, description="Filas por lote")
+):
+    fmt = stream_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Use application/x-ndjson o text/csv")
+    try:
+        return await bulk_insert_stream(tables.DEPARTMENTS, models.DepartmentCreate,
+                                        request.stream(), fmt, batch_size)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
+        await response_cache.invalidate("departments")
+        await table_versions.bump("departments")
 
 @router.post("/employees/", response_model=models.Employee, tags=["Employees"])
 async def create_employee(employee: models.EmployeeCreate):
+    query = """INSERT INTO employees 
+            (first_name, last_name, email, department_id, 
+            hire_date, salary, position, manager_id) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
+    values = (employee.first_name, employee.last_name, employee.email,
+            employee.department_id, employee.hire_date, employee.salary,
+            employee.position, employee.manager_id)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """INSERT INTO employees 
-                (first_name, last_name, email, department_id, 
-                hire_date, salary, position, manager_id) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
-        values = (employee.first_name, employee.last_name, employee.email,
-                employee.department_id, employee.hire_date, employee.salary,
-                employee.position, employee.manager_id)
-        cursor.execute(query, values)
-        conn.commit()
-        
-        employee_id = cursor.lastrowid
-        return {
-            "employee_id": employee_id,
-            **employee.dict()
-        }
+        # Obtener el ID generado
+        employee_id = await execute(query, values)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
-    finally:
-        cursor.close()
-        conn.close()
+    await table_versions.bump("employees")
+    org_index.note_inserted([{"employee_id": employee_id, **employee.dict()}])
+
+    return {
+        "employee_id": employee_id,
+        **employee.dict()
+    }
+
+@router.get("/employees/", response_model=models.EmployeeExpandedPage, tags=["Employees"])
+async def list_employees(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor de la siguiente pagina"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Filas por pagina"),
+    expand: Optional[str] = Query(None, description="Relaciones a incluir, separadas por coma: department, manager"),
+    department_id: Optional[int] = Query(None, description="ID del departamento"),
+    manager_id: Optional[int] = Query(None, description="ID del manager"),
+    position: Optional[str] = Query(None, description="Cargo del empleado"),
+    hire_date_from: Optional[date] = Query(None, description="Fecha de contratacion desde"),
+    hire_date_to: Optional[date] = Query(None, description="Fecha de contratacion hasta")
+):
+    filters = tables.bind_filters(
+        tables.LIST_FILTERS["employees"],
+        department_id=department_id,
+        manager_id=manager_id,
+        position=position,
+        hire_date_from=hire_date_from,
+        hire_date_to=hire_date_to)
+    params = {"filters": filters, "cursor": cursor, "limit": limit}
+    headers = await table_versions.validators(tables.EMPLOYEES, params, expand)
+    if table_versions.is_not_modified(request, headers):
+        # El cliente ya tiene esta version: no se consulta la BD
+        return Response(status_code=304, headers=headers)
+    try:
+        body = await single_flight.do(
+            "employees", headers["ETag"],
+            lambda: fetch_page_json(tables.EMPLOYEES, filters, cursor, limit, expand))
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return RawJSONResponse(body, headers=headers)
 
-@router.get("/employees/", response_model=List[models.Employee], tags=["Employees"])
-async def list_employees():
+@router.get("/employees/export/", tags=["Employees"])
+async def export_employees(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Formato de exportacion"),
+    chunk_size: int = Query(EXPORT_CHUNK_SIZE, ge=1, le=50000, description="Filas por bloque"),
+    department_id: Optional[int] = Query(None, description="ID del departamento")
+):
+    filters = tables.bind_filters(tables.EXPORT_FILTERS["employees"], department_id=department_id)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM employees")
-        employees = cursor.fetchall()
-        return employees
+        stream = await stream_table("employees", "employee_id", format, filters, chunk_size)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
+    return ExportResponse(stream, format)
+
+@router.post("/employees/bulk/", response_model=models.EmployeeBulkResult, tags=["Employees"])
+async def create_employees_bulk(
+    employees: List[models.EmployeeCreate],
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, description="Filas por INSERT"),
+    commit: Literal["batch", "chunk"] = Query(BULK_COMMIT_MODE, description="Commit por lote completo o por bloque")
+):
+    try:
+        result = await bulk_insert(tables.EMPLOYEES, employees, chunk_size, commit)
+    except mysql.connector.Error as err:
+        # Con commit por bloque una parte pudo quedar confirmada: se recarga el arbol
+        org_index.invalidate()
+        raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
-
-@router.post("/employees/bulk/", response_model=List[models.Employee], tags=["Employees"])
-async def create_employees_bulk(employees: List[models.EmployeeCreate]):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query = """INSERT INTO employees 
-                (first_name, last_name, email, department_id, 
-                hire_date, salary, position, manager_id) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
-        values = [(e.first_name, e.last_name, e.email, e.department_id,
-                e.hire_date, e.salary, e.position, e.manager_id) 
-                for e in employees]
-        cursor.executemany(query, values)
-        conn.commit()
-        
-        first_id = cursor.lastrowid
-        result = []
-        for i, emp in enumerate(employees):
-            result.append({
-                "employee_id": first_id + i,
-                **emp.dict()
-            })
-        return result
+        await table_versions.bump("employees")
+    org_index.note_inserted(result["items"])
+    return result
+
+@router.post("/employees/bulk/stream/", response_model=models.BulkStreamResult, tags=["Employees"])
+async def create_employees_bulk_stream(
+    request: Request,
+    batch_size: int = Query(BULK_STREAM_BATCH_SIZE, ge=1, description="Filas por lote")
+):
+    fmt = stream_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Use application/x-ndjson o text/csv")
+    try:
+        return await bulk_insert_stream(tables.EMPLOYEES, models.EmployeeCreate,
+                                        request.stream(), fmt, batch_size)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
+        await table_versions.bump("employees")
+        # El resultado del streaming no trae los IDs fila por fila: se recarga el arbol
+        org_index.invalidate()
+
+@router.get("/employees/{employee_id}/reports/", response_model=models.EmployeeReports, tags=["Employees"])
+async def employee_reports(
+    employee_id: int,
+    depth: Optional[int] = Query(None, ge=1, description="Niveles a bajar (vacio: todo el subarbol)"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Maximo de empleados devueltos")
+):
+    try:
+        await org_index.ensure_loaded()
+        found, total = org_index.reports(employee_id, depth, limit)
+        items = await employee_nodes(found)
+    except EmployeeNotFound as err:
+        raise HTTPException(status_code=404, detail=str(err))
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return {"employee_id": employee_id, "depth": depth, "total": total,
+            "truncated": total > len(found), "items": items}
+
+@router.get("/employees/{employee_id}/chain/", response_model=models.EmployeeChain, tags=["Employees"])
+async def employee_chain(employee_id: int):
+    try:
+        await org_index.ensure_loaded()
+        items = await employee_nodes(org_index.chain(employee_id))
+    except EmployeeNotFound as err:
+        raise HTTPException(status_code=404, detail=str(err))
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return {"employee_id": employee_id, "items": items}
+
+@router.get("/employees/{employee_id}/subtree-totals/", response_model=models.SubtreeTotals, tags=["Employees"])
+async def employee_subtree_totals(employee_id: int):
+    try:
+        await org_index.ensure_loaded()
+        totals = org_index.totals(employee_id)
+        direct_reports = [org_index.totals(child) for child in org_index.children(employee_id)]
+    except EmployeeNotFound as err:
+        raise HTTPException(status_code=404, detail=str(err))
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return {**totals, "direct_reports": direct_reports}
 
 @router.post("/projects/", response_model=models.Project, tags=["Projects"])
 async def create_project(project: models.ProjectCreate):
+    query = """INSERT INTO projects 
+            (project_name, start_date, end_date, department_id,
+            employee_id, budget, project_manager) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s)"""
+    values = (project.project_name, project.start_date, project.end_date,
+            project.department_id, project.employee_id, project.budget,
+            project.project_manager)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """INSERT INTO projects 
-                (project_name, start_date, end_date, department_id,
-                employee_id, budget, project_manager) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-        values = (project.project_name, project.start_date, project.end_date,
-                project.department_id, project.employee_id, project.budget,
-                project.project_manager)
-        cursor.execute(query, values)
-        conn.commit()
-        
-        project_id = cursor.lastrowid
-        return {
-            "project_id": project_id,
-            **project.dict()
-        }
+        # Obtener el ID generado
+        project_id = await execute(query, values)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
-    finally:
-        cursor.close()
-        conn.close()
+    await table_versions.bump("projects")
+
+    return {
+        "project_id": project_id,
+        **project.dict()
+    }
+
+@router.get("/projects/", response_model=models.ProjectExpandedPage, tags=["Projects"])
+async def list_projects(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor de la siguiente pagina"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Filas por pagina"),
+    expand: Optional[str] = Query(None, description="Relaciones a incluir, separadas por coma: department, employee, manager"),
+    department_id: Optional[int] = Query(None, description="ID del departamento"),
+    employee_id: Optional[int] = Query(None, description="ID del empleado"),
+    project_manager: Optional[int] = Query(None, description="ID del gerente del proyecto")
+):
+    filters = tables.bind_filters(
+        tables.LIST_FILTERS["projects"],
+        department_id=department_id,
+        employee_id=employee_id,
+        project_manager=project_manager)
+    params = {"filters": filters, "cursor": cursor, "limit": limit}
+    headers = await table_versions.validators(tables.PROJECTS, params, expand)
+    if table_versions.is_not_modified(request, headers):
+        # El cliente ya tiene esta version: no se consulta la BD
+        return Response(status_code=304, headers=headers)
+    try:
+        body = await single_flight.do(
+            "projects", headers["ETag"],
+            lambda: fetch_page_json(tables.PROJECTS, filters, cursor, limit, expand))
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return RawJSONResponse(body, headers=headers)
 
-@router.get("/projects/", response_model=List[models.Project], tags=["Projects"])
-async def list_projects():
+@router.post("/projects/bulk/", response_model=models.ProjectBulkResult, tags=["Projects"])
+async def create_projects_bulk(
+    projects: List[models.ProjectCreate],
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, description="Filas por INSERT"),
+    commit: Literal["batch", "chunk"] = Query(BULK_COMMIT_MODE, description="Commit por lote completo o por bloque")
+):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM projects")
-        projects = cursor.fetchall()
-        return projects
+        return await bulk_insert(tables.PROJECTS, projects, chunk_size, commit)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
-
-@router.post("/projects/bulk/", response_model=List[models.Project], tags=["Projects"])
-async def create_projects_bulk(projects: List[models.ProjectCreate]):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query = """INSERT INTO projects 
-                (project_name, start_date, end_date, department_id,
-                employee_id, budget, project_manager) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-        values = [(p.project_name, p.start_date, p.end_date, p.department_id,
-                p.employee_id, p.budget, p.project_manager)
-                for p in projects]
-        cursor.executemany(query, values)
-        conn.commit()
-        
-        first_id = cursor.lastrowid
-        result = []
-        for i, proj in enumerate(projects):
-            result.append({
-                "project_id": first_id + i,
-                **proj.dict()
-            })
-        return result
+        await table_versions.bump("projects")
+
+@router.post("/projects/bulk/stream/", response_model=models.BulkStreamResult, tags=["Projects"])
+async def create_projects_bulk_stream(
+    request: Request,
+    batch_size: int = Query(BULK_STREAM_BATCH_SIZE, ge=1, description="Filas por lote")
+):
+    fmt = stream_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Use application/x-ndjson o text/csv")
+    try:
+        return await bulk_insert_stream(tables.PROJECTS, models.ProjectCreate,
+                                        request.stream(), fmt, batch_size)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
+        await table_versions.bump("projects")
 
 @router.post("/customers/", response_model=models.Customer, tags=["Customers"])
 async def create_customer(customer: models.CustomerCreate):
+    query = """INSERT INTO customers 
+            (customer_name, country, phone_number, email) 
+            VALUES (%s, %s, %s, %s)"""
+    values = (customer.customer_name, customer.country,
+            customer.phone_number, customer.email)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """INSERT INTO customers 
-                (customer_name, country, phone_number, email) 
-                VALUES (%s, %s, %s, %s)"""
-        values = (customer.customer_name, customer.country,
-                customer.phone_number, customer.email)
-        cursor.execute(query, values)
-        conn.commit()
-        
-        customer_id = cursor.lastrowid
-        return {
-            "customer_id": customer_id,
-            **customer.dict()
-        }
+        # Obtener el ID generado
+        customer_id = await execute(query, values)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
-    finally:
-        cursor.close()
-        conn.close()
+    await response_cache.invalidate("customers")
+    await table_versions.bump("customers")
+    search_indexes["customers"].note_inserted([{"customer_id": customer_id, **customer.dict()}])
+
+    return {
+        "customer_id": customer_id,
+        **customer.dict()
+    }
 
-@router.get("/customers/", response_model=List[models.Customer], tags=["Customers"])
-async def list_customers():
+@router.get("/customers/", response_model=models.CustomerPage, tags=["Customers"])
+async def list_customers(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor de la siguiente pagina"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Filas por pagina"),
+    country: Optional[str] = Query(None, description="Pais del cliente")
+):
+    filters = tables.bind_filters(tables.LIST_FILTERS["customers"], country=country)
+    params = {"filters": filters, "cursor": cursor, "limit": limit}
+    headers = await table_versions.validators(tables.CUSTOMERS, params)
+    if table_versions.is_not_modified(request, headers):
+        # El cliente ya tiene esta version: no se consulta la BD
+        return Response(status_code=304, headers=headers)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM customers")
-        customers = cursor.fetchall()
-        return customers
+        body = await single_flight.do(
+            "customers", headers["ETag"],
+            lambda: response_cache.get_or_load(
+                "customers", params,
+                lambda: fetch_page_json(tables.CUSTOMERS, filters, cursor, limit)))
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
+    return RawJSONResponse(body, headers=headers)
+
+@router.post("/customers/bulk/", response_model=models.CustomerBulkResult, tags=["Customers"])
+async def create_customers_bulk(
+    customers: List[models.CustomerCreate],
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, description="Filas por INSERT"),
+    commit: Literal["batch", "chunk"] = Query(BULK_COMMIT_MODE, description="Commit por lote completo o por bloque")
+):
+    try:
+        result = await bulk_insert(tables.CUSTOMERS, customers, chunk_size, commit)
+    except mysql.connector.Error as err:
+        # Con commit por bloque una parte pudo quedar confirmada: se recarga el indice
+        search_indexes["customers"].invalidate()
+        raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
-
-@router.post("/customers/bulk/", response_model=List[models.Customer], tags=["Customers"])
-async def create_customers_bulk(customers: List[models.CustomerCreate]):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query = """INSERT INTO customers 
-                (customer_name, country, phone_number, email) 
-                VALUES (%s, %s, %s, %s)"""
-        values = [(c.customer_name, c.country, c.phone_number, c.email) 
-                for c in customers]
-        cursor.executemany(query, values)
-        conn.commit()
-        
-        first_id = cursor.lastrowid
-        result = []
-        for i, cust in enumerate(customers):
-            result.append({
-                "customer_id": first_id + i,
-                **cust.dict()
-            })
-        return result
+        await response_cache.invalidate("customers")
+        await table_versions.bump("customers")
+    search_indexes["customers"].note_inserted(result["items"])
+    return result
+
+@router.post("/customers/bulk/stream/", response_model=models.BulkStreamResult, tags=["Customers"])
+async def create_customers_bulk_stream(
+    request: Request,
+    batch_size: int = Query(BULK_STREAM_BATCH_SIZE, ge=1, description="Filas por lote")
+):
+    fmt = stream_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Use application/x-ndjson o text/csv")
+    try:
+        return await bulk_insert_stream(tables.CUSTOMERS, models.CustomerCreate,
+                                        request.stream(), fmt, batch_size)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
+        await response_cache.invalidate("customers")
+        await table_versions.bump("customers")
+        # El resultado del streaming no trae los IDs fila por fila: se recarga el indice
+        search_indexes["customers"].invalidate()
+
+@router.get("/customers/search/", response_model=models.CustomerSearchPage, tags=["Customers"])
+async def search_customers(
+    q: str = Query(..., min_length=1, description="Texto a buscar por nombre o email"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Maximo de resultados")
+):
+    try:
+        items = await search_table("customers", q, limit)
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return {"items": items}
 
 @router.post("/suppliers/", response_model=models.Supplier, tags=["Suppliers"])
 async def create_supplier(supplier: models.SupplierCreate):
+    query = """INSERT INTO suppliers 
+            (supplier_name, contact_info, country, phone_number) 
+            VALUES (%s, %s, %s, %s)"""
+    values = (supplier.supplier_name, supplier.contact_info,
+            supplier.country, supplier.phone_number)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """INSERT INTO suppliers 
-                (supplier_name, contact_info, country, phone_number) 
-                VALUES (%s, %s, %s, %s)"""
-        values = (supplier.supplier_name, supplier.contact_info,
-                supplier.country, supplier.phone_number)
-        cursor.execute(query, values)
-        conn.commit()
-        
-        supplier_id = cursor.lastrowid
-        return {
-            "supplier_id": supplier_id,
-            **supplier.dict()
-        }
+        # Obtener el ID generado
+        supplier_id = await execute(query, values)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
-    finally:
-        cursor.close()
-        conn.close()
+    await response_cache.invalidate("suppliers")
+    await table_versions.bump("suppliers")
+    search_indexes["suppliers"].note_inserted([{"supplier_id": supplier_id, **supplier.dict()}])
+
+    return {
+        "supplier_id": supplier_id,
+        **supplier.dict()
+    }
 
-@router.get("/suppliers/", response_model=List[models.Supplier], tags=["Suppliers"])
-async def list_suppliers():
+@router.get("/suppliers/", response_model=models.SupplierPage, tags=["Suppliers"])
+async def list_suppliers(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor de la siguiente pagina"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Filas por pagina"),
+    country: Optional[str] = Query(None, description="Pais del proveedor")
+):
+    filters = tables.bind_filters(tables.LIST_FILTERS["suppliers"], country=country)
+    params = {"filters": filters, "cursor": cursor, "limit": limit}
+    headers = await table_versions.validators(tables.SUPPLIERS, params)
+    if table_versions.is_not_modified(request, headers):
+        # El cliente ya tiene esta version: no se consulta la BD
+        return Response(status_code=304, headers=headers)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM suppliers")
-        suppliers = cursor.fetchall()
-        return suppliers
+        body = await single_flight.do(
+            "suppliers", headers["ETag"],
+            lambda: response_cache.get_or_load(
+                "suppliers", params,
+                lambda: fetch_page_json(tables.SUPPLIERS, filters, cursor, limit)))
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
+    return RawJSONResponse(body, headers=headers)
+
+@router.post("/suppliers/bulk/", response_model=models.SupplierBulkResult, tags=["Suppliers"])
+async def create_suppliers_bulk(
+    suppliers: List[models.SupplierCreate],
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, description="Filas por INSERT"),
+    commit: Literal["batch", "chunk"] = Query(BULK_COMMIT_MODE, description="Commit por lote completo o por bloque")
+):
+    try:
+        result = await bulk_insert(tables.SUPPLIERS, suppliers, chunk_size, commit)
+    except mysql.connector.Error as err:
+        # Con commit por bloque una parte pudo quedar confirmada: se recarga el indice
+        search_indexes["suppliers"].invalidate()
+        raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
-
-@router.post("/suppliers/bulk/", response_model=List[models.Supplier], tags=["Suppliers"])
-async def create_suppliers_bulk(suppliers: List[models.SupplierCreate]):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query = """INSERT INTO suppliers 
-                (supplier_name, contact_info, country, phone_number) 
-                VALUES (%s, %s, %s, %s)"""
-        values = [(s.supplier_name, s.contact_info, s.country, s.phone_number) 
-                for s in suppliers]
-        cursor.executemany(query, values)
-        conn.commit()
-        
-        first_id = cursor.lastrowid
-        result = []
-        for i, supp in enumerate(suppliers):
-            result.append({
-                "supplier_id": first_id + i,
-                **supp.dict()
-            })
-        return result
+        await response_cache.invalidate("suppliers")
+        await table_versions.bump("suppliers")
+    search_indexes["suppliers"].note_inserted(result["items"])
+    return result
+
+@router.post("/suppliers/bulk/stream/", response_model=models.BulkStreamResult, tags=["Suppliers"])
+async def create_suppliers_bulk_stream(
+    request: Request,
+    batch_size: int = Query(BULK_STREAM_BATCH_SIZE, ge=1, description="Filas por lote")
+):
+    fmt = stream_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Use application/x-ndjson o text/csv")
+    try:
+        return await bulk_insert_stream(tables.SUPPLIERS, models.SupplierCreate,
+                                        request.stream(), fmt, batch_size)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
+        await response_cache.invalidate("suppliers")
+        await table_versions.bump("suppliers")
+        # El resultado del streaming no trae los IDs fila por fila: se recarga el indice
+        search_indexes["suppliers"].invalidate()
+
+@router.get("/suppliers/search/", response_model=models.SupplierSearchPage, tags=["Suppliers"])
+async def search_suppliers(
+    q: str = Query(..., min_length=1, description="Texto a buscar por nombre o contacto"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Maximo de resultados")
+):
+    try:
+        items = await search_table("suppliers", q, limit)
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return {"items": items}
 
 @router.post("/products/", response_model=models.Product, tags=["Products"])
 async def create_product(product: models.ProductCreate):
+    query = """INSERT INTO products 
+            (product_name, supplier_id) 
+            VALUES (%s, %s)"""
+    values = (product.product_name, product.supplier_id)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """INSERT INTO products 
-                (product_name, supplier_id) 
-                VALUES (%s, %s)"""
-        values = (product.product_name, product.supplier_id)
-        cursor.execute(query, values)
-        conn.commit()
-        
-        product_id = cursor.lastrowid
-        return {
-            "product_id": product_id,
-            **product.dict()
-        }
+        # Obtener el ID generado
+        product_id = await execute(query, values)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
-    finally:
-        cursor.close()
-        conn.close()
+    await response_cache.invalidate("products")
+    await table_versions.bump("products")
+    search_indexes["products"].note_inserted([{"product_id": product_id, **product.dict()}])
+
+    return {
+        "product_id": product_id,
+        **product.dict()
+    }
 
-@router.get("/products/", response_model=List[models.Product], tags=["Products"])
-async def list_products():
+@router.get("/products/", response_model=models.ProductExpandedPage, tags=["Products"])
+async def list_products(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor de la siguiente pagina"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Filas por pagina"),
+    expand: Optional[str] = Query(None, description="Relaciones a incluir, separadas por coma: supplier"),
+    supplier_id: Optional[int] = Query(None, description="ID del proveedor")
+):
+    filters = tables.bind_filters(tables.LIST_FILTERS["products"], supplier_id=supplier_id)
+    params = {"filters": filters, "cursor": cursor, "limit": limit}
+    headers = await table_versions.validators(tables.PRODUCTS, params, expand)
+    if table_versions.is_not_modified(request, headers):
+        # El cliente ya tiene esta version: no se consulta la BD
+        return Response(status_code=304, headers=headers)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM products")
-        products = cursor.fetchall()
-        return products
+        body = await single_flight.do(
+            "products", headers["ETag"],
+            lambda: response_cache.get_or_load(
+                "products", params,
+                lambda: fetch_page_json(tables.PRODUCTS, filters, cursor, limit, expand),
+                # Con expand se incluyen filas de otras tablas que no invalidan esta entrada
+                cacheable=not expand))
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
+    return RawJSONResponse(body, headers=headers)
+
+@router.post("/products/bulk/", response_model=models.ProductBulkResult, tags=["Products"])
+async def create_products_bulk(
+    products: List[models.ProductCreate],
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, description="Filas por INSERT"),
+    commit: Literal["batch", "chunk"] = Query(BULK_COMMIT_MODE, description="Commit por lote completo o por bloque")
+):
+    try:
+        result = await bulk_insert(tables.PRODUCTS, products, chunk_size, commit)
+    except mysql.connector.Error as err:
+        # Con commit por bloque una parte pudo quedar confirmada: se recarga el indice
+        search_indexes["products"].invalidate()
+        raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
-
-@router.post("/products/bulk/", response_model=List[models.Product], tags=["Products"])
-async def create_products_bulk(products: List[models.ProductCreate]):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query = """INSERT INTO products 
-                (product_name, supplier_id) 
-                VALUES (%s, %s)"""
-        values = [(p.product_name, p.supplier_id) for p in products]
-        cursor.executemany(query, values)
-        conn.commit()
-        
-        first_id = cursor.lastrowid
-        result = []
-        for i, prod in enumerate(products):
-            result.append({
-                "product_id": first_id + i,
-                **prod.dict()
-            })
-        return result
+        await response_cache.invalidate("products")
+        await table_versions.bump("products")
+    search_indexes["products"].note_inserted(result["items"])
+    return result
+
+@router.post("/products/bulk/stream/", response_model=models.BulkStreamResult, tags=["Products"])
+async def create_products_bulk_stream(
+    request: Request,
+    batch_size: int = Query(BULK_STREAM_BATCH_SIZE, ge=1, description="Filas por lote")
+):
+    fmt = stream_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Use application/x-ndjson o text/csv")
+    try:
+        return await bulk_insert_stream(tables.PRODUCTS, models.ProductCreate,
+                                        request.stream(), fmt, batch_size)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
+        await response_cache.invalidate("products")
+        await table_versions.bump("products")
+        # El resultado del streaming no trae los IDs fila por fila: se recarga el indice
+        search_indexes["products"].invalidate()
+
+@router.get("/products/search/", response_model=models.ProductSearchPage, tags=["Products"])
+async def search_products(
+    q: str = Query(..., min_length=1, description="Texto a buscar por nombre"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Maximo de resultados")
+):
+    try:
+        items = await search_table("products", q, limit)
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return {"items": items}
 
 @router.post("/sales/", response_model=models.Sale, tags=["Sales"])
 async def create_sale(sale: models.SaleCreate):
+    values = (sale.sale_date, sale.amount, sale.product_id,
+            sale.customer_id, sale.supplier_id, sale.employee_id, sale.project_id)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """INSERT INTO sales 
-                (sale_date, amount, product_id, customer_id,
-                supplier_id, employee_id, project_id) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-        values = (sale.sale_date, sale.amount, sale.product_id,
-                sale.customer_id, sale.supplier_id, sale.employee_id, sale.project_id)
-        cursor.execute(query, values)
-        conn.commit()
-        
-        sale_id = cursor.lastrowid
-        return {
-            "sale_id": sale_id,
-            **sale.dict()
-        }
+        # Obtener el ID generado; el INSERT actualiza tambien los acumulados de ventas
+        if group_commit.sales_buffer is not None:
+            sale_id = await group_commit.sales_buffer.submit(values)
+        else:
+            sale_id = await run_db(insert_row_sync, tables.SALES, values)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
-    finally:
-        cursor.close()
-        conn.close()
+    await table_versions.bump("sales")
+
+    return {
+        "sale_id": sale_id,
+        **sale.dict()
+    }
+
+@router.get("/sales/", response_model=models.SaleExpandedPage, tags=["Sales"])
+async def list_sales(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor de la siguiente pagina"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Filas por pagina"),
+    expand: Optional[str] = Query(None, description="Relaciones a incluir, separadas por coma: product, customer, supplier, employee, project"),
+    sale_date_from: Optional[date] = Query(None, description="Fecha de venta desde"),
+    sale_date_to: Optional[date] = Query(None, description="Fecha de venta hasta"),
+    customer_id: Optional[int] = Query(None, description="ID del cliente"),
+    product_id: Optional[int] = Query(None, description="ID del producto"),
+    supplier_id: Optional[int] = Query(None, description="ID del proveedor"),
+    employee_id: Optional[int] = Query(None, description="ID del empleado"),
+    project_id: Optional[int] = Query(None, description="ID del proyecto")
+):
+    filters = tables.bind_filters(
+        tables.LIST_FILTERS["sales"],
+        sale_date_from=sale_date_from,
+        sale_date_to=sale_date_to,
+        customer_id=customer_id,
+        product_id=product_id,
+        supplier_id=supplier_id,
+        employee_id=employee_id,
+        project_id=project_id)
+    params = {"filters": filters, "cursor": cursor, "limit": limit}
+    headers = await table_versions.validators(tables.SALES, params, expand)
+    if table_versions.is_not_modified(request, headers):
+        # El cliente ya tiene esta version: no se consulta la BD
+        return Response(status_code=304, headers=headers)
+    try:
+        body = await single_flight.do(
+            "sales", headers["ETag"],
+            lambda: fetch_page_json(tables.SALES, filters, cursor, limit, expand))
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return RawJSONResponse(body, headers=headers)
+
+@router.get("/sales/export/", tags=["Sales"])
+async def export_sales(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Formato de exportacion"),
+    chunk_size: int = Query(EXPORT_CHUNK_SIZE, ge=1, le=50000, description="Filas por bloque"),
+    sale_date_from: Optional[date] = Query(None, description="Fecha de venta desde"),
+    sale_date_to: Optional[date] = Query(None, description="Fecha de venta hasta")
+):
+    filters = tables.bind_filters(
+        tables.EXPORT_FILTERS["sales"],
+        sale_date_from=sale_date_from,
+        sale_date_to=sale_date_to)
+    try:
+        stream = await stream_table("sales", "sale_id", format, filters, chunk_size)
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return ExportResponse(stream, format)
 
-@router.get("/sales/", response_model=List[models.Sale], tags=["Sales"])
-async def list_sales():
+@router.post("/sales/bulk/", response_model=models.SaleBulkResult, tags=["Sales"])
+async def create_sales_bulk(
+    sales: List[models.SaleCreate],
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, description="Filas por INSERT"),
+    commit: Literal["batch", "chunk"] = Query(BULK_COMMIT_MODE, description="Commit por lote completo o por bloque")
+):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM sales")
-        sales = cursor.fetchall()
-        return sales
+        return await bulk_insert(tables.SALES, sales, chunk_size, commit)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
-
-@router.post("/sales/bulk/", response_model=List[models.Sale], tags=["Sales"])
-async def create_sales_bulk(sales: List[models.SaleCreate]):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        query = """INSERT INTO sales 
-                (sale_date, amount, product_id, customer_id,
-                supplier_id, employee_id, project_id) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-        values = [(s.sale_date, s.amount, s.product_id, s.customer_id,
-                s.supplier_id, s.employee_id, s.project_id)
-                for s in sales]
-        cursor.executemany(query, values)
-        conn.commit()
-        
-        first_id = cursor.lastrowid
-        result = []
-        for i, sale in enumerate(sales):
-            result.append({
-                "sale_id": first_id + i,
-                **sale.dict()
-            })
-        return result
+        await table_versions.bump("sales")
+
+@router.post("/sales/bulk/stream/", response_model=models.BulkStreamResult, tags=["Sales"])
+async def create_sales_bulk_stream(
+    request: Request,
+    batch_size: int = Query(BULK_STREAM_BATCH_SIZE, ge=1, description="Filas por lote")
+):
+    fmt = stream_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Use application/x-ndjson o text/csv")
+    try:
+        return await bulk_insert_stream(tables.SALES, models.SaleCreate,
+                                        request.stream(), fmt, batch_size)
     except mysql.connector.Error as err:
         raise HTTPException(status_code=400, detail=str(err))
     finally:
-        cursor.close()
-        conn.close()
\ No newline at end of file
+        await table_versions.bump("sales")
+
+@router.get("/analytics/sales/", response_model=List[models.SalesAggregate], tags=["Analytics"])
+async def analytics_sales(
+    group_by: str = Query("", description="Campos separados por coma: day y una de product_id, "
+                                          "customer_id, supplier_id, employee_id, project_id"),
+    date_from: Optional[date] = Query(None, alias="from", description="Fecha de venta desde"),
+    date_to: Optional[date] = Query(None, alias="to", description="Fecha de venta hasta")
+):
+    try:
+        return await sales_summary(group_by, date_from, date_to)
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+
+@router.post("/archive/sales/export/", response_model=models.ArchiveExportResult, tags=["Archive"])
+async def archive_sales_export():
+    try:
+        return await export_sales_archive()
+    except mysql.connector.Error as err:
+        raise HTTPException(status_code=400, detail=str(err))
+
+@router.get("/archive/sales/", response_model=List[models.ArchiveAggregate], tags=["Archive"])
+async def archive_sales(
+    group_by: str = Query("", description="Campos separados por coma: month, product_id, customer_id"),
+    date_from: Optional[date] = Query(None, alias="from", description="Fecha de venta desde"),
+    date_to: Optional[date] = Query(None, alias="to", description="Fecha de venta hasta"),
+    product_id: Optional[int] = Query(None, description="ID del producto"),
+    customer_id: Optional[int] = Query(None, description="ID del cliente")
+):
+    return await run_archive(sales_archive.query_sync, group_by, date_from, date_to,
+                             product_id, customer_id)
+
+@router.get("/archive/sales/status/", tags=["Archive"])
+async def archive_sales_status():
+    return await run_archive(sales_archive.status)
+
+@router.get("/cache/stats/", tags=["Cache"])
+async def cache_stats():
+    return {**response_cache.stats(), "conditional_get": table_versions.stats(),
+            "single_flight": single_flight.stats(), "hierarchy": org_index.status(),
+            "search": search_status()}
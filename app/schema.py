@@ -0,0 +1,299 @@
+"""Esquema versionado: migraciones numeradas y verificacion de planes de consulta.
+
+    python -m app.schema migrate      # aplica las migraciones pendientes
+    python -m app.schema status       # version actual y migraciones pendientes
+    python -m app.schema check        # EXPLAIN de las consultas de las rutas
+"""
+import sys
+from datetime import date
+from .analytics import ROLLUP_DDL, DIMENSIONS, summary_query
+from .database import db_cursor
+from .expand import ids_query
+from .export import export_query
+from .pagination import build_page_query, encode_cursor
+from . import archive, fkcheck, hierarchy, search, tables
+
+TABLE_OPTIONS = "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+
+MIGRATIONS_TABLE = "schema_migrations"
+MIGRATIONS_DDL = f"""CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+    version INT PRIMARY KEY,
+    description VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) {TABLE_OPTIONS}"""
+
+V1_TABLES = [
+    f"""CREATE TABLE IF NOT EXISTS departments (
+        department_id INT AUTO_INCREMENT PRIMARY KEY,
+        department_name VARCHAR(100) NOT NULL,
+        place VARCHAR(100) NOT NULL,
+        department_head INT NOT NULL
+    ) {TABLE_OPTIONS}""",
+    f"""CREATE TABLE IF NOT EXISTS employees (
+        employee_id INT AUTO_INCREMENT PRIMARY KEY,
+        first_name VARCHAR(60) NOT NULL,
+        last_name VARCHAR(60) NOT NULL,
+        email VARCHAR(150) NOT NULL,
+        department_id INT NOT NULL,
+        hire_date DATE NOT NULL,
+        salary DECIMAL(12, 2) NOT NULL,
+        position VARCHAR(80) NOT NULL,
+        manager_id INT NULL,
+        CONSTRAINT fk_employees_department FOREIGN KEY (department_id) REFERENCES departments (department_id),
+        CONSTRAINT fk_employees_manager FOREIGN KEY (manager_id) REFERENCES employees (employee_id)
+    ) {TABLE_OPTIONS}""",
+    f"""CREATE TABLE IF NOT EXISTS projects (
+        project_id INT AUTO_INCREMENT PRIMARY KEY,
+        project_name VARCHAR(150) NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        department_id INT NOT NULL,
+        employee_id INT NOT NULL,
+        budget DECIMAL(14, 2) NOT NULL,
+        project_manager INT NOT NULL,
+        CONSTRAINT fk_projects_department FOREIGN KEY (department_id) REFERENCES departments (department_id),
+        CONSTRAINT fk_projects_employee FOREIGN KEY (employee_id) REFERENCES employees (employee_id),
+        CONSTRAINT fk_projects_manager FOREIGN KEY (project_manager) REFERENCES employees (employee_id)
+    ) {TABLE_OPTIONS}""",
+    f"""CREATE TABLE IF NOT EXISTS customers (
+        customer_id INT AUTO_INCREMENT PRIMARY KEY,
+        customer_name VARCHAR(150) NOT NULL,
+        country VARCHAR(60) NOT NULL,
+        phone_number VARCHAR(30) NOT NULL,
+        email VARCHAR(150) NOT NULL
+    ) {TABLE_OPTIONS}""",
+    f"""CREATE TABLE IF NOT EXISTS suppliers (
+        supplier_id INT AUTO_INCREMENT PRIMARY KEY,
+        supplier_name VARCHAR(150) NOT NULL,
+        contact_info VARCHAR(255) NOT NULL,
+        country VARCHAR(60) NOT NULL,
+        phone_number VARCHAR(30) NOT NULL
+    ) {TABLE_OPTIONS}""",
+    f"""CREATE TABLE IF NOT EXISTS products (
+        product_id INT AUTO_INCREMENT PRIMARY KEY,
+        product_name VARCHAR(150) NOT NULL,
+        supplier_id INT NOT NULL,
+        CONSTRAINT fk_products_supplier FOREIGN KEY (supplier_id) REFERENCES suppliers (supplier_id)
+    ) {TABLE_OPTIONS}""",
+    f"""CREATE TABLE IF NOT EXISTS sales (
+        sale_id INT AUTO_INCREMENT PRIMARY KEY,
+        sale_date DATE NOT NULL,
+        amount DECIMAL(12, 2) NOT NULL,
+        product_id INT NOT NULL,
+        customer_id INT NOT NULL,
+        supplier_id INT NOT NULL,
+        employee_id INT NOT NULL,
+        project_id INT NULL,
+        CONSTRAINT fk_sales_product FOREIGN KEY (product_id) REFERENCES products (product_id),
+        CONSTRAINT fk_sales_customer FOREIGN KEY (customer_id) REFERENCES customers (customer_id),
+        CONSTRAINT fk_sales_supplier FOREIGN KEY (supplier_id) REFERENCES suppliers (supplier_id),
+        CONSTRAINT fk_sales_employee FOREIGN KEY (employee_id) REFERENCES employees (employee_id),
+        CONSTRAINT fk_sales_project FOREIGN KEY (project_id) REFERENCES projects (project_id)
+    ) {TABLE_OPTIONS}""",
+    ROLLUP_DDL,
+]
+
+# Indices para los filtros de las rutas, las claves foraneas y los acumulados.
+# InnoDB agrega la clave primaria al final de cada indice secundario, asi
+# "WHERE col = %s AND pk > %s ORDER BY pk" recorre el indice sin ordenar.
+V2_INDEXES = [
+    ("departments", "idx_departments_place", ("place",)),
+    ("departments", "idx_departments_head", ("department_head",)),
+    ("employees", "idx_employees_department", ("department_id",)),
+    ("employees", "idx_employees_manager", ("manager_id",)),
+    ("employees", "idx_employees_position", ("position",)),
+    ("employees", "idx_employees_hire_date", ("hire_date",)),
+    ("projects", "idx_projects_department", ("department_id",)),
+    ("projects", "idx_projects_employee", ("employee_id",)),
+    ("projects", "idx_projects_manager", ("project_manager",)),
+    ("customers", "idx_customers_country", ("country",)),
+    ("suppliers", "idx_suppliers_country", ("country",)),
+    ("products", "idx_products_supplier", ("supplier_id",)),
+    # Cubre el filtro por fecha y la reconstruccion de acumulados (SUM(amount) por dia)
+    ("sales", "idx_sales_date_amount", ("sale_date", "amount")),
+    ("sales", "idx_sales_customer", ("customer_id",)),
+    ("sales", "idx_sales_product", ("product_id",)),
+    ("sales", "idx_sales_supplier", ("supplier_id",)),
+    ("sales", "idx_sales_employee", ("employee_id",)),
+    ("sales", "idx_sales_project", ("project_id",)),
+]
+
+def ensure_index(cursor, table, name, columns):
+    """Crea el indice salvo que ya exista otro con esas columnas al inicio.
+
+    Las tablas creadas a mano pueden tener ya los indices de sus claves foraneas."""
+    cursor.execute(
+        "SELECT index_name, column_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s "
+        "ORDER BY index_name, seq_in_index", (table,))
+    existing = {}
+    for index_name, column_name in cursor.fetchall():
+        existing.setdefault(index_name, []).append(column_name.lower())
+    for index_columns in existing.values():
+        if tuple(index_columns[:len(columns)]) == columns:
+            return False
+    cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+    return True
+
+def create_indexes(cursor):
+    for table, name, columns in V2_INDEXES:
+        ensure_index(cursor, table, name, columns)
+
+class Migration:
+    def __init__(self, version, description, steps):
+        self.version = version
+        self.description = description
+        # Sentencias SQL o funciones que reciben el cursor
+        self.steps = steps
+
+    def apply(self, cursor):
+        for step in self.steps:
+            if callable(step):
+                step(cursor)
+            else:
+                cursor.execute(step)
+
+MIGRATIONS = [
+    Migration(1, "Tablas de la API y acumulados de ventas", V1_TABLES),
+    Migration(2, "Indices de filtros, claves foraneas y agregaciones", [create_indexes]),
+]
+
+# Orden de borrado respetando las claves foraneas
+TABLE_NAMES = ["sales_rollup", "sales", "products", "projects", "employees",
+               "departments", "customers", "suppliers"]
+
+def applied_versions(cursor):
+    cursor.execute(MIGRATIONS_DDL)
+    cursor.execute(f"SELECT version FROM {MIGRATIONS_TABLE}")
+    return {version for (version,) in cursor.fetchall()}
+
+def migrate_sync(target=None):
+    """Aplica en orden las migraciones pendientes; devuelve las versiones aplicadas.
+
+    En MySQL el DDL confirma solo, por eso cada migracion se registra al terminar
+    y todos sus pasos son idempotentes (IF NOT EXISTS / ensure_index)."""
+    applied = []
+    with db_cursor() as (conn, cursor):
+        done = applied_versions(cursor)
+        for migration in MIGRATIONS:
+            if migration.version in done or (target is not None and migration.version > target):
+                continue
+            migration.apply(cursor)
+            cursor.execute(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, description) VALUES (%s, %s)",
+                (migration.version, migration.description))
+            conn.commit()
+            applied.append(migration.version)
+    return applied
+
+def status_sync():
+    with db_cursor() as (conn, cursor):
+        done = applied_versions(cursor)
+    return {
+        "version": max(done) if done else 0,
+        "pending": [m.version for m in MIGRATIONS if m.version not in done],
+    }
+
+def truncate_all_sync():
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        try:
+            for name in TABLE_NAMES:
+                cursor.execute(f"TRUNCATE TABLE {name}")
+        finally:
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+def _sample(column):
+    if column.endswith("date"):
+        return date(2024, 1, 1)
+    if column in ("place", "position", "country"):
+        return "x"
+    return 1
+
+def route_queries():
+    """(descripcion, sql, params, se_espera_recorrido_completo) de cada consulta de las rutas
+    y de las cargas en memoria, armadas con las mismas funciones y filtros que las emiten."""
+    queries = []
+    for name, definitions in tables.LIST_FILTERS.items():
+        table = tables.TABLES[name]
+        columns = (table.pk,) + table.columns
+        for cursor in (None, encode_cursor(1)):
+            suffix = " (cursor)" if cursor else ""
+            query, params = build_page_query(table.name, table.pk, [], cursor, 100, columns)
+            queries.append((f"GET /{name}/{suffix}", query, params, False))
+            for param, column, op in definitions:
+                query, params = build_page_query(
+                    table.name, table.pk, [(column, op, _sample(column))], cursor, 100, columns)
+                queries.append((f"GET /{name}/?{param}{suffix}", query, params, False))
+    for table in tables.TABLES.values():
+        # expand=, load_rows_sync y la revalidacion de claves foraneas buscan por clave primaria
+        queries.append((f"expand {table.name}", ids_query(table, 2), (1, 2), False))
+    for name, definitions in tables.EXPORT_FILTERS.items():
+        table = tables.TABLES[name]
+        query, params = export_query(table.name, table.pk)
+        queries.append((f"GET /{name}/export/", query, params, True))
+        for param, column, op in definitions:
+            query, params = export_query(table.name, table.pk, [(column, op, _sample(column))])
+            queries.append((f"GET /{name}/export/?{param}", query, params, False))
+    for dimension in (None,) + DIMENSIONS:
+        for by_day in (True, False):
+            query, params = summary_query(by_day, dimension, date(2024, 1, 1), date(2024, 12, 31))
+            label = ",".join(["day"] * by_day + [dimension] * bool(dimension)) or "total"
+            queries.append((f"GET /analytics/sales/?group_by={label}", query, params, False))
+    # Cargas completas en memoria: recorren la tabla a proposito
+    for name in sorted({ref for table in tables.TABLES.values()
+                        for ref in table.foreign_keys.values()}):
+        queries.append((f"fk ids {name}", fkcheck.load_query(tables.TABLES[name]), (), True))
+    for name, fields in search.SEARCH_FIELDS.items():
+        queries.append((f"search {name}", search.load_query(tables.TABLES[name], fields), (), True))
+    queries.append(("hierarchy employees", hierarchy.LOAD_QUERY, (), True))
+    query, params = archive.batch_query(0, archive.ARCHIVE_BATCH_SIZE)
+    queries.append(("archive export", query, params, False))
+    query, params = archive.gap_query(0, [[10, 12, 0], [20, 25, 0]], archive.ARCHIVE_BATCH_SIZE)
+    queries.append(("archive export (huecos)", query, params, False))
+    return queries
+
+def check_sync():
+    """EXPLAIN de cada consulta; marca los recorridos completos (type=ALL) no esperados."""
+    report = []
+    with db_cursor(dictionary=True) as (conn, cursor):
+        for name, query, params, full_scan_expected in route_queries():
+            cursor.execute("EXPLAIN " + query, params)
+            for row in cursor.fetchall():
+                full_scan = row.get("type") == "ALL"
+                report.append({
+                    "query": name,
+                    "table": row.get("table"),
+                    "type": row.get("type"),
+                    "key": row.get("key"),
+                    "rows": row.get("rows"),
+                    "extra": row.get("Extra"),
+                    "flagged": full_scan and not full_scan_expected,
+                })
+    return report
+
+if __name__ == "__main__":
+    from .database import init_pool, close_pool
+    commands = ("migrate", "status", "check")
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print("Uso: python -m app.schema migrate|status|check")
+        sys.exit(2)
+    init_pool()
+    try:
+        if sys.argv[1] == "migrate":
+            applied = migrate_sync()
+            print(f"Migraciones aplicadas: {applied}" if applied else "El esquema ya esta al dia")
+        elif sys.argv[1] == "status":
+            status = status_sync()
+            print(f"Version {status['version']}, pendientes: {status['pending'] or 'ninguna'}")
+        else:
+            report = check_sync()
+            for row in report:
+                mark = "FULL SCAN" if row["flagged"] else "ok"
+                print(f"{mark:9} {row['query']:45} {row['table']}: type={row['type']} "
+                      f"key={row['key']} rows={row['rows']} {row['extra'] or ''}")
+            flagged = sum(row["flagged"] for row in report)
+            print(f"{flagged} consultas con recorrido completo de tabla")
+            sys.exit(1 if flagged else 0)
+    finally:
+        close_pool()
@@ -0,0 +1,380 @@
+"""Busqueda por nombre en memoria (prefijo, subcadena y con errores de tipeo).
+
+Cada tabla buscable tiene un indice invertido de trigramas (trigrama -> IDs
+ordenados), los valores de los campos ordenados (para exacto y prefijo sin
+importar el ID) y un vocabulario de palabras para corregir errores de tipeo.
+
+Las consultas corren en hilos propios y con trabajo acotado: se recorren a lo
+sumo SEARCH_MAX_SCAN IDs de las listas de trigramas, van primero los candidatos
+que ademas tienen los trigramas de comienzo de palabra de la consulta y solo se
+verifican los SEARCH_MAX_CANDIDATES primeros."""
+import asyncio
+import bisect
+import collections
+import functools
+import itertools
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from .database import db_cursor, run_db
+from .expand import load_rows_sync
+from . import tables
+
+SEARCH_TTL = float(os.getenv("SEARCH_TTL", "300"))
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "2"))
+# Candidatos maximos que se verifican contra el texto por consulta
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "2000"))
+# IDs maximos de listas de trigramas que se recorren por consulta
+SEARCH_MAX_SCAN = int(os.getenv("SEARCH_MAX_SCAN", "100000"))
+# Fraccion minima de los trigramas de la consulta que debe tener una coincidencia aproximada
+SEARCH_FUZZY_MIN = float(os.getenv("SEARCH_FUZZY_MIN", "0.5"))
+# IDs maximos que se cuentan en la busqueda aproximada (de los trigramas menos frecuentes)
+SEARCH_FUZZY_SCAN = 50000
+# Palabras de hasta este largo se corrigen con el vocabulario (una edicion): en
+# palabras cortas una transposicion rompe casi todos los trigramas
+SEARCH_TYPO_MAX_LEN = 8
+# Inserciones fuera de los valores ordenados; al superarlas se recarga el indice
+SEARCH_RECENT_MAX = 10000
+FETCH_SIZE = 50000
+
+# tabla -> columnas de texto indexadas
+SEARCH_FIELDS = {
+    "customers": ("customer_name", "email"),
+    "suppliers": ("supplier_name", "contact_info"),
+    "products": ("product_name",),
+}
+
+# Nombre del tipo de coincidencia por nivel (menor es mejor)
+MATCH_KINDS = ("exact", "prefix", "word_prefix", "substring", "fuzzy")
+
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+
+def normalize(text):
+    """Minusculas sin acentos; todo lo que no es letra o digito separa palabras."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return " ".join(_SEPARATORS.sub(" ", text.lower()).split())
+
+@functools.lru_cache(maxsize=100000)
+def word_grams(word):
+    # Los dos espacios iniciales marcan el comienzo de palabra: "  a", " ab", "abc", ...
+    padded = "  " + word
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def query_grams(word):
+    """Trigramas que debe tener todo texto que contenga la palabra."""
+    if len(word) >= 3:
+        return {word[i:i + 3] for i in range(len(word) - 2)}
+    # Palabras de 1 o 2 letras: solo como prefijo de palabra
+    return {("  " + word)[-3:]}
+
+def edits1(word):
+    """Palabras a una edicion (borrar, transponer, reemplazar o insertar una letra)."""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    return ({a + b[1:] for a, b in splits if b}
+            | {a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1}
+            | {a + c + b[1:] for a, b in splits if b for c in _ALPHABET}
+            | {a + c + b for a, b in splits for c in _ALPHABET})
+
+def load_query(table, fields):
+    return f"SELECT {table.pk}, {', '.join(fields)} FROM {table.name} ORDER BY {table.pk}"
+
+def _rank(query, words, fields):
+    """Nivel de coincidencia de un documento, o None si no contiene la consulta."""
+    joined = " ".join(fields)
+    if not all(word in joined for word in words):
+        return None
+    if query in fields:
+        return 0
+    if any(field.startswith(query) for field in fields):
+        return 1
+    field_words = joined.split()
+    if all(any(w.startswith(word) for w in field_words) for word in words):
+        return 2
+    return 3
+
+def _doc_grams(doc):
+    grams = set()
+    for field in doc:
+        for word in field.split():
+            grams |= word_grams(word)
+    return grams
+
+def _vocabulary_words(doc):
+    # Solo palabras de letras: los numeros y codigos no se corrigen
+    return {word for field in doc for word in field.split() if len(word) > 2 and word.isalpha()}
+
+class _IndexData:
+    """Contenido de un indice; se reemplaza entero en cada recarga."""
+
+    def __init__(self):
+        self.docs = {}
+        self.postings = {}
+        # Valores de los campos ordenados y su ID, en paralelo
+        self.keys = []
+        self.key_ids = array("q")
+        # (valor, ID) insertados despues de la carga, sin ordenar
+        self.recent = []
+        self.words = collections.Counter()
+
+    @classmethod
+    def build(cls, rows):
+        """rows: (id, campo1, campo2, ...) en orden de id."""
+        data = cls()
+        postings = collections.defaultdict(lambda: array("q"))
+        pairs = []
+        for row in rows:
+            doc_id = row[0]
+            doc = tuple(normalize(value) for value in row[1:])
+            data.docs[doc_id] = doc
+            for gram in _doc_grams(doc):
+                postings[gram].append(doc_id)
+            pairs.extend((field, doc_id) for field in doc if field)
+            data.words.update(_vocabulary_words(doc))
+        pairs.sort()
+        data.postings = dict(postings)
+        data.keys = [key for key, _ in pairs]
+        data.key_ids = array("q", (doc_id for _, doc_id in pairs))
+        return data
+
+    def add(self, doc_id, doc):
+        if doc_id in self.docs:
+            return
+        self.docs[doc_id] = doc
+        for gram in _doc_grams(doc):
+            posting = self.postings.setdefault(gram, array("q"))
+            if not posting or posting[-1] < doc_id:
+                posting.append(doc_id)
+            else:
+                posting.insert(bisect.bisect_left(posting, doc_id), doc_id)
+        self.recent.extend((field, doc_id) for field in doc if field)
+        self.words.update(_vocabulary_words(doc))
+
+class SearchIndex:
+    def __init__(self, table, fields, ttl=SEARCH_TTL):
+        self.table = table
+        self.fields = fields
+        self.ttl = ttl
+        self._data = _IndexData()
+        self._loaded_at = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        # Las consultas y las inserciones corren en los hilos de busqueda
+        self._mutex = threading.Lock()
+        self._applying = set()
+        # Inserciones que llegan mientras se recarga: se aplican sobre la carga nueva
+        self._pending = None
+        self.searches = 0
+
+    def _load_sync(self):
+        with db_cursor() as (conn, cursor):
+            # Recorre la tabla entera: con millones de filas supera DB_QUERY_TIMEOUT
+            conn.set_statement_timeout(0)
+            try:
+                cursor.execute(load_query(self.table, self.fields))
+                return _IndexData.build(itertools.chain.from_iterable(
+                    iter(lambda: cursor.fetchmany(FETCH_SIZE), [])))
+            finally:
+                conn.set_statement_timeout()
+
+    async def ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl:
+            return
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                return
+            generation = self._generation
+            self._pending = []
+            try:
+                data = await run_db(self._load_sync)
+                pending, self._pending = self._pending, None
+                await run_search(self._install, data, pending)
+            finally:
+                self._pending = None
+            # Si se invalido durante la carga, la proxima consulta vuelve a cargar
+            self._loaded_at = time.monotonic() if generation == self._generation else None
+
+    def _install(self, data, pending):
+        with self._mutex:
+            self._data = data
+            self._add(pending)
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = None
+
+    def note_inserted(self, items):
+        """items: dicts con la clave primaria y las columnas indexadas ya confirmados."""
+        if self._pending is not None:
+            self._pending.extend(items)
+        if self._loaded_at is not None:
+            future = asyncio.get_running_loop().run_in_executor(_executor, self._apply, items)
+            self._applying.add(future)
+            future.add_done_callback(self._applying.discard)
+
+    async def settle(self):
+        """Espera las inserciones en curso: una busqueda posterior ya las ve."""
+        if self._applying:
+            await asyncio.gather(*self._applying, return_exceptions=True)
+
+    def _apply(self, items):
+        with self._mutex:
+            self._add(items)
+
+    def _add(self, items):
+        data = self._data
+        for item in items:
+            data.add(item[self.table.pk], tuple(normalize(item[field]) for field in self.fields))
+        if len(data.recent) > SEARCH_RECENT_MAX:
+            self._loaded_at = None
+
+    def _prefix_matches(self, data, query):
+        """IDs con algun campo que empieza por la consulta, sin importar el ID."""
+        found = []
+        start = bisect.bisect_left(data.keys, query)
+        for i in range(start, min(start + SEARCH_MAX_CANDIDATES, len(data.keys))):
+            if not data.keys[i].startswith(query):
+                break
+            found.append(data.key_ids[i])
+        found.extend(doc_id for key, doc_id in data.recent if key.startswith(query))
+        return found
+
+    def _candidates(self, data, words):
+        """IDs que pueden contener todas las palabras, los que las tienen al comienzo de palabra primero."""
+        required = set().union(*(query_grams(word) for word in words))
+        postings = sorted((data.postings.get(gram, ()) for gram in required), key=len)
+        if not postings[0]:
+            return []
+        budget = SEARCH_MAX_SCAN
+        # Incluso el trigrama menos frecuente puede ser comun: se toma solo una parte
+        driver = postings[0][:budget // 2]
+        budget -= len(driver)
+        candidates = set(driver)
+        for posting in postings[1:]:
+            if len(posting) > budget or len(candidates) <= SEARCH_MAX_CANDIDATES // 4:
+                # Lo que falte lo descarta la verificacion contra el texto
+                break
+            candidates.intersection_update(posting)
+            budget -= len(posting)
+        if len(candidates) <= SEARCH_MAX_CANDIDATES:
+            return sorted(candidates)
+        # Sobran candidatos: primero los que ademas tienen los trigramas de
+        # comienzo de palabra (coincidencias por prefijo), despues el resto
+        optional = set().union(*(word_grams(word) for word in words)) - required
+        best = candidates
+        for posting in sorted((data.postings.get(gram, ()) for gram in optional), key=len):
+            if len(posting) > budget:
+                break
+            budget -= len(posting)
+            narrowed = best.intersection(posting)
+            if not narrowed:
+                break
+            best = narrowed
+        ranked = sorted(best)[:SEARCH_MAX_CANDIDATES]
+        if len(ranked) < SEARCH_MAX_CANDIDATES:
+            ranked.extend(sorted(candidates - best)[:SEARCH_MAX_CANDIDATES - len(ranked)])
+        return ranked
+
+    def _matches(self, data, query, words):
+        """[(nivel, largo, id)] ordenados de mejor a peor."""
+        ranked = {}
+        for doc_id in itertools.chain(self._prefix_matches(data, query),
+                                      self._candidates(data, words)):
+            if doc_id in ranked:
+                continue
+            fields = data.docs.get(doc_id)
+            level = _rank(query, words, fields) if fields is not None else None
+            if level is not None:
+                length = min((len(field) for field in fields if field), default=0)
+                ranked[doc_id] = (level, length, doc_id)
+        return sorted(ranked.values())
+
+    def _corrected(self, data, words):
+        """Cambia las palabras cortas que no estan en el vocabulario por la mas
+        frecuente a una edicion; None si no hay nada que corregir."""
+        corrected = []
+        for word in words:
+            if (word not in data.words and word.isalpha()
+                    and 3 <= len(word) <= SEARCH_TYPO_MAX_LEN):
+                options = [(data.words[w], w) for w in edits1(word) if w in data.words]
+                if options:
+                    word = max(options)[1]
+            corrected.append(word)
+        return corrected if corrected != words else None
+
+    def _fuzzy(self, data, words, exclude, limit):
+        grams = set().union(*(word_grams(word) for word in words))
+        postings = sorted((posting for posting in map(data.postings.get, grams) if posting), key=len)
+        # Se cuentan los trigramas menos frecuentes: los comunes casi no distinguen
+        scanned = []
+        total = 0
+        for posting in postings:
+            if scanned and total + len(posting) > SEARCH_FUZZY_SCAN:
+                break
+            scanned.append(posting[:SEARCH_FUZZY_SCAN])
+            total += len(scanned[-1])
+        counts = collections.Counter(itertools.chain.from_iterable(scanned))
+        found = []
+        for doc_id, _ in counts.most_common(limit * 5 + len(exclude)):
+            if doc_id in exclude:
+                continue
+            similarity = len(grams & _doc_grams(data.docs[doc_id])) / len(grams)
+            if similarity >= SEARCH_FUZZY_MIN:
+                found.append((-similarity, doc_id))
+        found.sort()
+        return [doc_id for _, doc_id in found[:limit]]
+
+    def search(self, q, limit):
+        """[(id, tipo de coincidencia)] de mejor a peor."""
+        query = normalize(q)
+        words = query.split()
+        if not words:
+            return []
+        with self._mutex:
+            self.searches += 1
+            data = self._data
+            found = [(doc_id, MATCH_KINDS[level])
+                     for level, _, doc_id in self._matches(data, query, words)[:limit]]
+            exclude = {doc_id for doc_id, _ in found}
+            corrected = self._corrected(data, words) if len(found) < limit else None
+            if corrected is not None:
+                for _, _, doc_id in self._matches(data, " ".join(corrected), corrected):
+                    if len(found) >= limit:
+                        break
+                    if doc_id not in exclude:
+                        found.append((doc_id, "fuzzy"))
+                        exclude.add(doc_id)
+            if len(found) < limit and len(query) >= 3:
+                found.extend((doc_id, "fuzzy")
+                             for doc_id in self._fuzzy(data, words, exclude, limit - len(found)))
+            return found
+
+    def status(self):
+        data = self._data
+        return {"rows": len(data.docs), "grams": len(data.postings), "words": len(data.words),
+                "loaded": self._loaded_at is not None, "searches": self.searches}
+
+search_indexes = {name: SearchIndex(tables.TABLES[name], fields)
+                  for name, fields in SEARCH_FIELDS.items()}
+
+# Hilos propios: una busqueda no ocupa el event loop ni los hilos reservados para la BD
+_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+
+async def run_search(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+def search_status():
+    return {name: index.status() for name, index in search_indexes.items()}
+
+async def search_table(table_name, q, limit):
+    index = search_indexes[table_name]
+    await index.ensure_loaded()
+    await index.settle()
+    found = await run_search(index.search, q, limit)
+    table = index.table
+    rows = await run_db(load_rows_sync, table, [doc_id for doc_id, _ in found])
+    return [{**rows[doc_id], "match": match} for doc_id, match in found if doc_id in rows]
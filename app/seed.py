@@ -0,0 +1,255 @@
+"""Generador de datos sinteticos con integridad referencial para todas las tablas.
+
+    python -m app.seed --scale 1 --seed 42
+    python -m app.seed --sales 10000000 --batch 20000
+
+Orden de carga: suppliers -> products, departments -> employees (arbol de
+managers) -> projects -> customers -> sales. Los datos se generan por lotes y
+se insertan con el motor de INSERT multi-fila de app.bulk."""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from . import tables
+from .bulk import bulk_insert_sync
+from .analytics import rebuild_rollup_sync
+from .database import init_pool, close_pool, db_cursor
+
+BASE_COUNTS = {
+    "suppliers": 50,
+    "products": 500,
+    "departments": 10,
+    "employees": 1000,
+    "projects": 100,
+    "customers": 5000,
+    "sales": 100000,
+}
+
+FIRST_NAMES = ["Ana", "Luis", "Maria", "Jose", "Carmen", "Juan", "Lucia", "Carlos", "Sofia",
+               "Miguel", "Valeria", "Diego", "Camila", "Andres", "Paula", "Jorge", "Elena",
+               "Ricardo", "Isabel", "Fernando", "Daniela", "Pablo", "Gabriela", "Sergio"]
+LAST_NAMES = ["Garcia", "Rodriguez", "Martinez", "Lopez", "Gonzalez", "Perez", "Sanchez",
+              "Ramirez", "Torres", "Flores", "Rivera", "Gomez", "Diaz", "Cruz", "Morales",
+              "Reyes", "Gutierrez", "Ortiz", "Castillo", "Jimenez", "Vargas", "Romero"]
+COUNTRIES = ["Mexico", "Colombia", "Argentina", "Chile", "Peru", "Espana", "Ecuador",
+             "Uruguay", "Guatemala", "Costa Rica", "Estados Unidos", "Canada"]
+CITIES = ["Monterrey", "Guadalajara", "Ciudad de Mexico", "Bogota", "Lima", "Santiago",
+          "Buenos Aires", "Madrid", "Quito", "Montevideo"]
+DEPARTMENT_NAMES = ["Ventas", "Finanzas", "Recursos Humanos", "Tecnologia", "Operaciones",
+                    "Marketing", "Logistica", "Compras", "Legal", "Atencion al Cliente"]
+POSITIONS = ["Director", "Gerente", "Coordinador", "Analista", "Especialista", "Asistente"]
+COMPANY_WORDS = ["Global", "Andina", "Norte", "Sur", "Pacifico", "Atlantico", "Central",
+                 "Express", "Industrial", "Comercial", "Digital", "Integral"]
+COMPANY_TYPES = ["S.A.", "S.A. de C.V.", "Ltda.", "Group", "Corp."]
+PRODUCT_WORDS = ["Laptop", "Monitor", "Teclado", "Silla", "Escritorio", "Impresora", "Router",
+                 "Telefono", "Tablet", "Camara", "Audifonos", "Disco", "Licencia", "Servidor"]
+PRODUCT_MODELS = ["Basic", "Pro", "Max", "Lite", "Plus", "X", "Ultra", "Mini"]
+
+class Generator:
+    def __init__(self, seed, counts, batch_size):
+        self.rng = random.Random(seed)
+        self.counts = counts
+        self.batch_size = batch_size
+        self.report = []
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(self.batch_size, total - start)
+
+    def dates(self, start, days, n):
+        return [start + timedelta(days=d) for d in self.rng.choices(range(days), k=n)]
+
+    def money(self, low, high, n):
+        return [Decimal(cents).scaleb(-2) for cents in
+                self.rng.choices(range(low * 100, high * 100), k=n)]
+
+    def phones(self, n):
+        return [f"+52 {a} {b:04d} {c:04d}" for a, b, c in zip(
+            self.rng.choices(range(10, 99), k=n),
+            self.rng.choices(range(10000), k=n),
+            self.rng.choices(range(10000), k=n))]
+
+    def record(self, name, rows, seconds, extra=""):
+        rate = rows / seconds if seconds > 0 else 0
+        self.report.append((name, rows, seconds, rate))
+        print(f"{name:<12} {rows:>12,} filas  {seconds:9.2f} s  {rate:12,.0f} filas/s{extra}")
+
+    def load(self, table, rows_iter, update_rollups=True):
+        start = time.perf_counter()
+        ids = []
+        for rows in rows_iter:
+            new_ids, _ = bulk_insert_sync(table, rows, commit_mode="chunk",
+                                          update_rollups=update_rollups)
+            ids.extend(new_ids)
+        self.record(table.name, len(ids), time.perf_counter() - start)
+        return ids
+
+    def suppliers(self):
+        rng = self.rng
+        def rows():
+            for start, n in self.batches(self.counts["suppliers"]):
+                names = [f"{a} {b} {c}" for a, b, c in zip(
+                    rng.choices(COMPANY_WORDS, k=n), rng.choices(PRODUCT_WORDS, k=n),
+                    rng.choices(COMPANY_TYPES, k=n))]
+                yield list(zip(
+                    names,
+                    [f"ventas{start + i}@proveedor{start + i}.com" for i in range(n)],
+                    rng.choices(COUNTRIES, k=n),
+                    self.phones(n)))
+        return self.load(tables.SUPPLIERS, rows())
+
+    def products(self, supplier_ids):
+        rng = self.rng
+        suppliers_by_row = []
+        def rows():
+            for start, n in self.batches(self.counts["products"]):
+                suppliers = rng.choices(supplier_ids, k=n)
+                suppliers_by_row.extend(suppliers)
+                names = [f"{a} {b} {start + i}" for i, (a, b) in enumerate(zip(
+                    rng.choices(PRODUCT_WORDS, k=n), rng.choices(PRODUCT_MODELS, k=n)))]
+                yield list(zip(names, suppliers))
+        ids = self.load(tables.PRODUCTS, rows())
+        # Las ventas usan el proveedor real de cada producto
+        self.product_supplier = dict(zip(ids, suppliers_by_row))
+        return ids
+
+    def departments(self):
+        rng = self.rng
+        n = self.counts["departments"]
+        names = [DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)] +
+                 (f" {i // len(DEPARTMENT_NAMES) + 1}" if i >= len(DEPARTMENT_NAMES) else "")
+                 for i in range(n)]
+        # department_head se asigna cuando ya existen los empleados
+        return self.load(tables.DEPARTMENTS,
+                         [list(zip(names, rng.choices(CITIES, k=n), [0] * n))])
+
+    def employees(self, department_ids):
+        """Arbol de managers por niveles: un director por departamento y cada
+        nivel siguiente reporta a alguien del nivel anterior del mismo departamento."""
+        rng = self.rng
+        total = max(self.counts["employees"], len(department_ids))
+        self.department_employees = {d: [] for d in department_ids}
+        heads = {}
+        start_time = time.perf_counter()
+        created = 0
+        level = [(None, d) for d in department_ids]
+        depth = 0
+        while created < total:
+            n = min(len(level) if depth == 0 else len(level) * rng.randint(3, 8), total - created)
+            parents = level if depth == 0 else rng.choices(level, k=n)
+            position = POSITIONS[min(depth, len(POSITIONS) - 1)]
+            first = rng.choices(FIRST_NAMES, k=n)
+            last = rng.choices(LAST_NAMES, k=n)
+            hire_dates = self.dates(date(2010, 1, 1), 5000, n)
+            salaries = self.money(15000 // (depth + 1), 90000 // (depth + 1), n)
+            rows = [
+                (f, l, f"{f.lower()}.{l.lower()}{created + i}@empresa.com",
+                 parent[1], hire_dates[i], salaries[i], position, parent[0])
+                for i, (f, l, parent) in enumerate(zip(first, last, parents))
+            ]
+            next_level = []
+            for offset in range(0, n, self.batch_size):
+                chunk = rows[offset:offset + self.batch_size]
+                new_ids, _ = bulk_insert_sync(tables.EMPLOYEES, chunk, commit_mode="chunk")
+                for employee_id, row in zip(new_ids, chunk):
+                    department_id = row[3]
+                    self.department_employees[department_id].append(employee_id)
+                    heads.setdefault(department_id, employee_id)
+                    next_level.append((employee_id, department_id))
+            created += n
+            level = next_level
+            depth += 1
+        with db_cursor() as (conn, cursor):
+            cursor.executemany(
+                "UPDATE departments SET department_head = %s WHERE department_id = %s",
+                [(employee_id, department_id) for department_id, employee_id in heads.items()])
+            conn.commit()
+        self.record("employees", created, time.perf_counter() - start_time,
+                    f"  ({depth} niveles)")
+        return [e for ids in self.department_employees.values() for e in ids]
+
+    def projects(self, department_ids):
+        rng = self.rng
+        def rows():
+            for start, n in self.batches(self.counts["projects"]):
+                departments = rng.choices(department_ids, k=n)
+                starts = self.dates(date(2018, 1, 1), 2500, n)
+                durations = rng.choices(range(30, 900), k=n)
+                budgets = self.money(10000, 2000000, n)
+                batch = []
+                for i, department_id in enumerate(departments):
+                    staff = self.department_employees[department_id]
+                    batch.append((
+                        f"Proyecto {rng.choice(COMPANY_WORDS)} {start + i + 1}",
+                        starts[i], starts[i] + timedelta(days=durations[i]),
+                        department_id, rng.choice(staff), budgets[i], rng.choice(staff[:10])))
+                yield batch
+        return self.load(tables.PROJECTS, rows())
+
+    def customers(self):
+        rng = self.rng
+        def rows():
+            for start, n in self.batches(self.counts["customers"]):
+                first = rng.choices(FIRST_NAMES, k=n)
+                last = rng.choices(LAST_NAMES, k=n)
+                yield [
+                    (f"{f} {l}", country, phone, f"{f.lower()}.{l.lower()}{start + i}@correo.com")
+                    for i, (f, l, country, phone) in enumerate(zip(
+                        first, last, rng.choices(COUNTRIES, k=n), self.phones(n)))
+                ]
+        return self.load(tables.CUSTOMERS, rows())
+
+    def sales(self, product_ids, customer_ids, employee_ids, project_ids):
+        rng = self.rng
+        with_project = project_ids + [None] * max(1, len(project_ids) // 2)
+        def rows():
+            for start, n in self.batches(self.counts["sales"]):
+                products = rng.choices(product_ids, k=n)
+                yield list(zip(
+                    self.dates(date(2020, 1, 1), 365 * 5, n),
+                    self.money(5, 5000, n),
+                    products,
+                    rng.choices(customer_ids, k=n),
+                    [self.product_supplier[p] for p in products],
+                    rng.choices(employee_ids, k=n),
+                    rng.choices(with_project, k=n)))
+        # Los acumulados se reconstruyen al final en una sola pasada
+        return self.load(tables.SALES, rows(), update_rollups=False)
+
+    def run(self):
+        start = time.perf_counter()
+        supplier_ids = self.suppliers()
+        product_ids = self.products(supplier_ids)
+        department_ids = self.departments()
+        employee_ids = self.employees(department_ids)
+        project_ids = self.projects(department_ids)
+        customer_ids = self.customers()
+        self.sales(product_ids, customer_ids, employee_ids, project_ids)
+        t0 = time.perf_counter()
+        rebuild_rollup_sync()
+        print(f"{'sales_rollup':<12} reconstruido en {time.perf_counter() - t0:.2f} s")
+        print(f"Total: {time.perf_counter() - start:.2f} s")
+        return {"suppliers": supplier_ids, "products": product_ids,
+                "departments": department_ids, "employees": employee_ids,
+                "projects": project_ids, "customers": customer_ids}
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga datos sinteticos en la base de datos")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla para datos reproducibles")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiplica los volumenes base (1 = 100k ventas)")
+    parser.add_argument("--batch", type=int, default=10000, help="Filas generadas por lote")
+    for name in BASE_COUNTS:
+        parser.add_argument(f"--{name}", type=int, default=None, help=f"Filas de {name}")
+    args = parser.parse_args()
+    counts = {name: getattr(args, name) or max(1, int(base * args.scale))
+              for name, base in BASE_COUNTS.items()}
+    init_pool()
+    try:
+        Generator(args.seed, counts, args.batch).run()
+    finally:
+        close_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import json
+import time
+from decimal import Decimal
+from fastapi.responses import Response
+from .database import run_db, db_cursor
+from . import metrics
+from .pagination import build_page_query, encode_cursor
+from .expand import parse_expand, expand_items
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    # Igual que Pydantic en modo JSON: Decimal como texto ("10.50")
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+def dumps(obj):
+    start = time.perf_counter()
+    if orjson is not None:
+        body = orjson.dumps(obj, default=_default)
+    else:
+        body = json.dumps(obj, default=_default, ensure_ascii=False,
+                          separators=(",", ":")).encode()
+    metrics.json_encode_seconds.observe(time.perf_counter() - start)
+    return body
+
+class RawJSONResponse(Response):
+    """Respuesta con el JSON ya codificado: FastAPI no revalida ni vuelve a serializar."""
+    media_type = "application/json"
+
+def page_items(columns, rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0])
+    return [dict(zip(columns, row)) for row in rows], next_cursor
+
+def encode_page(columns, rows, limit):
+    items, next_cursor = page_items(columns, rows, limit)
+    return dumps({"items": items, "next_cursor": next_cursor})
+
+def fetch_page_sync(table, query, params, limit, relations=()):
+    with db_cursor(read_only=True) as (conn, cursor):
+        cursor.execute(query, params)
+        items, next_cursor = page_items((table.pk,) + table.columns, cursor.fetchall(), limit)
+        if relations:
+            # Una consulta por relacion para toda la pagina, nunca una por fila
+            expand_items(cursor, table, items, relations)
+    return dumps({"items": items, "next_cursor": next_cursor})
+
+async def fetch_page_json(table, filters, cursor, limit, expand=None):
+    """Pagina como bytes JSON leyendo tuplas (sin diccionarios ni modelos Pydantic).
+
+    Se seleccionan las columnas en el orden del modelo para que la salida sea
+    identica a la de response_model."""
+    relations = parse_expand(table, expand)
+    columns = (table.pk,) + table.columns
+    query, params = build_page_query(table.name, table.pk, filters, cursor, limit,
+                                     columns=columns)
+    return await run_db(fetch_page_sync, table, query, params, limit, relations)
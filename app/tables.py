@@ -0,0 +1,74 @@
+class Table:
+    def __init__(self, name, pk, columns, foreign_keys=None):
+        self.name = name
+        self.pk = pk
+        self.columns = columns
+        # columna -> tabla referenciada
+        self.foreign_keys = foreign_keys or {}
+
+    def values(self, item):
+        return tuple(getattr(item, column) for column in self.columns)
+
+DEPARTMENTS = Table("departments", "department_id",
+                    ("department_name", "place", "department_head"))
+
+EMPLOYEES = Table("employees", "employee_id",
+                  ("first_name", "last_name", "email", "department_id",
+                   "hire_date", "salary", "position", "manager_id"),
+                  {"department_id": "departments", "manager_id": "employees"})
+
+PROJECTS = Table("projects", "project_id",
+                 ("project_name", "start_date", "end_date", "department_id",
+                  "employee_id", "budget", "project_manager"),
+                 {"department_id": "departments", "employee_id": "employees",
+                  "project_manager": "employees"})
+
+CUSTOMERS = Table("customers", "customer_id",
+                  ("customer_name", "country", "phone_number", "email"))
+
+SUPPLIERS = Table("suppliers", "supplier_id",
+                  ("supplier_name", "contact_info", "country", "phone_number"))
+
+PRODUCTS = Table("products", "product_id",
+                 ("product_name", "supplier_id"),
+                 {"supplier_id": "suppliers"})
+
+SALES = Table("sales", "sale_id",
+              ("sale_date", "amount", "product_id", "customer_id",
+               "supplier_id", "employee_id", "project_id"),
+              {"product_id": "products", "customer_id": "customers",
+               "supplier_id": "suppliers", "employee_id": "employees",
+               "project_id": "projects"})
+
+TABLES = {table.name: table for table in
+          (DEPARTMENTS, EMPLOYEES, PROJECTS, CUSTOMERS, SUPPLIERS, PRODUCTS, SALES)}
+
+# Filtros de las rutas de listado y exportacion: (parametro, columna, operador).
+# Las rutas y el EXPLAIN de app.schema salen de estas mismas definiciones
+LIST_FILTERS = {
+    "departments": (("place", "place", "="), ("department_head", "department_head", "=")),
+    "employees": (("department_id", "department_id", "="), ("manager_id", "manager_id", "="),
+                  ("position", "position", "="), ("hire_date_from", "hire_date", ">="),
+                  ("hire_date_to", "hire_date", "<=")),
+    "projects": (("department_id", "department_id", "="), ("employee_id", "employee_id", "="),
+                 ("project_manager", "project_manager", "=")),
+    "customers": (("country", "country", "="),),
+    "suppliers": (("country", "country", "="),),
+    "products": (("supplier_id", "supplier_id", "="),),
+    "sales": (("sale_date_from", "sale_date", ">="), ("sale_date_to", "sale_date", "<="),
+              ("customer_id", "customer_id", "="), ("product_id", "product_id", "="),
+              ("supplier_id", "supplier_id", "="), ("employee_id", "employee_id", "="),
+              ("project_id", "project_id", "=")),
+}
+EXPORT_FILTERS = {
+    "employees": (("department_id", "department_id", "="),),
+    "sales": (("sale_date_from", "sale_date", ">="), ("sale_date_to", "sale_date", "<=")),
+}
+
+def bind_filters(definitions, **values):
+    """[(columna, operador, valor)] con el valor de cada parametro de la ruta."""
+    params = {param for param, _, _ in definitions}
+    if values.keys() != params:
+        raise TypeError(f"Parametros de filtro distintos de la definicion: "
+                        f"{sorted(values.keys() ^ params)}")
+    return [(column, op, values[param]) for param, column, op in definitions]
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from .cache import CACHE_BACKEND, CACHE_REDIS_URL, CACHE_TTLS
+from .database import require_fresh_reads
+from .expand import RELATIONS, parse_expand
+
+class MemoryVersions:
+    """Versiones por tabla en memoria del proceso; reiniciar cambia la epoca de los ETags."""
+
+    def __init__(self):
+        self.epoch = os.urandom(4).hex()
+        self._started = time.time()
+        self._versions = {}
+
+    async def get(self, names):
+        return {name: self._versions.get(name, (0, self._started)) for name in names}
+
+    async def bump(self, name):
+        version, _ = self._versions.get(name, (0, self._started))
+        self._versions[name] = (version + 1, time.time())
+
+class RedisVersions:
+    """Versiones compartidas entre workers (mismo Redis que el cache de respuestas)."""
+
+    def __init__(self, url=CACHE_REDIS_URL, prefix="api-versions"):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+        self.epoch = None
+        self._started = time.time()
+
+    async def _epoch(self):
+        # Si Redis se vacia cambia la epoca y ningun ETag anterior vuelve a coincidir
+        if self.epoch is None:
+            await self._redis.set(f"{self.prefix}:epoch", os.urandom(4).hex(), nx=True)
+            self.epoch = (await self._redis.get(f"{self.prefix}:epoch")).decode()
+        return self.epoch
+
+    async def get(self, names):
+        await self._epoch()
+        pipe = self._redis.pipeline()
+        for name in names:
+            pipe.hmget(f"{self.prefix}:{name}", "version", "modified")
+        result = {}
+        for name, (version, modified) in zip(names, await pipe.execute()):
+            result[name] = (int(version or 0),
+                            float(modified) if modified is not None else self._started)
+        return result
+
+    async def bump(self, name):
+        key = f"{self.prefix}:{name}"
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hincrby(key, "version", 1)
+        pipe.hset(key, "modified", time.time())
+        await pipe.execute()
+
+class TableVersions:
+    """Numero de version y hora del ultimo cambio de cada tabla.
+
+    Las escrituras de la API incrementan la version; los listados derivan de ahi
+    ETag y Last-Modified y responden 304 sin consultar la BD. Las escrituras
+    hechas fuera de la API (p. ej. app.seed) no se detectan."""
+
+    def __init__(self, backend, pinned=tuple(CACHE_TTLS)):
+        self.backend = backend
+        # Tablas que casi no cambian: una lectura vieja de una replica quedaria en el
+        # cache y detras del ETag hasta la siguiente escritura, que puede tardar mucho
+        self.pinned = set(pinned)
+        self.bumps = 0
+        self.not_modified = 0
+
+    async def bump(self, table_name):
+        self.bumps += 1
+        await self.backend.bump(table_name)
+
+    async def validators(self, table, params, expand=None):
+        # Con expand la respuesta depende tambien de las tablas relacionadas
+        names = [table.name] + sorted({RELATIONS[table.name][relation][1].name
+                                       for relation in parse_expand(table, expand)} - {table.name})
+        versions = await self.backend.get(names)
+        digest = hashlib.sha1(json.dumps(
+            [[versions[name][0] for name in names], params, expand],
+            sort_keys=True, default=str).encode()).hexdigest()[:20]
+        headers = {
+            "ETag": f'W/"{self.backend.epoch}-{digest}"',
+            "Cache-Control": "no-cache",
+        }
+        modified = max(versions[name][1] for name in names)
+        if self.pinned.intersection(names):
+            require_fresh_reads(modified)
+        # Last-Modified tiene resolucion de segundos: solo se envia cuando ya
+        # termino el segundo del ultimo cambio, asi ningun cambio posterior comparte fecha
+        if int(time.time()) > int(modified):
+            headers["Last-Modified"] = formatdate(int(modified), usegmt=True)
+        return headers
+
+    def is_not_modified(self, request, headers):
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match tiene prioridad sobre If-Modified-Since (comparacion debil)
+            etag = headers["ETag"].removeprefix("W/")
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            matched = "*" in tags or etag in tags
+        else:
+            if_modified_since = request.headers.get("if-modified-since")
+            if if_modified_since is None or "Last-Modified" not in headers:
+                return False
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+                modified = parsedate_to_datetime(headers["Last-Modified"]).timestamp()
+            except (TypeError, ValueError):
+                return False
+            matched = modified <= since
+        if matched:
+            self.not_modified += 1
+        return matched
+
+    def stats(self):
+        return {"bumps": self.bumps, "not_modified": self.not_modified}
+
+def make_backend(name=CACHE_BACKEND):
+    if name == "redis":
+        return RedisVersions()
+    return MemoryVersions()
+
+table_versions = TableVersions(make_backend())
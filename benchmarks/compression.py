@@ -0,0 +1,72 @@
+"""CPU contra bytes: compresion de una pagina de ventas (JSON) y de una exportacion NDJSON
+con gzip y zstd a distintos niveles. No necesita base de datos.
+
+    python -m benchmarks.compression --rows 100000 --mbps 100
+"""
+import argparse
+import time
+
+from app import tables
+from app.compression import Compressor, Decompressor, compress
+from app.export import encode_ndjson
+from app.serialization import encode_page
+from benchmarks.serialization import make_rows
+
+GZIP_LEVELS = (1, 3, 5, 6, 9)
+ZSTD_LEVELS = (1, 3, 6, 12, 19)
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def inflate(data, encoding):
+    decompressor = Decompressor(encoding)
+    return b"".join(decompressor.decompress(data)) + b"".join(decompressor.finish())
+
+def streamed(chunks, encoding, level):
+    # Como la respuesta en streaming: un vaciado por bloque
+    compressor = Compressor(encoding, level)
+    out = [compressor.compress(chunk) for chunk in chunks]
+    out.append(compressor.compress(b"", final=True))
+    return b"".join(out)
+
+def report(name, body, chunks, encodings, repeat, mbps):
+    raw_transfer = len(body) * 8 / (mbps * 1_000_000)
+    print(f"\n{name}: {len(body):,} bytes sin comprimir, {raw_transfer * 1000:.1f} ms a {mbps} Mbit/s")
+    print(f"{'codificacion':14} {'bytes':>12} {'razon':>7} {'comp MB/s':>10} {'desc MB/s':>10} "
+          f"{'stream bytes':>13} {'total ms':>9}")
+    for encoding, level in encodings:
+        data, t_compress = best_time(lambda: compress(body, encoding, level), repeat)
+        inflated, t_decompress = best_time(lambda: inflate(data, encoding), repeat)
+        assert inflated == body
+        stream_size = len(streamed(chunks, encoding, level))
+        # Tiempo total estimado: comprimir + transferir + descomprimir
+        total = t_compress + len(data) * 8 / (mbps * 1_000_000) + t_decompress
+        print(f"{encoding + ' ' + str(level):14} {len(data):12,} {len(body) / len(data):7.1f} "
+              f"{len(body) / t_compress / 1e6:10.1f} {len(body) / t_decompress / 1e6:10.1f} "
+              f"{stream_size:13,} {total * 1000:9.1f}")
+
+def main(n, repeat, mbps, chunk_rows):
+    columns = (tables.SALES.pk,) + tables.SALES.columns
+    rows = make_rows(n)
+    page = encode_page(columns, rows, n)
+    chunks = [encode_ndjson(columns, rows[i:i + chunk_rows]) for i in range(0, n, chunk_rows)]
+    encodings = ([("gzip", level) for level in GZIP_LEVELS]
+                 + [("zstd", level) for level in ZSTD_LEVELS])
+    report(f"GET /sales/ ({n} filas)", page, [page], encodings, repeat, mbps)
+    report(f"GET /sales/export/ ndjson (bloques de {chunk_rows})", b"".join(chunks), chunks,
+           encodings, repeat, mbps)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mbps", type=float, default=100.0, help="Ancho de banda del enlace")
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="Filas por bloque exportado")
+    args = parser.parse_args()
+    main(args.rows, args.repeat, args.mbps, args.chunk_rows)
@@ -0,0 +1,50 @@
+"""Muestra que las consultas concurrentes ya no se serializan en el event loop.
+
+Lanza N consultas lentas (SELECT SLEEP) y una rapida al mismo tiempo, primero
+llamando al driver de forma bloqueante dentro de corrutinas (como antes) y luego
+a traves de run_db. Requiere la misma configuracion .env que la API.
+
+    python -m benchmarks.concurrency --requests 8 --sleep 1
+"""
+import argparse
+import asyncio
+import time
+
+from app.database import init_pool, close_pool, fetch_all_sync, fetch_all
+
+async def blocking_query(query):
+    # Asi se comportaban los handlers: async def con llamadas bloqueantes
+    return fetch_all_sync(query)
+
+async def run_round(label, query_fn, n, sleep):
+    slow = f"SELECT SLEEP({sleep}) AS s"
+    fast_latency = None
+
+    async def fast():
+        nonlocal fast_latency
+        await asyncio.sleep(0.01)
+        t0 = time.perf_counter()
+        await query_fn("SELECT 1 AS one")
+        fast_latency = time.perf_counter() - t0
+
+    start = time.perf_counter()
+    await asyncio.gather(*(query_fn(slow) for _ in range(n)), fast())
+    total = time.perf_counter() - start
+    print(f"{label:<10} total={total:6.2f}s  consulta rapida={fast_latency:6.3f}s  "
+          f"(serializado seria ~{n * sleep:.1f}s)")
+
+async def main(n, sleep):
+    pool = init_pool(pool_size=max(n, 1) + 1, max_overflow=0)
+    try:
+        print(f"{n} consultas de {sleep}s, pool de {pool.max_connections} conexiones")
+        await run_round("bloqueante", blocking_query, n, sleep)
+        await run_round("run_db", fetch_all, n, sleep)
+    finally:
+        close_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--sleep", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.sleep))
@@ -0,0 +1,339 @@
+"""Benchmark de extremo a extremo de la API contra una base de datos desechable.
+
+Crea una base de datos temporal en el MySQL local configurado en .env (DB_HOST,
+DB_USER, DB_PASSWORD), la llena con app.seed a cada escala, levanta
+app.main:app con uvicorn y recorre todas las rutas de app/routes.py y de
+app.main: creaciones individuales, cargas bulk de tamano creciente, listados con
+tablas cada vez mas grandes, busquedas, jerarquia, archivo y estado. No arranca
+si alguna ruta no tiene escenario. Reporta req/s y latencias p50/p95/p99 en JSON.
+
+    python -m benchmarks.suite --scales 0.01,0.1 --concurrency 16 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+import mysql.connector
+from fastapi.routing import APIRoute
+
+from app import database, routes
+from app.database import init_pool, close_pool, get_db_config
+from app.main import app
+from app.schema import migrate_sync, truncate_all_sync
+from app.seed import (Generator, BASE_COUNTS, COMPANY_WORDS, FIRST_NAMES, LAST_NAMES,
+                      PRODUCT_WORDS)
+
+# Se recorren con una peticion a la vez: dos exportaciones en workers distintos
+# leerian el mismo estado del archivo
+SERIAL_ROUTES = {("/archive/sales/export/", "POST")}
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+async def drive(client, make_request, total, concurrency):
+    latencies = []
+    errors = 0
+    sent = 0
+    response_bytes = 0
+
+    async def worker():
+        nonlocal errors, sent, response_bytes
+        while sent < total:
+            sent += 1
+            method, url, kwargs = make_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                response_bytes += len(response.content)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else None,
+        "p50_ms": round(percentile(ms, 50), 3) if ms else None,
+        "p95_ms": round(percentile(ms, 95), 3) if ms else None,
+        "p99_ms": round(percentile(ms, 99), 3) if ms else None,
+        "response_bytes": response_bytes,
+    }
+
+class Payloads:
+    """Cuerpos validos para los POST a partir de los IDs generados por app.seed."""
+
+    def __init__(self, generator, ids, seed):
+        self.rng = random.Random(seed)
+        self.ids = ids
+        self.generator = generator
+
+    def department(self):
+        return {"department_name": "Bench", "place": "Monterrey",
+                "department_head": self.rng.choice(self.ids["employees"])}
+
+    def employee(self):
+        n = self.rng.randint(0, 10 ** 9)
+        return {"first_name": "Bench", "last_name": "User", "email": f"bench{n}@empresa.com",
+                "department_id": self.rng.choice(self.ids["departments"]),
+                "hire_date": "2024-01-15", "salary": "25000.00", "position": "Analista",
+                "manager_id": self.rng.choice(self.ids["employees"])}
+
+    def project(self):
+        return {"project_name": "Proyecto bench", "start_date": "2024-01-01",
+                "end_date": "2024-12-31", "department_id": self.rng.choice(self.ids["departments"]),
+                "employee_id": self.rng.choice(self.ids["employees"]), "budget": "150000.00",
+                "project_manager": self.rng.choice(self.ids["employees"])}
+
+    def customer(self):
+        return {"customer_name": "Cliente Bench", "country": "Mexico",
+                "phone_number": "+52 81 0000 0000", "email": "cliente@bench.com"}
+
+    def supplier(self):
+        return {"supplier_name": "Proveedor Bench", "contact_info": "ventas@bench.com",
+                "country": "Mexico", "phone_number": "+52 81 0000 0000"}
+
+    def product(self):
+        return {"product_name": "Producto Bench", "supplier_id": self.rng.choice(self.ids["suppliers"])}
+
+    def employee_id(self):
+        return self.rng.choice(self.ids["employees"])
+
+    def search_query(self, table):
+        """Nombre completo, prefijo, palabra suelta o con un error de tipeo."""
+        rng = self.rng
+        if table == "customers":
+            first, last = rng.choice(FIRST_NAMES).lower(), rng.choice(LAST_NAMES).lower()
+            typo = first[1] + first[0] + first[2:]
+            return rng.choice([f"{first} {last}", first[:3], last, typo, "correo.com"])
+        words = COMPANY_WORDS if table == "suppliers" else PRODUCT_WORDS
+        word = rng.choice(words).lower()
+        return rng.choice([word, word[:3], word[:-1] + "x"])
+
+    def sale(self):
+        product_id = self.rng.choice(self.ids["products"])
+        return {"sale_date": str(date(2024, 1, 1) + timedelta(days=self.rng.randint(0, 365))),
+                "amount": f"{self.rng.randint(500, 500000) / 100:.2f}", "product_id": product_id,
+                "customer_id": self.rng.choice(self.ids["customers"]),
+                "supplier_id": self.generator.product_supplier[product_id],
+                "employee_id": self.rng.choice(self.ids["employees"]),
+                "project_id": self.rng.choice(self.ids["projects"])}
+
+ENTITIES = {
+    "departments": "department",
+    "employees": "employee",
+    "projects": "project",
+    "customers": "customer",
+    "suppliers": "supplier",
+    "products": "product",
+    "sales": "sale",
+}
+
+def scenarios(payloads, args):
+    """(ruta, metodo, nombre, peticiones, generador de peticion) para cada escenario."""
+    result = []
+    for table, single in ENTITIES.items():
+        make = getattr(payloads, single)
+        for limit in (10, 100, 1000):
+            result.append((f"/{table}/", "GET", f"list limit={limit}", args.requests,
+                           lambda t=table, l=limit: ("GET", f"/{t}/", {"params": {"limit": l}})))
+        result.append((f"/{table}/", "POST", "create", args.requests,
+                       lambda t=table, m=make: ("POST", f"/{t}/", {"json": m()})))
+        for size in args.bulk_sizes:
+            result.append((f"/{table}/bulk/", "POST", f"bulk size={size}", args.bulk_requests,
+                           lambda t=table, m=make, s=size: (
+                               "POST", f"/{t}/bulk/", {"json": [m() for _ in range(s)]})))
+            result.append((f"/{table}/bulk/stream/", "POST", f"bulk stream size={size}",
+                           args.bulk_requests,
+                           lambda t=table, m=make, s=size: (
+                               "POST", f"/{t}/bulk/stream/",
+                               {"content": "".join(json.dumps(m()) + "\n" for _ in range(s)),
+                                "headers": {"content-type": "application/x-ndjson"}})))
+    result.append(("/sales/", "GET", "list filtered", args.requests,
+                   lambda: ("GET", "/sales/", {"params": {"sale_date_from": "2023-01-01",
+                                                          "sale_date_to": "2023-03-31", "limit": 100}})))
+    result.append(("/sales/", "GET", "list expand", args.requests,
+                   lambda: ("GET", "/sales/", {"params": {"limit": 100,
+                                                          "expand": "product,customer,employee"}})))
+    for table in ("sales", "employees"):
+        for fmt in ("ndjson", "csv"):
+            result.append((f"/{table}/export/", "GET", f"export {fmt}", args.export_requests,
+                           lambda t=table, f=fmt: ("GET", f"/{t}/export/", {"params": {"format": f}})))
+    for group_by in ("", "day", "day,product_id"):
+        result.append(("/analytics/sales/", "GET", f"analytics group_by={group_by or '-'}",
+                       args.requests,
+                       lambda g=group_by: ("GET", "/analytics/sales/", {"params": {"group_by": g}})))
+    for table in ("customers", "suppliers", "products"):
+        result.append((f"/{table}/search/", "GET", "search", args.requests,
+                       lambda t=table: ("GET", f"/{t}/search/",
+                                        {"params": {"q": payloads.search_query(t), "limit": 20}})))
+    for path, name, params in (("reports", "reports", {}), ("reports", "reports depth=1", {"depth": 1}),
+                               ("chain", "chain", {}), ("subtree-totals", "subtree totals", {})):
+        result.append((f"/employees/{{employee_id}}/{path}/", "GET", name, args.requests,
+                       lambda p=path, q=params: (
+                           "GET", f"/employees/{payloads.employee_id()}/{p}/", {"params": q})))
+    # La primera exportacion escribe todo el archivo; las siguientes solo lo nuevo
+    result.append(("/archive/sales/export/", "POST", "archive export", args.export_requests,
+                   lambda: ("POST", "/archive/sales/export/", {})))
+    for group_by in ("month", "month,product_id"):
+        result.append(("/archive/sales/", "GET", f"archive group_by={group_by}", args.requests,
+                       lambda g=group_by: ("GET", "/archive/sales/", {"params": {"group_by": g}})))
+    for path, name in (("/archive/sales/status/", "archive status"), ("/cache/stats/", "cache stats"),
+                       ("/metrics", "metrics"), ("/", "root")):
+        result.append((path, "GET", name, args.requests, lambda p=path: ("GET", p, {})))
+    return result
+
+def uncovered_routes(covered):
+    """Rutas de app/routes.py y de app.main sin escenario: "METODO ruta"."""
+    missing = []
+    # Las de app.main (/metrics, /) no estan en el router de app/routes.py
+    api_routes = list(routes.router.routes) + [
+        route for route in app.routes
+        if isinstance(route, APIRoute) and route not in routes.router.routes]
+    for route in api_routes:
+        for method in route.methods:
+            if (route.path, method) not in covered:
+                missing.append(f"{method} {route.path}")
+    return missing
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(database_name, port, workers, archive_dir):
+    env = {**os.environ, "DB_NAME": database_name, "ARCHIVE_DIR": archive_dir}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("La API no arranco en 30 s")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def admin_connection():
+    config = get_db_config()
+    config.pop("database")
+    return mysql.connector.connect(**config)
+
+def seed(scale, seed_value, batch):
+    counts = {name: max(1, int(base * scale)) for name, base in BASE_COUNTS.items()}
+    truncate_all_sync()
+    generator = Generator(seed_value, counts, batch)
+    ids = generator.run()
+    return generator, ids, counts, generator.report
+
+async def run_scale(port, payloads, args, scale, counts):
+    results = []
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300,
+                                 limits=limits) as client:
+        for path, method, name, total, make in scenarios(payloads, args):
+            concurrency = 1 if (path, method) in SERIAL_ROUTES else args.concurrency
+            stats = await drive(client, make, total, concurrency)
+            results.append({"scale": scale, "table_rows": counts, "route": path,
+                            "method": method, "scenario": name,
+                            "concurrency": concurrency, **stats})
+            print(f"[{scale}] {method:<4} {path:<24} {name:<28} {stats['rps'] or 0:>9.1f} req/s  "
+                  f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms"
+                  f"{'  errores=' + str(stats['errors']) if stats['errors'] else ''}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la API contra una BD desechable")
+    parser.add_argument("--scales", default="0.01,0.1", help="Escalas de app.seed separadas por coma")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--bulk-requests", type=int, default=10)
+    parser.add_argument("--export-requests", type=int, default=3)
+    parser.add_argument("--bulk-sizes", default="10,100,1000")
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--keep-database", action="store_true")
+    args = parser.parse_args()
+    args.bulk_sizes = [int(size) for size in args.bulk_sizes.split(",")]
+    scales = [float(scale) for scale in args.scales.split(",")]
+    # Una ruta nueva sin escenario se detecta antes de crear la BD
+    missing = uncovered_routes({(path, method) for path, method, *_ in
+                                scenarios(Payloads(None, {}, args.seed), args)})
+    if missing:
+        parser.error("Rutas sin escenario en benchmarks/suite.py: " + ", ".join(missing))
+
+    database_name = f"api_bench_{os.getpid()}_{int(time.time())}"
+    admin = admin_connection()
+    admin.cursor().execute(f"CREATE DATABASE {database_name}")
+    results = []
+    try:
+        init_pool(database=database_name)
+        migrate_sync()
+        for scale in scales:
+            generator, ids, counts, seed_report = seed(scale, args.seed, args.batch)
+            payloads = Payloads(generator, ids, args.seed)
+            results.append({"scale": scale, "scenario": "seed",
+                            "tables": [{"table": t, "rows": r, "seconds": round(s, 4),
+                                        "rows_per_second": round(rps, 1)}
+                                       for t, r, s, rps in seed_report]})
+            # Servidor nuevo por escala: los caches del proceso empiezan vacios
+            port = free_port()
+            archive_dir = tempfile.mkdtemp(prefix="api_bench_archive_")
+            server = start_server(database_name, port, args.workers, archive_dir)
+            try:
+                results.extend(asyncio.run(run_scale(port, payloads, args, scale, counts)))
+            finally:
+                stop_server(server)
+                shutil.rmtree(archive_dir, ignore_errors=True)
+    finally:
+        close_pool()
+        if not args.keep_database:
+            admin.cursor().execute(f"DROP DATABASE IF EXISTS {database_name}")
+        admin.close()
+
+    report = {
+        "meta": {"started": time.strftime("%Y-%m-%dT%H:%M:%S"), "scales": scales,
+                 "concurrency": args.concurrency, "workers": args.workers,
+                 "requests": args.requests, "bulk_sizes": args.bulk_sizes,
+                 "pool_size": database.get_pool_config()["pool_size"]},
+        "results": results,
+    }
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Resultados en {args.output}")
+
+if __name__ == "__main__":
+    main()
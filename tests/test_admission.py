@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from app import admission, group_commit
+from app.admission import AdmissionLimiter, AdmissionMiddleware
+from app.bulk import bulk_insert_sync
+from app.coalesce import SingleFlight
+from app.fkcheck import fk_cache
+from app.tables import SALES
+
+def _scope(method, path):
+    return {"type": "http", "method": method, "path": path, "headers": []}
+
+async def _request(middleware, method, path):
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(_scope(method, path), receive, send)
+    return sent[0]["status"]
+
+async def _ok(send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+@pytest.fixture
+def limits(monkeypatch):
+    def set_limits(**limits):
+        for name, limit in limits.items():
+            monkeypatch.setitem(admission.limiters, name,
+                                AdmissionLimiter(name, limit, max_queue=0, queue_timeout=1))
+    return set_limits
+
+def test_group_commit_batch_is_not_capped_by_write_limit(monkeypatch, limits):
+    limits(write=2)
+    admission.limiters["write"].max_queue = 10
+    flushed = []
+
+    async def fake_run_db(fn, *args):
+        if fn == fk_cache.check:
+            return list(range(len(args[1]))), []
+        assert fn == bulk_insert_sync
+        flushed.append(len(args[1]))
+        return list(range(len(args[1]))), {}
+
+    monkeypatch.setattr(group_commit, "run_db", fake_run_db)
+
+    async def scenario():
+        buffer = group_commit.GroupCommitBuffer(SALES, max_rows=6, max_delay_ms=200)
+        buffer.start()
+
+        async def app(scope, receive, send):
+            await buffer.submit(("2024-01-01", "1.00", 1, 1, 1, 1, None))
+            await _ok(send)
+
+        middleware = AdmissionMiddleware(app)
+        statuses = await asyncio.gather(*[_request(middleware, "POST", "/sales/") for _ in range(6)])
+        await buffer.stop()
+        return statuses
+
+    # Con el lugar tomado durante la espera cada lote tendria a lo sumo 2 filas
+    assert asyncio.run(scenario()) == [200] * 6
+    assert flushed == [6]
+    assert admission.limiters["write"].in_flight == 0
+
+def test_coalesced_waiters_do_not_hold_read_slots(limits):
+    limits(read=2)
+
+    async def scenario():
+        flight = SingleFlight(window_ms=0)
+        release = asyncio.Event()
+        loads = 0
+
+        async def load():
+            nonlocal loads
+            loads += 1
+            await release.wait()
+            return "ok"
+
+        async def app(scope, receive, send):
+            await flight.do("products", scope["path"], load)
+            await _ok(send)
+
+        middleware = AdmissionMiddleware(app)
+        leader = asyncio.create_task(_request(middleware, "GET", "/products/"))
+        await asyncio.sleep(0.01)
+        # El lider ocupa un lugar; cada peticion que se une a su consulta toma el
+        # otro y lo suelta, asi la siguiente tambien entra (sin cola: si no, 503)
+        followers = []
+        for _ in range(3):
+            followers.append(asyncio.create_task(_request(middleware, "GET", "/products/")))
+            await asyncio.sleep(0.01)
+        assert admission.limiters["read"].in_flight == 1
+        release.set()
+        return await asyncio.gather(leader, *followers), loads
+
+    statuses, loads = asyncio.run(scenario())
+    assert loads == 1
+    assert statuses == [200, 200, 200, 200]
+    assert admission.limiters["read"].in_flight == 0
@@ -0,0 +1,19 @@
+import datetime
+from decimal import Decimal
+from app.analytics import DIMENSIONS, rollup_deltas, summary_query
+
+def _sale(day, amount, product_id, project_id=None):
+    return (datetime.date(2024, 1, day), amount, product_id, 1, 1, 1, project_id)
+
+def test_deltas_have_no_daily_total_row():
+    deltas = rollup_deltas([_sale(1, "10.00", 1), _sale(1, "5.50", 2, project_id=3)])
+    assert {dimension for dimension, _, _ in deltas} == set(DIMENSIONS)
+    # El total del dia sale de cualquier dimension obligatoria
+    day = datetime.date(2024, 1, 1)
+    assert sum(delta[0] for (dimension, sale_date, _), delta in deltas.items()
+               if dimension == "product_id" and sale_date == day) == Decimal("15.50")
+
+def test_totals_sum_the_product_rows():
+    query, params = summary_query(True, None, datetime.date(2024, 1, 1))
+    assert params[0] == "product_id"
+    assert "GROUP BY sale_date" in query and "dim_value" not in query
@@ -0,0 +1,37 @@
+import asyncio
+import csv
+from app.bulk import iter_records
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+def _records(fmt, *parts):
+    async def collect():
+        return [record async for record in iter_records(_chunks(*parts), fmt)]
+    return asyncio.run(collect())
+
+def test_ndjson_invalid_utf8_line_is_rejected_by_index():
+    records = _records("ndjson", b'{"a": 1}\n', b'{"a": "\xff"}\n{"a": 3}\n')
+    assert [(index, error is None) for index, _, error in records] == [(0, True), (1, False), (2, True)]
+    assert "UTF-8" in records[1][2]
+    assert records[2][1] == {"a": 3}
+
+def test_csv_bad_line_does_not_stop_the_body():
+    body = b"name,place\nuno,aqui\n" + b"x" * 50 + b",otro\n\xfe\xff,mal\ndos,alla\n"
+    # Un campo mas largo que el limite del modulo csv provoca csv.Error
+    previous = csv.field_size_limit(10)
+    try:
+        records = _records("csv", body)
+    finally:
+        csv.field_size_limit(previous)
+    assert [index for index, _, _ in records] == [0, 1, 2, 3]
+    assert records[0][1] == {"name": "uno", "place": "aqui"}
+    assert records[1][2].startswith("CSV invalido")
+    assert records[2][2].startswith("UTF-8 invalido")
+    assert records[3][1] == {"name": "dos", "place": "alla"}
+
+def test_csv_bad_header_rejects_every_row():
+    records = _records("csv", b"\xffname,place\nuno,aqui\ndos,alla\n")
+    assert [(index, record) for index, record, _ in records] == [(0, None), (1, None)]
+    assert all("Cabecera" in error for _, _, error in records)
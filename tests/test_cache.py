@@ -0,0 +1,61 @@
+import asyncio
+from app.cache import MemoryBackend, RedisBackend, ResponseCache
+
+class FakeRedis:
+    """Lo minimo de redis.asyncio que usa RedisBackend."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+def test_redis_invalidate_during_load_does_not_cache_stale_result():
+    async def scenario():
+        redis = FakeRedis()
+        # Dos workers con la misma instancia de Redis
+        worker_a = ResponseCache(RedisBackend(client=redis), ttls={"products": 60})
+        worker_b = ResponseCache(RedisBackend(client=redis), ttls={"products": 60})
+        loading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_load():
+            loading.set()
+            await release.wait()
+            return ["viejo"]
+
+        task = asyncio.create_task(worker_a.get_or_load("products", {"page": 1}, slow_load))
+        await loading.wait()
+        # El otro worker escribe e invalida mientras A todavia lee
+        await worker_b.invalidate("products")
+        release.set()
+        assert await task == ["viejo"]
+
+        async def fresh_load():
+            return ["nuevo"]
+
+        assert await worker_b.get_or_load("products", {"page": 1}, fresh_load) == ["nuevo"]
+        assert await worker_a.get_or_load("products", {"page": 1}, fresh_load) == ["nuevo"]
+    asyncio.run(scenario())
+
+def test_memory_backend_skips_set_after_local_invalidate():
+    async def scenario():
+        cache = ResponseCache(MemoryBackend(), ttls={"products": 60})
+
+        async def load_and_invalidate():
+            await cache.invalidate("products")
+            return ["viejo"]
+
+        async def fresh_load():
+            return ["nuevo"]
+
+        await cache.get_or_load("products", {}, load_and_invalidate)
+        assert await cache.get_or_load("products", {}, fresh_load) == ["nuevo"]
+    asyncio.run(scenario())
@@ -0,0 +1,92 @@
+import gzip
+import pytest
+import zstandard
+from app.compression import Decompressor, INFLATE_CHUNK_SIZE
+
+def _inflate(encoding, payload, piece_size):
+    decompressor = Decompressor(encoding)
+    sizes = []
+    for i in range(0, len(payload), piece_size):
+        sizes.extend(len(out) for out in decompressor.decompress(payload[i:i + piece_size]))
+    sizes.extend(len(out) for out in decompressor.finish())
+    return sizes
+
+@pytest.mark.parametrize("piece_size", [7, 1000, 1 << 20])
+def test_zstd_bomb_is_inflated_in_bounded_reads(piece_size):
+    size = 64 * 1024 * 1024
+    payload = zstandard.ZstdCompressor().compress(b"\0" * size)
+    # Razon de compresion de varios miles a uno
+    assert len(payload) * 1000 < size
+    sizes = _inflate("zstd", payload, piece_size)
+    assert sum(sizes) == size
+    assert max(sizes) <= INFLATE_CHUNK_SIZE
+
+def test_zstd_first_read_does_not_inflate_whole_body():
+    payload = zstandard.ZstdCompressor().compress(b"\0" * (64 * 1024 * 1024))
+    pieces = Decompressor("zstd").decompress(payload)
+    assert len(next(pieces)) <= INFLATE_CHUNK_SIZE
+
+def test_zstd_multiple_frames_and_checksums():
+    compressor = zstandard.ZstdCompressor(write_checksum=True)
+    payload = compressor.compress(b"hola " * 1000) + compressor.compress(b"mundo " * 1000)
+    assert sum(_inflate("zstd", payload, 3)) == 11000
+
+def test_zstd_truncated_body_is_rejected():
+    payload = zstandard.ZstdCompressor().compress(b"hola mundo " * 100000)
+    with pytest.raises(ValueError):
+        _inflate("zstd", payload[:-5], 1000)
+
+def test_gzip_bomb_is_inflated_in_bounded_reads():
+    size = 32 * 1024 * 1024
+    payload = gzip.compress(b"\0" * size)
+    sizes = _inflate("gzip", payload, 1000)
+    assert sum(sizes) == size
+    assert max(sizes) <= INFLATE_CHUNK_SIZE
+
+def _client(body, content_type=b"application/json", extra_headers=()):
+    from starlette.testclient import TestClient
+    from app.compression import CompressionMiddleware
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type), *extra_headers]})
+        await send({"type": "http.response.body", "body": body})
+    return TestClient(CompressionMiddleware(app, min_size=100))
+
+@pytest.mark.parametrize("body, accept, encoding", [
+    (b"x" * 1000, "gzip", "gzip"),
+    (b"x" * 10, "gzip", None),             # demasiado chico
+    (b"x" * 1000, "identity", None),       # el cliente no acepta compresion
+], ids=["compressed", "small", "identity"])
+def test_compressible_responses_vary_on_accept_encoding(body, accept, encoding):
+    response = _client(body).get("/", headers={"Accept-Encoding": accept})
+    assert response.headers.get("content-encoding") == encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+
+def test_vary_is_merged_and_skipped_for_other_types():
+    response = _client(b"x" * 10, extra_headers=[(b"vary", b"Origin")]).get(
+        "/", headers={"Accept-Encoding": "identity"})
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+    response = _client(b"x" * 1000, content_type=b"image/png").get(
+        "/", headers={"Accept-Encoding": "gzip"})
+    assert "vary" not in response.headers
+
+def test_compressed_upload_keeps_the_route_for_metrics():
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+    from app import metrics
+    from app.compression import CompressionMiddleware
+
+    async def upload(request):
+        return JSONResponse({"bytes": len(await request.body())})
+
+    app = metrics.MetricsMiddleware(CompressionMiddleware(
+        Starlette(routes=[Route("/upload/{name}", upload, methods=["POST"])])))
+    before = metrics.render()
+    response = TestClient(app).post("/upload/x", content=gzip.compress(b"a" * 5000),
+                                    headers={"Content-Encoding": "gzip"})
+    assert response.json() == {"bytes": 5000}
+    rendered = metrics.render()
+    assert 'route="/upload/{name}"' in rendered and rendered != before
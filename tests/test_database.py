@@ -0,0 +1,57 @@
+import pytest
+from app import database
+
+class FakeCursor:
+    def execute(self, operation, params=None):
+        pass
+
+    def fetchall(self):
+        # Sin filas: no es replica, retraso 0
+        return []
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    in_transaction = False
+
+    def __init__(self, host):
+        self.host = host
+
+    def cursor(self, **kwargs):
+        return FakeCursor()
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def replica(monkeypatch):
+    monkeypatch.setattr(database.mysql.connector, "connect",
+                        lambda **args: FakeConnection(args.get("host")))
+    primary = database.ConnectionPool(pool_size=1, max_overflow=0, timeout=0.05, host="primary")
+    replica = database.Replica("r1", database.ConnectionPool(
+        pool_size=1, max_overflow=0, timeout=5, host="r1"))
+    monkeypatch.setattr(database, "_pool", primary)
+    monkeypatch.setattr(database, "_replicas", [replica])
+    monkeypatch.setattr(database, "DB_REPLICA_ACQUIRE_TIMEOUT", 0.05)
+    yield replica
+    replica.close()
+    primary.close()
+
+def test_saturated_replica_stays_healthy_and_reads_fall_back(replica):
+    replica.check()
+    assert replica.healthy
+    busy = database.get_db_connection(read_only=True)
+    assert busy._conn.host == "r1"
+    # Con el pool de la replica agotado el chequeo usa su propia conexion
+    replica.check()
+    assert replica.healthy and replica.error is None
+    # y la lectura no espera DB_POOL_TIMEOUT: va al primario
+    conn = database.get_db_connection(read_only=True)
+    assert conn._conn.host == "primary"
+    conn.close()
+    busy.close()
+    assert database.get_db_connection(read_only=True)._conn.host == "r1"
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app import export
+
+class FakeCursor:
+    column_names = ("id",)
+
+    def __init__(self, batches, gate=None):
+        self.batches = list(batches)
+        self.gate = gate
+        self.reading = threading.Event()
+        self.closed = False
+
+    def fetchmany(self, size):
+        self.reading.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return self.batches.pop(0) if self.batches else []
+
+    def close(self):
+        self.closed = True
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.events = []
+
+    def set_statement_timeout(self, seconds=None):
+        pass
+
+    def close(self):
+        self.events.append("close")
+
+    def invalidate(self):
+        # Cerrar la conexion con una lectura en curso es justo lo que no debe pasar
+        self.events.append("invalidate-while-reading" if self.cursor.reading.is_set()
+                           and self.cursor.gate is not None and not self.cursor.gate.is_set()
+                           else "invalidate")
+
+@pytest.fixture
+def executor(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(export, "submit_db", pool.submit)
+    yield pool
+    pool.shutdown(wait=True)
+
+def test_exhausted_stream_returns_connection(executor):
+    cursor = FakeCursor([[(1,), (2,)]])
+    conn = FakeConnection(cursor)
+
+    async def scenario():
+        return [chunk async for chunk in export.ExportStream(conn, cursor, "ndjson", 10)]
+
+    assert b"".join(asyncio.run(scenario())) == b'{"id": 1}\n{"id": 2}\n'
+    executor.shutdown(wait=True)
+    assert conn.events == ["close"] and cursor.closed
+
+def test_disconnect_waits_for_in_flight_fetch(executor):
+    gate = threading.Event()
+    cursor = FakeCursor([[(1,)]], gate=gate)
+    conn = FakeConnection(cursor)
+
+    async def scenario():
+        stream = export.ExportStream(conn, cursor, "ndjson", 10)
+        task = asyncio.ensure_future(stream.__aiter__().__anext__())
+        await asyncio.get_running_loop().run_in_executor(None, cursor.reading.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.05)
+        assert conn.events == []
+        gate.set()
+
+    asyncio.run(scenario())
+    executor.shutdown(wait=True)
+    assert conn.events == ["invalidate"]
+
+def test_response_never_iterated_still_releases_connection(executor):
+    cursor = FakeCursor([[(1,)]])
+    conn = FakeConnection(cursor)
+    stream = export.ExportStream(conn, cursor, "csv", 10)
+    response = export.ExportResponse(stream, "csv")
+
+    async def failing_send(message):
+        raise OSError("cliente desconectado")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def scenario():
+        # Starlette lo convierte en ClientDisconnect
+        with pytest.raises(Exception):
+            await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, failing_send)
+
+    asyncio.run(scenario())
+    executor.shutdown(wait=True)
+    assert conn.events == ["invalidate"]
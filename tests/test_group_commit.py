@@ -0,0 +1,50 @@
+import asyncio
+import mysql.connector
+import pytest
+from app import group_commit
+from app.bulk import bulk_insert_sync, insert_row_sync
+from app.fkcheck import fk_cache
+from app.tables import SALES
+
+BAD_PRODUCT = 999
+
+def _sale(product_id):
+    return ("2024-01-01", "1.50", product_id, 1, 1, 1, None)
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    async def fake_run_db(fn, *args):
+        calls.append(fn)
+        if fn == fk_cache.check:
+            _, rows = args
+            valid = [i for i, row in enumerate(rows) if row[2] != BAD_PRODUCT]
+            rejected = [(i, f"product_id={BAD_PRODUCT} no existe en products")
+                        for i, row in enumerate(rows) if row[2] == BAD_PRODUCT]
+            return valid, rejected
+        if fn == bulk_insert_sync:
+            _, rows, *_ = args
+            return list(range(100, 100 + len(rows))), {}
+        raise AssertionError(f"llamada inesperada a {fn.__name__}")
+
+    monkeypatch.setattr(group_commit, "run_db", fake_run_db)
+    return calls
+
+def test_bad_foreign_key_rejects_only_its_row(calls):
+    async def scenario():
+        buffer = group_commit.GroupCommitBuffer(SALES, max_rows=4, max_delay_ms=50)
+        buffer.start()
+        results = await asyncio.gather(
+            *[buffer.submit(_sale(product)) for product in (1, BAD_PRODUCT, 2, 3)],
+            return_exceptions=True)
+        await buffer.stop()
+        return buffer, results
+
+    buffer, results = asyncio.run(scenario())
+    assert results[0] == 100 and results[2] == 101 and results[3] == 102
+    assert isinstance(results[1], mysql.connector.IntegrityError)
+    # Un solo INSERT multi-fila para las tres validas, sin reintento fila por fila
+    assert calls == [fk_cache.check, bulk_insert_sync]
+    assert insert_row_sync not in calls
+    assert buffer.status()["flushes"] == 1 and buffer.status()["rows"] == 3
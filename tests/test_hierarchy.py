@@ -0,0 +1,58 @@
+import asyncio
+import time
+from decimal import Decimal
+from app import hierarchy
+from app.hierarchy import OrgIndex
+
+# 1 -> 2 -> 3, 1 -> 4; 5 y 6 forman un ciclo
+MANAGERS = {1: None, 2: 1, 3: 2, 4: 1, 5: 6, 6: 5}
+
+def _index(managers=MANAGERS):
+    index = OrgIndex()
+    index._build(dict(managers), {employee_id: Decimal(100) for employee_id in managers})
+    index._loaded_at = time.monotonic()
+    return index
+
+def _employee(employee_id, manager_id, salary=50):
+    return {"employee_id": employee_id, "manager_id": manager_id, "salary": salary}
+
+def test_totals_follow_note_inserted():
+    index = _index()
+    index.note_inserted([_employee(7, 3), _employee(8, 7)])
+    assert index.totals(1)["headcount"] == 6
+    assert index.totals(1)["total_salary"] == Decimal(500)
+    assert index.totals(2)["headcount"] == 4
+    assert index.chain(8) == [(7, 1), (3, 2), (2, 3), (1, 4)]
+    # Repetir la insercion no cuenta dos veces
+    index.note_inserted([_employee(8, 7)])
+    assert index.totals(1)["headcount"] == 6
+
+def test_inserts_during_a_reload_are_applied_to_the_new_load(monkeypatch):
+    index = OrgIndex()
+
+    def load():
+        # Una insercion confirmada despues de que la consulta leyo la tabla
+        index.note_inserted([_employee(7, 4)])
+        return dict(MANAGERS), {employee_id: Decimal(100) for employee_id in MANAGERS}
+
+    async def run_db(fn, *args):
+        return fn(*args)
+
+    monkeypatch.setattr(index, "_load_sync", load)
+    monkeypatch.setattr(hierarchy, "run_db", run_db)
+    asyncio.run(index.ensure_loaded())
+    assert index.children(4) == [7]
+    assert index.totals(1)["headcount"] == 5
+    assert index.totals(1)["total_salary"] == Decimal(450)
+
+def test_reports_are_truncated_by_limit_and_depth():
+    index = _index()
+    assert index.reports(1, depth=1) == ([(2, 1), (4, 1)], 2)
+    assert index.reports(1, limit=1) == ([(2, 1)], 3)
+    assert index.reports(1, depth=5, limit=2) == ([(2, 1), (4, 1)], 3)
+
+def test_reports_on_a_manager_cycle_ends():
+    index = _index()
+    started = time.monotonic()
+    assert index.reports(5, depth=10 ** 9) == ([(6, 1)], 1)
+    assert time.monotonic() - started < 1
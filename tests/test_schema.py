@@ -0,0 +1,26 @@
+import pytest
+from app import schema, tables
+from app.routes import router
+
+def _query_params(path):
+    route = next(route for route in router.routes if route.path == path and "GET" in route.methods)
+    return {param.name for param in route.dependant.query_params}
+
+@pytest.mark.parametrize("name", sorted(tables.LIST_FILTERS))
+def test_list_routes_take_the_catalogued_filters(name):
+    params = {param for param, _, _ in tables.LIST_FILTERS[name]}
+    assert params <= _query_params(f"/{name}/")
+
+@pytest.mark.parametrize("name", sorted(tables.EXPORT_FILTERS))
+def test_export_routes_take_the_catalogued_filters(name):
+    params = {param for param, _, _ in tables.EXPORT_FILTERS[name]}
+    assert params == _query_params(f"/{name}/export/") - {"format", "chunk_size"}
+
+def test_bind_filters_rejects_parameters_outside_the_definition():
+    with pytest.raises(TypeError):
+        tables.bind_filters(tables.LIST_FILTERS["customers"], country="MX", place="x")
+
+def test_catalogue_covers_the_in_memory_loads_and_archive_batches():
+    names = {name for name, *_ in schema.route_queries()}
+    assert {"search customers", "hierarchy employees", "fk ids employees",
+            "archive export", "archive export (huecos)", "GET /sales/export/?sale_date_to"} <= names
@@ -0,0 +1,45 @@
+from app import search, tables
+from app.search import SearchIndex, _IndexData
+
+def _index(rows):
+    index = SearchIndex(tables.TABLES["customers"], search.SEARCH_FIELDS["customers"])
+    index._data = _IndexData.build(rows)
+    return index
+
+def _people(count, start=1):
+    names = ["maria lopez", "juan perez", "ana ruiz", "maria garcia"]
+    return [(i, names[i % len(names)].title(), f"{names[i % len(names)].replace(' ', '.')}{i}@gmail.com")
+            for i in range(start, start + count)]
+
+def test_short_word_typos_are_corrected():
+    index = _index(_people(200))
+    found = index.search("mraia", 10)
+    assert len(found) == 10
+    assert all(match == "fuzzy" for _, match in found)
+    assert all("maria" in index._data.docs[doc_id][0] for doc_id, _ in found)
+    found = index.search("gmial", 5)
+    assert len(found) == 5
+    assert all("gmail" in index._data.docs[doc_id][1] for doc_id, _ in found)
+
+def test_email_words_are_split_on_punctuation():
+    index = _index(_people(20))
+    assert index.search("gmail.com", 1)[0][1] == "word_prefix"
+    assert index.search("lopez4", 1) == [(4, "word_prefix")]
+
+def test_exact_match_beyond_the_candidate_cap(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_MAX_CANDIDATES", 50)
+    index = _index(_people(2000) + [(90000, "Maria", "m@x.com")])
+    assert index.search("maria", 1) == [(90000, "exact")]
+
+def test_word_start_candidates_come_first(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_MAX_CANDIDATES", 50)
+    rows = [(i, f"xmarta{i}", "") for i in range(1, 1001)] + [(5000, "Ana Marta", "")]
+    index = _index(rows)
+    assert index.search("mart", 1) == [(5000, "word_prefix")]
+
+def test_candidates_are_bounded(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_MAX_CANDIDATES", 50)
+    monkeypatch.setattr(search, "SEARCH_MAX_SCAN", 300)
+    index = _index(_people(5000))
+    assert len(index._candidates(index._data, ["mar"])) <= 50
+    assert len(index.search("maria", 20)) == 20